@@ -1,7 +1,14 @@
 # agent.py
 
-from agent_tools import execute_tool, get_tool_specs
-from llm_pipeline import run_llm
+from agent_tools import get_tool_specs, start_prefetch, finish_prefetch
+from llm_pipeline import encode_tool_result, encode_observed_data
+from agent_trace import Trace, start_trace
+from tracing import span
+from llm_limiter import LLMBusyError, PRIORITY_NORMAL
+from bom_estimator import estimate_bom
+from prompt_encoder import estimate_tokens
+from answer_validator import validate_answer, record_validation
+import requests
 import json
 
 def build_reasoning_input(state):
@@ -22,12 +29,13 @@ def build_reasoning_input(state):
     if ic_info:
         ic_count_cv = ic_info.get("ic_count_cv", 0)
         ic_count_ocr = ic_info.get("ic_count_ocr", 0)
-        ic_names = ic_info.get("ic_names", [])
+        ic_names = ic_info.get("possible_ic_names", [])
 
         data.update({
             "ic_count_cv": ic_count_cv,
             "ic_count_ocr": ic_count_ocr,
-            "ic_names": ic_names
+            "ic_names": ic_names,
+            "reference_counts": ic_info.get("reference_counts", {})
         })
 
         # derived signal
@@ -45,24 +53,23 @@ def compact_state(state):
         "mean_area": stats.get("mean_area"),
         "coverage": stats.get("coverage"),
         "type_counts": stats.get("type_counts"),
-        "ic_count": ic_info.get("ic_count_ocr")
+        "ic_count": ic_info.get("ic_count_ocr"),
+        # older get_ic_info turns point here once compacted (see
+        # bounded_messages), so the names and counts must stay
+        "ic_names": ic_info.get("possible_ic_names"),
+        "reference_counts": ic_info.get("reference_counts")
     }
 
-def run_agent(image_path: str, max_steps: int = 6):
-    
-    tools = get_tool_specs()
-
-    messages = []
-    state = {
+def new_state(image_path):
+    return {
         "image_path": image_path,
         "stats": None,
         "ic_info": None
     }
 
-    used_tools = []
 
-    # initial instruction
-    messages.append({
+def initial_messages(image_path):
+    return [{
         "role": "user",
         "content": f"""
 New task:
@@ -79,123 +86,229 @@ Determine:
 
 If data is insufficient, explicitly say so.
 """
-    })
+    }]
 
 
-    for step in range(max_steps):
+# conversation memory sent per step (task, tool turns); the state message
+# comes on top. Older turns are compacted, then dropped oldest first.
+MEMORY_TOKEN_BUDGET = 1200
 
-        # inject state
-        messages_with_state = messages + [{
-            "role": "system",
-            "content": f"Current state:\n{json.dumps(compact_state(state))}"
-        }]
+# state entry each tool writes, see update_state
+TOOL_STATE_KEYS = {
+    "run_cv": "stats",
+    "get_component_stats": "stats",
+    "get_ic_info": "ic_info"
+}
 
-        print("\n--- STEP ---", step + 1)
-        print("\n--- STATE SIZE ---")
-        print(len(json.dumps(state)))
 
-        response = run_llm(messages_with_state, tools)
+def turn_state_keys(assistant_message):
+    try:
+        response = json.loads(assistant_message["content"])
+        calls = requested_tool_calls(response)
+    except (ValueError, KeyError, TypeError):
+        return set()
+
+    return {TOOL_STATE_KEYS.get((call or {}).get("name")) for call in calls} - {None}
+
+
+def bounded_messages(messages, budget=None):
+    """
+    What the llm sees of the history: the task, earlier tool turns with
+    their results replaced by a pointer to the state summary (turns whose
+    state a later turn overwrote are dropped), and the last turn in full.
+    Stays within budget tokens however many steps have run.
+    """
+
+    budget = MEMORY_TOKEN_BUDGET if budget is None else budget
+
+    head = messages[:1]
+    turns = [messages[i:i + 2] for i in range(1, len(messages), 2)]
+
+    if len(turns) <= 1:
+        return list(messages)
+
+    latest = turns[-1]
+    older = []
+    written_later = turn_state_keys(latest[0])
+
+    for assistant, tool in reversed(turns[:-1]):
+        keys = turn_state_keys(assistant)
+
+        # superseded: every value it produced was replaced since
+        if keys and keys <= written_later:
+            continue
+        written_later |= keys
+
+        older.insert(0, [assistant, {
+            "role": "tool",
+            "content": f"(result summarized in Current state: {', '.join(sorted(keys)) or 'none'})"
+        }])
+
+    def size(turn_list):
+        return sum(estimate_tokens(m["content"]) for m in head + latest + sum(turn_list, []))
+
+    while older and size(older) > budget:
+        older.pop(0)
+
+    return head + sum(older, []) + latest
+
+
+def with_state(messages, state):
+    # inject state
+    return bounded_messages(messages) + [{
+        "role": "system",
+        "content": f"Current state:\n{encode_observed_data(compact_state(state))}"
+    }]
 
-        print("\n--- LLM Response ---")
-        print(response)
 
-        if state["stats"] is not None and state["ic_info"] is None:
-            # only override if llm is trying to finish early
-            if "final_answer" in response:
-                print("\n--- OVERRIDING: Forcing IC Info Tool ---")
-                response = {
-                    "tool_call": {
-                        "name": "get_ic_info",
-                        "arguments": {"image_path": image_path}
-                    }
+def override_response(response, state):
+    if state["stats"] is not None and state["ic_info"] is None:
+        # only override if llm is trying to finish early
+        if isinstance(response, dict) and "final_answer" in response:
+            print("\n--- OVERRIDING: Forcing IC Info Tool ---")
+            response = {
+                "tool_call": {
+                    "name": "get_ic_info",
+                    "arguments": {"image_path": state["image_path"]}
                 }
+            }
 
+    return response
 
-        if not isinstance(response, dict):
-            return {
+
+def select_route(state):
+    # data still missing: the llm is only choosing the next tool
+    if state["stats"] is None or state["ic_info"] is None:
+        return "tool_selection"
+    return "final_answer"
+
+
+def needs_escalation(response, route):
+    # the tool selection model should not write the final answer itself
+    return route == "tool_selection" and isinstance(response, dict) and "final_answer" in response
+
+
+def requested_tool_calls(response):
+    """
+    One tool_call or a list of tool_calls, as a list.
+    """
+
+    if "tool_calls" in response:
+        return list(response["tool_calls"] or [])
+    return [response["tool_call"]]
+
+
+def is_tool_response(response):
+    return "tool_call" in response or "tool_calls" in response
+
+
+def prepare_tool_calls(response, tools, last_turn_tools, ocr_profile=None):
+    """
+    Validates the requested tool calls. Returns ([(tool_name, arguments)], error).
+    """
+
+    tool_names = [t["name"] for t in tools]
+    calls = []
+
+    for call in requested_tool_calls(response):
+        tool_name = (call or {}).get("name")
+        arguments = (call or {}).get("arguments", {})
+
+        if tool_name not in tool_names:
+            return None, {
                 "status": "error",
-                "reason": "invalid_response_format",
-                "raw": response
+                "reason": f"unknown_tool: {tool_name}"
             }
 
-        # tool call 
-        if "tool_call" in response:
+        # the previous turn already ran it
+        if tool_name in last_turn_tools:
+            return None, {
+                "status": "error",
+                "reason": f"repeated_tool_call: {tool_name}"
+            }
 
-            tool_name = response["tool_call"].get("name")
-            arguments = response["tool_call"].get("arguments", {})
+        # the same tool twice in one turn runs once
+        if tool_name in [name for name, _ in calls]:
+            continue
 
-            tool_names = [t["name"] for t in tools]
+        if arguments is None:
+            arguments = {}
 
-            if tool_name not in tool_names:
-                return {
-                    "status": "error",
-                    "reason": f"unknown_tool: {tool_name}"
-                }
+        # profile chosen for the request wins over the llm's choice
+        if ocr_profile and tool_name == "get_ic_info":
+            arguments["ocr_profile"] = ocr_profile
 
-            if used_tools and used_tools[-1] == tool_name:
-                return {
-                    "status": "error",
-                    "reason": f"repeated_tool_call: {tool_name}"
-                }
+        calls.append((tool_name, arguments))
 
-            if arguments is None:
-                arguments = {}
+    if not calls:
+        return None, {
+            "status": "error",
+            "reason": "empty_tool_calls"
+        }
 
-            try:
-                tool_result = execute_tool(tool_name, arguments)
-            except Exception as e:
-                return {
-                    "status": "error",
-                    "reason": f"tool_execution_failed: {str(e)}"
-                }
+    return calls, None
 
-            used_tools.append(tool_name)
 
-            # update state
-            if tool_name == "get_component_stats":
-                state["stats"] = tool_result
+def update_state(state, tool_name, tool_result):
+    if tool_name == "get_component_stats":
+        state["stats"] = tool_result
 
-            elif tool_name == "get_ic_info":
-                state["ic_info"] = tool_result
+    elif tool_name == "get_ic_info":
+        state["ic_info"] = tool_result
 
-            elif tool_name == "run_cv":
-                state["stats"] = tool_result
+    elif tool_name == "run_cv":
+        state["stats"] = tool_result
 
-            # memory update
-            messages.append({
-                "role": "assistant",
-                "content": json.dumps(response)
-            })
 
-            messages.append({
-                "role": "tool",
-                "content": json.dumps(tool_result)
-            })
+def record_tool_results(state, messages, response, results):
+    """
+    results: [(tool_name, tool_result)] from one turn. All of them go
+    back to the llm in a single tool message.
+    """
 
-            print("\n--- Tool Executed ---")
-            print(tool_name)
-            print(tool_result)
+    for tool_name, tool_result in results:
+        update_state(state, tool_name, tool_result)
 
-        # final answer
-        elif "final_answer" in response:
+        print("\n--- Tool Executed ---")
+        print(tool_name)
+        print(tool_result)
 
-            final = response["final_answer"]
+    if len(results) == 1:
+        content = encode_tool_result(results[0][1])
+    else:
+        content = "\n".join(
+            f"{tool_name}: {encode_tool_result(tool_result)}"
+            for tool_name, tool_result in results
+        )
+
+    # memory update
+    messages.append({
+        "role": "assistant",
+        "content": json.dumps(response)
+    })
+
+    messages.append({
+        "role": "tool",
+        "content": content
+    })
 
-            reasoning_data = build_reasoning_input(state)
 
-            reflection_messages = [
-                {
-                    "role": "system",
-                    "content": "You are reviewing your previous answer for correctness."
-                },
-                {
-                    "role": "user",
-                    "content": f"""
+def build_reflection_messages(final, state):
+    reasoning_data = build_reasoning_input(state)
+
+    return [
+        {
+            "role": "system",
+            "content": "You are reviewing your previous answer for correctness."
+        },
+        {
+            "role": "user",
+            "content": f"""
 Original Answer:
 {json.dumps(final)}
 
 Observed Data:
-{json.dumps(reasoning_data)}
+{encode_observed_data(reasoning_data)}
 
 Task:
 Check if the answer is consistent with the data.
@@ -213,21 +326,442 @@ Respond ONLY in JSON format:
   }}
 }}
 """
+        }
+    ]
+
+
+# start cv and ocr in the background while the llm picks its first tool
+SPECULATIVE_PREFETCH = True
+
+
+# llm down or too slow: answer from the rule based estimator instead
+LLM_UNAVAILABLE_ERRORS = (LLMBusyError, requests.exceptions.RequestException)
+
+
+# The step logic below is written once, as generators: they yield
+#   ("llm", (messages, tools, allow_tools, priority, route)) -> (response, metrics)
+#   ("tools", [(tool_name, arguments), ...])                -> [result, ...]
+# and get the outcome sent back (a failure is thrown in at the yield).
+# drive() runs them with blocking calls through a Trace; async_agent
+# drives the same generators on an event loop.
+
+def drive(steps, trace=None):
+    """
+    Runs a step generator to completion, returns its result.
+    """
+
+    trace = trace or Trace()
+    outcome, error = None, None
+
+    while True:
+        try:
+            effect = steps.throw(error) if error is not None else steps.send(outcome)
+        except StopIteration as stop:
+            return stop.value
+
+        kind, arguments = effect
+        outcome, error = None, None
+
+        try:
+            if kind == "llm":
+                outcome = trace.llm(*arguments)
+            else:
+                outcome = trace.tools(arguments)
+        except Exception as e:
+            error = e
+
+
+def ensure_data_steps(state, ocr_profile=None):
+    """
+    Runs the cv / ocr tools the agent has not called yet.
+    """
+
+    image_path = state["image_path"]
+
+    if state["stats"] is None:
+        results = yield "tools", [("get_component_stats", {"image_path": image_path})]
+        state["stats"] = results[0]
+
+    if state["ic_info"] is None:
+        arguments = {"image_path": image_path}
+        if ocr_profile:
+            arguments["ocr_profile"] = ocr_profile
+        results = yield "tools", [("get_ic_info", arguments)]
+        state["ic_info"] = results[0]
+
+    return state
+
+
+def ensure_data(state, ocr_profile=None, trace=None):
+    return drive(ensure_data_steps(state, ocr_profile), trace)
+
+
+def rules_result(state, source="rules", reason=None, llm_metrics=None, steps_used=0):
+    result = {
+        "status": "success",
+        "source": source,
+        "result": estimate_bom(state["stats"], state["ic_info"]),
+        "steps_used": steps_used,
+        "llm_metrics": llm_metrics or []
+    }
+
+    if reason:
+        result["reason"] = reason
+
+    return result
+
+
+def rules_steps(image_path, ocr_profile=None):
+    state = yield from ensure_data_steps(new_state(image_path), ocr_profile)
+    return rules_result(state)
+
+
+def run_rules(image_path: str, ocr_profile: str = None, trace=None):
+    """
+    Standalone mode: cv + ocr tools and the rule based estimator, no LLM.
+    """
+
+    return drive(rules_steps(image_path, ocr_profile), trace)
+
+
+def llm_fallback_steps(state, error, llm_metrics, steps_used, ocr_profile=None):
+    print("\n--- LLM UNAVAILABLE, USING RULE BASED ESTIMATE ---")
+    print(error)
+
+    try:
+        yield from ensure_data_steps(state, ocr_profile)
+    except Exception as e:
+        return {
+            "status": "error",
+            "reason": f"tool_execution_failed: {str(e)}"
+        }
+
+    reason = f"llm_unavailable: {getattr(error, 'reason', type(error).__name__)}"
+    return rules_result(state, "rules_fallback", reason, llm_metrics, steps_used)
+
+
+def llm_fallback(state, error, llm_metrics, steps_used, ocr_profile=None, trace=None):
+    return drive(llm_fallback_steps(state, error, llm_metrics, steps_used, ocr_profile), trace)
+
+
+def unavailable_steps(error, state, llm_metrics, steps_used, ocr_profile, fallback):
+    # an llm that cannot be reached: rule based answer, busy result or raise
+    if fallback:
+        return (yield from llm_fallback_steps(state, error, llm_metrics, steps_used, ocr_profile))
+    if isinstance(error, LLMBusyError):
+        return busy_result(error, llm_metrics)
+    raise error
+
+
+def busy_result(error, llm_metrics):
+    # overload: fail fast so the caller can retry later
+    return {
+        "status": "busy",
+        "reason": f"llm_busy: {error.reason}",
+        "waited_s": error.waited_s,
+        "queue_depth": error.queue_depth,
+        "llm_metrics": llm_metrics
+    }
+
+
+# reflect only when the local validator finds the answer inconsistent
+CONDITIONAL_REFLECTION = True
+
+
+def reflection_issues(final, state):
+    """
+    Inconsistencies between the answer and the observed data. The
+    reflection call is skipped when there are none.
+    """
+
+    issues = validate_answer(final, build_reasoning_input(state))
+
+    if not CONDITIONAL_REFLECTION and not issues:
+        issues = ["conditional reflection disabled"]
+
+    print("\n--- VALIDATOR ---")
+    print(issues or "consistent, reflection skipped")
+
+    return issues
+
+
+def apply_reflection(final, reflection_response):
+    print("\n--- Reflection Response ---")
+    print(reflection_response)
+
+    if isinstance(reflection_response, dict) and "final_answer" in reflection_response:
+        return reflection_response["final_answer"]
+
+    return final
+
+
+def reflect_steps(final, state, tools, priority, llm_metrics,
+                  unavailable_errors=LLM_UNAVAILABLE_ERRORS):
+    try:
+        reflection_response, metrics = yield "llm", (
+            build_reflection_messages(final, state), tools, False, priority, "reflection"
+        )
+    except unavailable_errors:
+        # keep the unreviewed answer rather than failing the run
+        print("\n--- Reflection skipped: LLM unavailable ---")
+        record_validation(True)
+        return final
+
+    llm_metrics.append(metrics)
+    record_validation(True, metrics["wall_ms"])
+
+    return apply_reflection(final, reflection_response)
+
+
+def reflect_answer(final, state, tools, priority, llm_metrics, trace=None):
+    return drive(reflect_steps(final, state, tools, priority, llm_metrics), trace)
+
+
+# tools every analysis ends up calling, run up front in single pass mode
+SINGLE_PASS_TOOLS = ["get_component_stats", "get_ic_info"]
+
+
+def single_pass_calls(image_path, ocr_profile=None):
+    calls = []
+
+    for tool_name in SINGLE_PASS_TOOLS:
+        arguments = {"image_path": image_path}
+        if ocr_profile and tool_name == "get_ic_info":
+            arguments["ocr_profile"] = ocr_profile
+        calls.append((tool_name, arguments))
+
+    return calls
+
+
+def batch_response(calls):
+    # the turn as if the llm had requested every call at once
+    return {
+        "tool_calls": [{"name": name, "arguments": arguments} for name, arguments in calls]
+    }
+
+
+def single_pass_steps(image_path, ocr_profile=None, priority=PRIORITY_NORMAL, reflect=False,
+                      fallback=True, unavailable_errors=LLM_UNAVAILABLE_ERRORS):
+    """
+    No tool selection round trips: cv and ocr start together as soon as
+    the image arrives, then a single llm call writes the answer.
+    """
+
+    tools = get_tool_specs()
+
+    messages = initial_messages(image_path)
+    state = new_state(image_path)
+    llm_metrics = []
+
+    calls = single_pass_calls(image_path, ocr_profile)
+
+    # cv and ocr run concurrently on their worker pools
+    try:
+        tool_results = yield "tools", calls
+    except Exception as e:
+        return {
+            "status": "error",
+            "reason": f"tool_execution_failed: {str(e)}"
+        }
+
+    response = batch_response(calls)
+    record_tool_results(state, messages, response, list(zip([name for name, _ in calls], tool_results)))
+
+    try:
+        response, metrics = yield "llm", (with_state(messages, state), tools, False,
+                                          priority, "final_answer")
+        llm_metrics.append(metrics)
+
+        print("\n--- LLM Response ---")
+        print(response)
+
+    except unavailable_errors as e:
+        return (yield from unavailable_steps(e, state, llm_metrics, 0, ocr_profile, fallback))
+
+    if not isinstance(response, dict) or "final_answer" not in response:
+        return {
+            "status": "error",
+            "reason": "unknown_response_structure",
+            "raw_response": response
+        }
+
+    final = response["final_answer"]
+
+    if reflect:
+        if reflection_issues(final, state):
+            final = yield from reflect_steps(final, state, tools, priority, llm_metrics,
+                                             unavailable_errors)
+        else:
+            record_validation(False)
+
+    return {
+        "status": "success",
+        "source": "llm",
+        "mode": "single_pass",
+        "result": final,
+        "preliminary": estimate_bom(state["stats"], state["ic_info"]),
+        "steps_used": 1,
+        "llm_metrics": llm_metrics
+    }
+
+
+def run_single_pass(image_path: str, ocr_profile: str = None,
+                    priority: int = PRIORITY_NORMAL, reflect: bool = False,
+                    fallback: bool = True, trace=None):
+    return drive(single_pass_steps(image_path, ocr_profile, priority, reflect, fallback), trace)
+
+
+def run_agent(image_path: str, max_steps: int = 6, ocr_profile: str = None,
+              priority: int = PRIORITY_NORMAL, mode: str = "agent", fallback: bool = True,
+              reflect: bool = False, trace=None):
+    """
+    mode "agent": llm driven tool loop; "single_pass": cv + ocr in parallel,
+    then one llm call; "rules": rule based estimate only.
+    reflect: single pass answers also get the reflection step (the agent
+    loop always validates and reflects).
+    With fallback, an unreachable or overloaded llm yields the rule based
+    estimate (source "rules_fallback") instead of an error.
+    Runs are traced with AGENT_TRACE=1 (agent_trace); pass a TraceReplayer
+    to replay one.
+    """
+
+    if trace is None:
+        trace = start_trace(
+            image_path=image_path, max_steps=max_steps, ocr_profile=ocr_profile,
+            priority=priority, mode=mode, fallback=fallback, reflect=reflect
+        )
+
+    with span("agent.run_agent", image_path=image_path, mode=mode, ocr_profile=ocr_profile) as s:
+        try:
+            result = run_mode(image_path, max_steps, ocr_profile, priority, mode, fallback,
+                              trace, reflect)
+        except Exception as e:
+            trace.finish({"status": "exception", "reason": f"{type(e).__name__}: {e}"})
+            raise
+
+        s.set_attributes({"status": result.get("status"), "source": result.get("source")})
+
+    trace.finish(result)
+    return result
+
+
+def mode_steps(image_path, max_steps, ocr_profile, priority, mode, fallback,
+               unavailable_errors=LLM_UNAVAILABLE_ERRORS, reflect=False):
+    if mode == "rules":
+        return rules_steps(image_path, ocr_profile)
+
+    if mode == "single_pass":
+        return single_pass_steps(image_path, ocr_profile, priority, reflect, fallback,
+                                 unavailable_errors)
+
+    return agent_steps(image_path, max_steps, ocr_profile, priority, fallback, unavailable_errors)
+
+
+def run_mode(image_path, max_steps, ocr_profile, priority, mode, fallback, trace, reflect=False):
+    steps = mode_steps(image_path, max_steps, ocr_profile, priority, mode, fallback,
+                       reflect=reflect)
+
+    # a replay must not touch cv / ocr
+    if mode != "agent" or not SPECULATIVE_PREFETCH or trace.replaying:
+        return drive(steps, trace)
+
+    start_prefetch(image_path, ocr_profile)
+    try:
+        result = drive(steps, trace)
+    finally:
+        prefetch = finish_prefetch(image_path)
+
+    result["prefetch"] = prefetch
+    return result
+
+
+def agent_steps(image_path, max_steps, ocr_profile, priority, fallback,
+                unavailable_errors=LLM_UNAVAILABLE_ERRORS):
+    tools = get_tool_specs()
+
+    messages = initial_messages(image_path)
+    state = new_state(image_path)
+
+    used_tools = []
+    last_turn_tools = []
+    llm_metrics = []
+
+    for step in range(max_steps):
+
+        messages_with_state = with_state(messages, state)
+
+        print("\n--- STEP ---", step + 1)
+        print("\n--- STATE SIZE ---")
+        print(len(json.dumps(state)))
+        print("\n--- PROMPT TOKENS ---")
+        print(sum(estimate_tokens(m["content"]) for m in messages_with_state))
+
+        route = select_route(state)
+
+        try:
+            response, metrics = yield "llm", (messages_with_state, tools, True, priority, route)
+            llm_metrics.append(metrics)
+
+            print("\n--- LLM Response ---")
+            print(response)
+
+            response = override_response(response, state)
+
+            if needs_escalation(response, route):
+                print("\n--- ESCALATING: final answer model ---")
+                response, metrics = yield "llm", (messages_with_state, tools, True, priority, "final_answer")
+                llm_metrics.append(metrics)
+
+        except unavailable_errors as e:
+            return (yield from unavailable_steps(e, state, llm_metrics, step, ocr_profile, fallback))
+
+        if not isinstance(response, dict):
+            return {
+                "status": "error",
+                "reason": "invalid_response_format",
+                "raw": response
+            }
+
+        # tool call(s)
+        if is_tool_response(response):
+
+            calls, error = prepare_tool_calls(response, tools, last_turn_tools, ocr_profile)
+            if error:
+                return error
+
+            # independent calls run concurrently (cv pool / ocr worker)
+            try:
+                tool_results = yield "tools", calls
+            except Exception as e:
+                return {
+                    "status": "error",
+                    "reason": f"tool_execution_failed: {str(e)}"
                 }
-            ]
 
-            reflection_response = run_llm(reflection_messages, tools)
+            last_turn_tools = [name for name, _ in calls]
+            used_tools.extend(last_turn_tools)
+            record_tool_results(state, messages, response, list(zip(last_turn_tools, tool_results)))
 
-            print("\n--- Reflection Response ---")
-            print(reflection_response)
+        # final answer
+        elif "final_answer" in response:
+
+            final = response["final_answer"]
+            issues = reflection_issues(final, state)
 
-            if isinstance(reflection_response, dict) and "final_answer" in reflection_response:
-                final = reflection_response["final_answer"]
+            if issues:
+                final = yield from reflect_steps(final, state, tools, priority, llm_metrics,
+                                                 unavailable_errors)
+            else:
+                record_validation(False)
 
             return {
                 "status": "success",
+                "source": "llm",
                 "result": final,
-                "steps_used": step + 1
+                "validation_issues": issues,
+                "preliminary": estimate_bom(state["stats"], state["ic_info"]),
+                "steps_used": step + 1,
+                "llm_metrics": llm_metrics
             }
 
         # unknown
@@ -241,5 +775,10 @@ Respond ONLY in JSON format:
     # max steps
     return {
         "status": "max_steps_exceeded",
-        "messages": messages
+        "messages": messages,
+        "llm_metrics": llm_metrics
     }
+
+
+def agent_loop(image_path, max_steps, ocr_profile, priority, fallback, trace):
+    return drive(agent_steps(image_path, max_steps, ocr_profile, priority, fallback), trace)
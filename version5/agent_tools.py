@@ -1,16 +1,84 @@
 # tools.py
 
 import json
+import time
+import threading
 import cv2
+from concurrent.futures import ThreadPoolExecutor, wait
+from tracing import span, in_context
 from cv_pipeline import run_cv
-from ocr import read_full_image_text, extract_reference_counts, filter_ic_candidates
+from ocr import (
+    read_full_image_results,
+    extract_reference_counts,
+    filter_ic_candidates,
+    OCR_PROFILES,
+    DEFAULT_OCR_PROFILE
+)
 
 # cache for cv results
 CV_CACHE = {}
 
-def get_cv_result(image_path: str):
-    if image_path not in CV_CACHE:
-        CV_CACHE[image_path] = run_cv(image_path)
+# cache for ocr results, keyed by (image_path, ocr_profile)
+OCR_CACHE = {}
+
+# the text boxes behind OCR_CACHE entries (for exports), same keys
+OCR_RESULTS = {}
+
+# tools run on a worker pool named by their "worker" entry.
+# paddle predictors are not thread safe, so ocr gets a single worker.
+WORKER_SIZES = {"cv": 4, "ocr": 1}
+
+# pools whose tools never run on the calling thread, not even a lone
+# call or a prefetch miss: a second paddle call at once would share the
+# predictor
+POOL_ONLY_WORKERS = {"ocr"}
+
+_EXECUTORS = {}
+_executor_lock = threading.Lock()
+
+# which pool the current thread belongs to
+_worker_local = threading.local()
+
+_cv_locks = {}
+
+# speculative prefetch: cv and ocr start as soon as an analysis begins,
+# while the llm is still deciding which tool to call. keyed by image path.
+PREFETCH_TOOLS = ["run_cv", "get_ic_info"]
+
+# requested tool -> prefetched tool whose work it reuses
+PREFETCH_SOURCES = {
+    "run_cv": "run_cv",
+    "get_component_stats": "run_cv",
+    "get_ic_info": "get_ic_info"
+}
+
+PREFETCH_STATS = {
+    "started": 0,
+    "hits": 0,        # finished before the tool was requested
+    "waited": 0,      # still running when requested, joined instead of rerun
+    "misses": 0,      # not started yet when requested, ran on request
+    "wasted": 0,      # ran but the analysis never asked for it
+    "cancelled": 0,   # dropped before it started
+    "saved_s": 0.0
+}
+
+_PREFETCHES = {}
+_prefetch_lock = threading.Lock()
+
+# prefetches still running after their analysis finished, by image path:
+# they fill the caches when done, so evict_caches waits for them
+_UNFINISHED_PREFETCHES = {}
+
+
+def get_cv_result(image_path: str, image=None):
+    # cv tools may run concurrently on the same image, compute it once
+    with _executor_lock:
+        lock = _cv_locks.setdefault(image_path, threading.Lock())
+
+    with lock:
+        if image_path not in CV_CACHE:
+            CV_CACHE[image_path] = run_cv(image_path, image)
+
     return CV_CACHE[image_path]
 
 # tool implementations
@@ -91,11 +159,22 @@ def get_component_stats_tool(image_path: str):
         "type_counts": type_counts
     }
 
-def get_ic_info_tool(image_path: str):
-    image = cv2.imread(image_path)
+def get_ic_info_tool(image_path: str, ocr_profile: str = DEFAULT_OCR_PROFILE):
+    key = (image_path, ocr_profile)
+    if key not in OCR_CACHE:
+        OCR_CACHE[key] = read_ic_info(image_path, ocr_profile)
+    return OCR_CACHE[key]
+
+
+def read_ic_info(image_path: str, ocr_profile: str = DEFAULT_OCR_PROFILE, image=None):
+    if image is None:
+        image = cv2.imread(image_path)
 
     try:
-        texts = read_full_image_text(image)
+        results = read_full_image_results(image, ocr_profile)
+        OCR_RESULTS[(image_path, ocr_profile)] = results
+
+        texts = [res["text"] for res in results]
         ref_counts = extract_reference_counts(texts)
         ic_names = filter_ic_candidates(texts)
 
@@ -120,17 +199,251 @@ def get_ic_info_tool(image_path: str):
         "possible_ic_names": ic_names[:10]
     }
 
+def warm_cv_cache(image_path: str, image=None):
+    # staged pipeline: cv done ahead of the agent, from a decoded image
+    get_cv_result(image_path, image)
+
+
+def warm_ocr_cache(image_path: str, ocr_profile: str = None, image=None):
+    key = (image_path, ocr_profile or DEFAULT_OCR_PROFILE)
+    if key not in OCR_CACHE:
+        OCR_CACHE[key] = read_ic_info(image_path, key[1], image)
+
+
+def board_data(image_path: str):
+    """
+    (cv result without the visualization, ocr text boxes) cached for an
+    image, for exporters. Either part may be None.
+    """
+
+    cv_result = CV_CACHE.get(image_path)
+    if cv_result is not None:
+        cv_result = {k: v for k, v in cv_result.items() if k != "visualization"}
+
+    ocr_results = next((v for k, v in list(OCR_RESULTS.items()) if k[0] == image_path), None)
+
+    return cv_result, ocr_results
+
+
+def evict_caches(image_path: str):
+    # batch runs would otherwise keep every board's cv output in memory.
+    # a prefetch still running would fill the caches again after this
+    with _prefetch_lock:
+        futures = _UNFINISHED_PREFETCHES.pop(image_path, [])
+    wait(futures)
+
+    CV_CACHE.pop(image_path, None)
+
+    for key in [k for k in list(OCR_CACHE) if k[0] == image_path]:
+        OCR_CACHE.pop(key, None)
+        OCR_RESULTS.pop(key, None)
+
+    with _executor_lock:
+        _cv_locks.pop(image_path, None)
+
+
 # tool execuion
 def execute_tool(tool_name: str, arguments: dict):
     if tool_name not in TOOLS:
         raise ValueError(f"Tool {tool_name} not found.")
 
-    tool = TOOLS[tool_name]
-    func = tool["function"]
+    with span(f"tool.{tool_name}", **arguments) as s:
+        prefetched = use_prefetch(tool_name, arguments)
+        s.set("prefetched", prefetched is not None)
+
+        # component stats only reuse the prefetched cv run through CV_CACHE
+        if prefetched is not None and PREFETCH_SOURCES[tool_name] == tool_name:
+            return prefetched
+
+        return run_tool(tool_name, arguments)
+
+
+def run_tool(tool_name: str, arguments: dict):
+    func = TOOLS[tool_name]["function"]
+    worker = TOOLS[tool_name].get("worker", "cv")
+
+    if worker in POOL_ONLY_WORKERS and getattr(_worker_local, "worker", None) != worker:
+        return get_tool_executor(tool_name).submit(in_context(func, **arguments)).result()
 
     return func(**arguments)
 
 
+def _mark_worker(worker):
+    _worker_local.worker = worker
+
+
+def _prefetch_arguments(tool_name, arguments):
+    arguments = arguments or {}
+    key = {"image_path": arguments.get("image_path")}
+
+    if tool_name == "get_ic_info":
+        key["ocr_profile"] = arguments.get("ocr_profile") or DEFAULT_OCR_PROFILE
+
+    return key
+
+
+def _run_prefetch(entry, tool_name):
+    entry["started"] = time.perf_counter()
+    try:
+        with span(f"prefetch.{tool_name}", **entry["arguments"]):
+            return run_tool(tool_name, entry["arguments"])
+    finally:
+        entry["finished"] = time.perf_counter()
+
+
+def start_prefetch(image_path: str, ocr_profile: str = None):
+    """
+    Starts PREFETCH_TOOLS in the background on their worker pools.
+    """
+
+    with _prefetch_lock:
+        if image_path in _PREFETCHES:
+            return
+
+        entries = {}
+        for tool_name in PREFETCH_TOOLS:
+            entry = {
+                "arguments": _prefetch_arguments(
+                    tool_name, {"image_path": image_path, "ocr_profile": ocr_profile}
+                ),
+                "outcome": None,
+                "started": None,
+                "finished": None
+            }
+            entry["future"] = get_tool_executor(tool_name).submit(
+                in_context(_run_prefetch, entry, tool_name)
+            )
+            entries[tool_name] = entry
+
+        _PREFETCHES[image_path] = entries
+        PREFETCH_STATS["started"] += len(entries)
+
+
+def use_prefetch(tool_name: str, arguments: dict):
+    """
+    Result of the matching prefetch, waiting for it if it is running.
+    None when there is nothing to reuse and the tool should just run.
+    """
+
+    source = PREFETCH_SOURCES.get(tool_name)
+    key = _prefetch_arguments(source, arguments)
+
+    with _prefetch_lock:
+        entry = _PREFETCHES.get(key["image_path"], {}).get(source)
+
+        if entry is None or entry["arguments"] != key:
+            return None
+
+        future = entry["future"]
+
+        if entry["outcome"] is None:
+            if future.done():
+                entry["outcome"] = "hit"
+                PREFETCH_STATS["hits"] += 1
+                PREFETCH_STATS["saved_s"] += entry["finished"] - entry["started"]
+            elif TOOLS[source].get("worker", "cv") not in POOL_ONLY_WORKERS and future.cancel():
+                # still queued behind other work: cheaper to run it here.
+                # a pool-only tool would queue again on the same pool, so
+                # its queued prefetch is waited for instead
+                entry["outcome"] = "miss"
+                PREFETCH_STATS["misses"] += 1
+            else:
+                entry["outcome"] = "waited"
+                PREFETCH_STATS["waited"] += 1
+                if entry["started"] is not None:
+                    PREFETCH_STATS["saved_s"] += time.perf_counter() - entry["started"]
+
+    if future.cancelled():
+        return None
+
+    return future.result()
+
+
+def finish_prefetch(image_path: str):
+    """
+    Ends the analysis' prefetch: queued work is cancelled, unused work
+    counts as wasted. Returns {tool_name: outcome}.
+    """
+
+    with _prefetch_lock:
+        entries = _PREFETCHES.pop(image_path, {})
+        summary = {}
+
+        # callers that never evict (app.py) would otherwise keep them all
+        for path in [p for p, fs in _UNFINISHED_PREFETCHES.items() if all(f.done() for f in fs)]:
+            del _UNFINISHED_PREFETCHES[path]
+
+        for tool_name, entry in entries.items():
+            if entry["outcome"] is None:
+                if entry["future"].cancel():
+                    entry["outcome"] = "cancelled"
+                    PREFETCH_STATS["cancelled"] += 1
+                else:
+                    # running cv / ocr cannot be interrupted, it just finishes
+                    entry["outcome"] = "wasted"
+                    PREFETCH_STATS["wasted"] += 1
+
+            if not entry["future"].done():
+                _UNFINISHED_PREFETCHES.setdefault(image_path, []).append(entry["future"])
+
+            summary[tool_name] = entry["outcome"]
+
+    return summary
+
+
+def prefetch_metrics():
+    with _prefetch_lock:
+        stats = dict(PREFETCH_STATS)
+
+    started = stats["started"]
+    stats["hit_rate"] = (stats["hits"] + stats["waited"]) / started if started else 0.0
+    stats["waste_rate"] = stats["wasted"] / started if started else 0.0
+
+    return stats
+
+
+def timed_execute_tool(tool_name: str, arguments: dict):
+    start = time.perf_counter()
+    result = execute_tool(tool_name, arguments)
+    return result, time.perf_counter() - start
+
+
+def execute_tools(calls, timed=False):
+    """
+    Runs [(tool_name, arguments)] concurrently, each on its tool's worker
+    pool. Returns the results in call order; the first failure is raised.
+    With timed, each result is a (result, duration_s) pair.
+    """
+
+    func = timed_execute_tool if timed else execute_tool
+
+    if len(calls) == 1:
+        tool_name, arguments = calls[0]
+        return [func(tool_name, arguments)]
+
+    futures = [
+        get_tool_executor(tool_name).submit(in_context(func, tool_name, arguments))
+        for tool_name, arguments in calls
+    ]
+
+    return [future.result() for future in futures]
+
+
+def get_tool_executor(tool_name: str):
+    worker = TOOLS[tool_name].get("worker", "cv")
+
+    with _executor_lock:
+        if worker not in _EXECUTORS:
+            _EXECUTORS[worker] = ThreadPoolExecutor(
+                max_workers=WORKER_SIZES[worker],
+                thread_name_prefix=f"{worker}-worker",
+                initializer=_mark_worker,
+                initargs=(worker,)
+            )
+
+    return _EXECUTORS[worker]
+
+
 def get_tool_specs():
     specs = []
 
@@ -148,6 +461,7 @@ TOOLS = {
     "run_cv": {
         "description": "Detect PCB and return summarized component features.",
         "function": run_cv_tool,
+        "worker": "cv",
         "parameters": {
             "type": "object",
             "properties": {
@@ -162,6 +476,7 @@ TOOLS = {
     "get_component_stats": {
         "description": "Get component statistics (count, area, coverage) from PCB image.",
         "function": get_component_stats_tool,
+        "worker": "cv",
         "parameters": {
             "type": "object",
             "properties": {
@@ -176,11 +491,16 @@ TOOLS = {
     "get_ic_info": {
         "description": "Get IC chip count and names from PCB image.",
         "function": get_ic_info_tool,
+        "worker": "ocr",
         "parameters": {
             "type": "object",
             "properties": {
                 "image_path": {
                     "type": "string"
+                },
+                "ocr_profile": {
+                    "type": "string",
+                    "enum": list(OCR_PROFILES)
                 }
             },
             "required": ["image_path"]
@@ -0,0 +1,407 @@
+# agent_trace.py
+
+# Append-only JSONL trace of one run_agent call: every prompt, raw llm
+# reply (timing, tokens), tool call (arguments, result, duration) and the
+# final status. A trace can be replayed offline: the agent loop runs again
+# with llm replies and tool results served from the file, so neither
+# ollama nor cv / ocr is needed.
+
+import os
+import sys
+import json
+import time
+import uuid
+import threading
+import requests
+from llm_limiter import LLMBusyError
+from llm_client import LLMRequestError, LLMStreamError, RetryableStatusError
+from agent_tools import execute_tool, execute_tools
+from llm_pipeline import call_agent_llm, parse_agent_result, MODEL_ROUTES, MISSING_MODELS, AGENT_DECODING
+
+# off by default: every traced run writes a file. AGENT_TRACE=1 enables it
+TRACE_ENABLED = os.environ.get("AGENT_TRACE", "0") == "1"
+TRACE_DIR = os.environ.get("AGENT_TRACE_DIR", "traces")
+
+# oldest traces are deleted past either limit when a new one starts
+TRACE_MAX_FILES = int(os.environ.get("AGENT_TRACE_MAX_FILES", "500"))
+TRACE_MAX_MB = float(os.environ.get("AGENT_TRACE_MAX_MB", "200"))
+
+_rotate_lock = threading.Lock()
+
+# result entries that depend on the environment rather than the loop
+REPLAY_IGNORED_KEYS = ["prefetch"]
+
+
+class ReplayError(Exception):
+    pass
+
+
+def _json_default(o):
+    # numpy scalars / arrays from the cv pipeline
+    if hasattr(o, "tolist"):
+        return o.tolist()
+    return str(o)
+
+
+def to_json(obj):
+    return json.dumps(obj, default=_json_default)
+
+
+def error_info(e):
+    # a 5xx carries its status on the response, a rejected request on itself
+    response = getattr(e, "response", None)
+
+    return {
+        "type": type(e).__name__,
+        "module": type(e).__module__,
+        "message": str(e),
+        "status_code": getattr(e, "status_code", None) or getattr(response, "status_code", None),
+        "detail": getattr(e, "detail", None),
+        "reason": getattr(e, "reason", None),
+        "waited_s": getattr(e, "waited_s", None),
+        "queue_depth": getattr(e, "queue_depth", None)
+    }
+
+
+class Trace:
+    """
+    No recording: llm and tools are called directly. The agent goes
+    through one of these (or a subclass) for every llm and tool call.
+    """
+
+    replaying = False
+    path = None
+
+    def llm(self, messages, tools, allow_tools, priority, route):
+        result = call_agent_llm(messages, tools, allow_tools, priority, route)
+        return parse_agent_result(result), result["metrics"]
+
+    def tools(self, calls):
+        return execute_tools(calls)
+
+    def tool(self, tool_name, arguments):
+        return execute_tool(tool_name, arguments)
+
+    # for callers that make the calls themselves (async_agent)
+
+    def record_llm(self, messages, allow_tools, route, duration_ms, result=None, error=None):
+        pass
+
+    def record_tools(self, calls, duration_ms, timed=None, error=None):
+        pass
+
+    def finish(self, result):
+        pass
+
+
+def rotate_traces(trace_dir, max_files=None, max_mb=None):
+    """
+    Deletes the oldest trace files until at most max_files remain and
+    they take at most max_mb. Returns the number deleted.
+    """
+
+    max_files = TRACE_MAX_FILES if max_files is None else max_files
+    max_mb = TRACE_MAX_MB if max_mb is None else max_mb
+
+    with _rotate_lock:
+        traces = []
+        for name in os.listdir(trace_dir):
+            if name.endswith(".jsonl"):
+                path = os.path.join(trace_dir, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:  # removed by another process
+                    continue
+                traces.append((stat.st_mtime, stat.st_size, path))
+
+        traces.sort()
+        total_bytes = sum(size for _, size, _ in traces)
+        deleted = 0
+
+        for _, size, path in traces:
+            if len(traces) - deleted <= max_files and total_bytes <= max_mb * 1024 * 1024:
+                break
+
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+            deleted += 1
+            total_bytes -= size
+
+    return deleted
+
+
+class TraceRecorder(Trace):
+    def __init__(self, run_info, trace_dir=None):
+        trace_dir = trace_dir or TRACE_DIR
+        os.makedirs(trace_dir, exist_ok=True)
+
+        # room for this run's file
+        rotate_traces(trace_dir, max_files=max(TRACE_MAX_FILES - 1, 0))
+
+        self.run_id = uuid.uuid4().hex[:12]
+        self.path = os.path.join(trace_dir, f"{time.strftime('%Y%m%d-%H%M%S')}-{self.run_id}.jsonl")
+
+        # line buffered: a crashed run still leaves every finished event
+        self._file = open(self.path, "a", buffering=1)
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+
+        self.write("run_start", **run_info)
+
+    def write(self, event, **fields):
+        record = {
+            "event": event,
+            "run_id": self.run_id,
+            "t_ms": (time.perf_counter() - self._start) * 1000
+        }
+        record.update(fields)
+
+        line = to_json(record)
+
+        with self._lock:
+            if not self._file.closed:
+                self._file.write(line + "\n")
+
+    def record_llm(self, messages, allow_tools, route, duration_ms, result=None, error=None):
+        event = {"route": route, "allow_tools": allow_tools, "messages": messages,
+                 "duration_ms": duration_ms}
+
+        if error is not None:
+            self.write("llm_call", error=error_info(error), **event)
+        else:
+            self.write("llm_call", result=result, **event)
+
+    def record_tools(self, calls, duration_ms, timed=None, error=None):
+        recorded = [{"name": name, "arguments": arguments} for name, arguments in calls]
+
+        if error is not None:
+            self.write("tool_calls", calls=recorded, error=error_info(error), duration_ms=duration_ms)
+            return
+
+        for call, (result, duration_s) in zip(recorded, timed):
+            call["result"] = result
+            call["duration_ms"] = duration_s * 1000
+
+        self.write("tool_calls", calls=recorded, duration_ms=duration_ms)
+
+    def llm(self, messages, tools, allow_tools, priority, route):
+        start = time.perf_counter()
+
+        try:
+            result = call_agent_llm(messages, tools, allow_tools, priority, route)
+        except Exception as e:
+            self.record_llm(messages, allow_tools, route, (time.perf_counter() - start) * 1000, error=e)
+            raise
+
+        self.record_llm(messages, allow_tools, route, (time.perf_counter() - start) * 1000, result=result)
+
+        return parse_agent_result(result), result["metrics"]
+
+    def tools(self, calls):
+        start = time.perf_counter()
+
+        try:
+            timed = execute_tools(calls, timed=True)
+        except Exception as e:
+            self.record_tools(calls, (time.perf_counter() - start) * 1000, error=e)
+            raise
+
+        self.record_tools(calls, (time.perf_counter() - start) * 1000, timed=timed)
+
+        return [result for result, _ in timed]
+
+    def tool(self, tool_name, arguments):
+        return self.tools([(tool_name, arguments)])[0]
+
+    def finish(self, result):
+        self.write("run_end", status=(result or {}).get("status"), result=result)
+
+        with self._lock:
+            self._file.close()
+
+
+def start_trace(**run_info):
+    if not TRACE_ENABLED:
+        return Trace()
+
+    run_info["config"] = {"model_routes": MODEL_ROUTES, "missing_models": sorted(MISSING_MODELS),
+                          "decoding": AGENT_DECODING}
+
+    try:
+        return TraceRecorder(run_info)
+    except OSError as e:
+        # tracing must never stop an analysis
+        print("\n--- TRACE DISABLED ---")
+        print(e)
+        return Trace()
+
+
+def load_trace(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def replay_error(info):
+    """
+    The recorded llm error, rebuilt as its own type so the agent handles
+    it as it did live. Async (httpx) errors come back as their requests
+    counterparts, which both agents treat alike.
+    """
+
+    kind = info["type"]
+
+    if kind == "LLMBusyError":
+        return LLMBusyError(info["reason"], info["waited_s"] or 0.0, info["queue_depth"] or 0)
+
+    if kind == "LLMRequestError":
+        return LLMRequestError(info["status_code"], info["detail"])
+
+    if kind == "RetryableStatusError":
+        response = requests.models.Response()
+        response.status_code = info["status_code"]
+        return RetryableStatusError(response)
+
+    if kind == "LLMStreamError":
+        return LLMStreamError(info["message"])
+
+    if (info.get("module") or "").startswith("httpx"):
+        # a transport error of the async client: connection, timeout, protocol
+        kind = "Timeout" if kind.endswith("Timeout") else "ConnectionError"
+
+    error_type = getattr(requests.exceptions, kind, None)
+    if isinstance(error_type, type) and issubclass(error_type, requests.exceptions.RequestException):
+        return error_type(info["message"])
+
+    raise ReplayError(f"cannot replay a recorded {kind} error: {info['message']}")
+
+
+class TraceReplayer(Trace):
+    """
+    Serves the recorded llm replies and tool results in order. Prompts and
+    tool calls that differ from the recording are listed in mismatches.
+    """
+
+    replaying = True
+
+    def __init__(self, events):
+        if not events or events[0]["event"] != "run_start":
+            raise ReplayError("trace does not start with run_start")
+
+        self.run_start = events[0]
+        self.run_end = next((e for e in events if e["event"] == "run_end"), None)
+        self.calls = [e for e in events if e["event"] in ("llm_call", "tool_calls")]
+        self.position = 0
+        self.mismatches = []
+
+    def _next(self, event):
+        if self.position >= len(self.calls):
+            raise ReplayError(f"trace has no recorded {event} left")
+
+        record = self.calls[self.position]
+        self.position += 1
+
+        if record["event"] != event:
+            raise ReplayError(f"expected {record['event']} at call {self.position}, agent made {event}")
+
+        return record
+
+    def llm(self, messages, tools, allow_tools, priority, route):
+        record = self._next("llm_call")
+
+        if record["route"] != route:
+            self.mismatches.append(f"call {self.position}: route {route}, recorded {record['route']}")
+        if to_json(messages) != to_json(record["messages"]):
+            self.mismatches.append(f"call {self.position}: prompt differs from the recording")
+
+        if "error" in record:
+            raise replay_error(record["error"])
+
+        result = record["result"]
+        return parse_agent_result(result), result["metrics"]
+
+    def tools(self, calls):
+        record = self._next("tool_calls")
+
+        requested = [[name, arguments] for name, arguments in calls]
+        recorded = [[c["name"], c["arguments"]] for c in record["calls"]]
+
+        if to_json(requested) != to_json(recorded):
+            self.mismatches.append(f"call {self.position}: tools {requested}, recorded {recorded}")
+
+        if "error" in record:
+            raise Exception(record["error"]["message"])
+
+        return [c["result"] for c in record["calls"]]
+
+    def tool(self, tool_name, arguments):
+        return self.tools([(tool_name, arguments)])[0]
+
+
+def comparable(result):
+    return to_json({k: v for k, v in (result or {}).items() if k not in REPLAY_IGNORED_KEYS})
+
+
+def replay_trace(path):
+    """
+    Re-runs the agent loop against a recorded trace. Returns the new
+    result, whether it matches the recorded one, and any divergence.
+    """
+
+    from agent import run_agent
+
+    replayer = TraceReplayer(load_trace(path))
+    info = replayer.run_start
+
+    start = time.perf_counter()
+    try:
+        result = run_agent(
+            info["image_path"],
+            max_steps=info["max_steps"],
+            ocr_profile=info["ocr_profile"],
+            priority=info["priority"],
+            mode=info["mode"],
+            fallback=info["fallback"],
+            reflect=info.get("reflect", False),
+            trace=replayer
+        )
+    except ReplayError as e:
+        result = {"status": "replay_error", "reason": str(e)}
+    replay_ms = (time.perf_counter() - start) * 1000
+
+    recorded = (replayer.run_end or {}).get("result")
+
+    return {
+        "result": result,
+        "recorded_status": (replayer.run_end or {}).get("status"),
+        "matches": recorded is not None and comparable(result) == comparable(recorded),
+        "mismatches": replayer.mismatches,
+        "unused_calls": len(replayer.calls) - replayer.position,
+        "replay_ms": replay_ms
+    }
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("usage: python agent_trace.py <trace.jsonl> [...]")
+        sys.exit(1)
+
+    failed = 0
+
+    for trace_path in sys.argv[1:]:
+        res = replay_trace(trace_path)
+        ok = res["matches"] and not res["mismatches"] and not res["unused_calls"]
+        failed += not ok
+
+        print(f"\n{trace_path}: {'OK' if ok else 'DIVERGED'} "
+              f"({res['result'].get('status')}, recorded {res['recorded_status']}, "
+              f"{res['replay_ms']:.1f} ms)")
+
+        for mismatch in res["mismatches"]:
+            print(f"  {mismatch}")
+        if res["unused_calls"]:
+            print(f"  {res['unused_calls']} recorded calls not made")
+
+    sys.exit(1 if failed else 0)
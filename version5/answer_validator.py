@@ -0,0 +1,174 @@
+# answer_validator.py
+
+# Local consistency check of a final answer against the observed data
+# (agent.build_reasoning_input). The reflection llm call only runs when
+# this finds a problem.
+
+import re
+import threading
+from bom_estimator import (
+    COST_RANGES_INR,
+    PART_FAMILIES,
+    component_counts,
+    bom_range,
+    estimate_complexity
+)
+
+COMPLEXITY_LEVELS = ["low", "medium", "high"]
+
+# an answer's bom range must overlap the rule range widened by these factors
+BOM_TOLERANCE = (0.5, 2.0)
+
+VALIDATION_STATS = {
+    "checked": 0,
+    "reflected": 0,
+    "skipped": 0,
+    # wall time of the reflection calls that completed
+    "timed_reflections": 0,
+    "reflection_ms": 0.0
+}
+
+_stats_lock = threading.Lock()
+
+
+# a number with an optional thousands suffix: "850", "1.5k"
+_AMOUNT_RE = re.compile(r"(\d+(?:\.\d+)?)(?:\s*([kK])\b)?")
+
+
+def parse_range(text):
+    """
+    "120-850 INR" -> (120.0, 850.0), "1.5k-3k" -> (1500.0, 3000.0).
+    A single number gives (n, n). None if no number is found.
+    """
+
+    numbers = [
+        float(value) * (1000 if suffix else 1)
+        for value, suffix in _AMOUNT_RE.findall(str(text or "").replace(",", ""))
+    ]
+
+    if not numbers:
+        return None
+    if len(numbers) == 1:
+        return numbers[0], numbers[0]
+
+    return numbers[0], numbers[1]
+
+
+def check_complexity(final, data, counts):
+    complexity = str(final.get("complexity", "")).lower()
+
+    if complexity not in COMPLEXITY_LEVELS:
+        return f"complexity '{complexity}' is not one of {COMPLEXITY_LEVELS}"
+
+    expected = estimate_complexity(
+        int(data.get("component_count") or 0),
+        counts["IC"],
+        float(data.get("coverage") or 0.0)
+    )
+
+    # neighbouring levels are a judgement call, low vs high is not
+    if abs(COMPLEXITY_LEVELS.index(complexity) - COMPLEXITY_LEVELS.index(expected)) > 1:
+        return f"complexity '{complexity}' but the counts suggest '{expected}'"
+
+    return None
+
+
+def check_bom(final, data, counts):
+    parsed = parse_range(final.get("estimated_bom_inr"))
+
+    if parsed is None:
+        return "estimated_bom_inr has no numeric range"
+
+    low, high = parsed
+    if low > high:
+        return f"estimated_bom_inr range {low}-{high} is reversed"
+
+    if not data.get("component_count"):
+        # nothing detected: any range is a guess, but not a wrong one
+        return None
+
+    rule_low, rule_high = bom_range(counts)
+    min_low = rule_low * BOM_TOLERANCE[0]
+    max_high = rule_high * BOM_TOLERANCE[1]
+
+    if high < min_low or low > max_high:
+        return (f"estimated_bom_inr {int(low)}-{int(high)} outside the cost rules "
+                f"range {int(rule_low)}-{int(round(rule_high))} INR")
+
+    # every IC costs at least its minimum
+    ic_floor = counts["IC"] * COST_RANGES_INR["IC"][0]
+    if high < ic_floor:
+        return f"estimated_bom_inr below the cost of {counts['IC']} ICs"
+
+    return None
+
+
+def check_pcb_type(final, data, counts):
+    pcb_type = str(final.get("pcb_type", ""))
+
+    # a part family type needs a chip to back it
+    if pcb_type in PART_FAMILIES and not data.get("ic_present") and counts["IC"] == 0:
+        return f"pcb_type '{pcb_type}' but no IC was observed"
+
+    return None
+
+
+CHECKS = [check_complexity, check_bom, check_pcb_type]
+
+
+def validate_answer(final, data):
+    """
+    final: the agent's final_answer
+    data: build_reasoning_input(state)
+    Returns a list of inconsistencies, empty when the answer fits.
+    """
+
+    if not isinstance(final, dict):
+        return ["final answer is not an object"]
+
+    stats = {"type_counts": data.get("type_counts")}
+    ic_info = {
+        "reference_counts": data.get("reference_counts"),
+        "ic_count_ocr": data.get("ic_count_ocr")
+    }
+
+    counts = component_counts(stats, ic_info)
+
+    issues = []
+    for check in CHECKS:
+        issue = check(final, data, counts)
+        if issue:
+            issues.append(issue)
+
+    return issues
+
+
+def record_validation(reflected, reflection_ms=None):
+    with _stats_lock:
+        VALIDATION_STATS["checked"] += 1
+
+        if reflected:
+            VALIDATION_STATS["reflected"] += 1
+            if reflection_ms is not None:
+                VALIDATION_STATS["timed_reflections"] += 1
+                VALIDATION_STATS["reflection_ms"] += reflection_ms
+        else:
+            VALIDATION_STATS["skipped"] += 1
+
+
+def validation_metrics():
+    """
+    Skip rate, plus latency saved estimated from the mean reflection call.
+    """
+
+    with _stats_lock:
+        stats = dict(VALIDATION_STATS)
+
+    timed = stats["timed_reflections"]
+    mean_ms = stats["reflection_ms"] / timed if timed else 0.0
+
+    stats["skip_rate"] = stats["skipped"] / stats["checked"] if stats["checked"] else 0.0
+    stats["mean_reflection_ms"] = mean_ms
+    stats["saved_ms_estimate"] = stats["skipped"] * mean_ms
+
+    return stats
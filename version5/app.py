@@ -2,9 +2,100 @@
 
 import streamlit as st
 import tempfile
+import hashlib
 import os
 import time
-from agent import run_agent
+import llm_client
+from agent import run_agent, run_rules
+from agent_tools import evict_caches
+from llm_limiter import PRIORITY_HIGH
+from llm_pipeline import warm_models
+from ocr import OCR_PROFILES, DEFAULT_OCR_PROFILE, get_ocr_engine, warm_ocr
+from tracing import span
+
+# every widget interaction reruns this script: models are held per
+# process (cache_resource) and analyses per upload content + options
+# (cache_data), so a rerun only recomputes when one of those changes
+RESULT_CACHE_ENTRIES = 32
+
+
+@st.cache_resource(show_spinner="Loading OCR model...")
+def load_ocr_engine(ocr_profile):
+    # model load plus the slow first inference, once per profile
+    warm_ocr(ocr_profile)
+    return get_ocr_engine(ocr_profile)
+
+
+@st.cache_resource(show_spinner="Loading language model...")
+def load_llm_client():
+    # pooled ollama session, models loaded into memory
+    session = llm_client.get_session()
+    warm_models()
+    return session
+
+
+class UploadFile:
+    """
+    Temp copy of an upload for one script run, written only when an
+    analysis misses the cache. The path is unique per run, so sessions
+    with the same image never share a file or its tool cache entries.
+    """
+
+    def __init__(self, image_bytes, ext):
+        self.image_bytes = image_bytes
+        self.ext = ext
+        self.path = None
+
+    def get_path(self):
+        if self.path is None:
+            with tempfile.NamedTemporaryFile(delete=False, suffix=self.ext) as tmp_file:
+                tmp_file.write(self.image_bytes)
+                self.path = tmp_file.name
+
+        return self.path
+
+    def cleanup(self):
+        if self.path is not None:
+            evict_caches(self.path)
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+
+
+class NotFinalResult(Exception):
+    # raised out of a cached function, so the result is not cached
+    def __init__(self, result):
+        super().__init__(result.get("status"))
+        self.result = result
+
+
+def is_final(result):
+    # busy, errors and the rule based stand-in for the llm are retried
+    return result.get("status") == "success" and result.get("source") != "rules_fallback"
+
+
+# arguments with a leading underscore are not hashed: the content hash
+# stands in for the image
+
+@st.cache_data(max_entries=RESULT_CACHE_ENTRIES, show_spinner=False)
+def rules_for_upload(content_hash, ocr_profile, _upload):
+    return run_rules(_upload.get_path(), ocr_profile)
+
+
+@st.cache_data(max_entries=RESULT_CACHE_ENTRIES, show_spinner=False)
+def cached_agent(content_hash, ocr_profile, mode, _upload):
+    result = run_agent(_upload.get_path(), ocr_profile=ocr_profile, priority=PRIORITY_HIGH, mode=mode)
+
+    if not is_final(result):
+        raise NotFinalResult(result)
+
+    return result
+
+
+def agent_for_upload(content_hash, ocr_profile, mode, upload):
+    try:
+        return cached_agent(content_hash, ocr_profile, mode, upload)
+    except NotFinalResult as e:
+        return e.result
 
 
 def main():
@@ -16,22 +107,53 @@ def main():
         type=["jpg", "jpeg", "png", "bmp", "jfif"]
     )
 
+    ocr_profile = st.selectbox(
+        "OCR profile",
+        list(OCR_PROFILES),
+        index=list(OCR_PROFILES).index(DEFAULT_OCR_PROFILE),
+        help="fast / balanced trade text recall for lower OCR latency"
+    )
+
+    mode = st.selectbox(
+        "Analysis mode",
+        ["agent", "single_pass", "rules"],
+        help="single_pass: CV and OCR in parallel, then one LLM call; "
+             "rules: instant rule based estimate without the LLM"
+    )
+
     if uploaded_file is not None:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".jpg") as tmp_file:
-            tmp_file.write(uploaded_file.read())
-            tmp_path = tmp_file.name
+        # getvalue: the whole upload on every rerun, not just the first read
+        image_bytes = uploaded_file.getvalue()
+        content_hash = hashlib.sha256(image_bytes).hexdigest()
+        ext = os.path.splitext(uploaded_file.name)[1].lower() or ".jpg"
+        upload = UploadFile(image_bytes, ext)
+
+        load_ocr_engine(ocr_profile)
+        if mode != "rules":
+            load_llm_client()
 
         try:
-            # show uploaded image
+            # show uploaded image, straight from the upload bytes
             st.subheader("Uploaded Image")
-            st.image(tmp_path, use_column_width=True)
+            st.image(image_bytes, use_column_width=True)
 
             st.subheader("Analysis")
 
             start_time = time.time()
 
-            with st.spinner("Running agent..."):
-                result = run_agent(tmp_path)
+            # one trace per upload (TRACING=1), see tracing.py; a cached
+            # rerun only records this root span
+            with span("app.analyze", filename=uploaded_file.name, mode=mode, ocr_profile=ocr_profile):
+                # rule based answer first, the agent reuses the cached cv / ocr results
+                with st.spinner("Running CV and OCR..."):
+                    result = rules_for_upload(content_hash, ocr_profile, upload)
+
+                if mode != "rules" and result.get("status") == "success":
+                    st.subheader("Preliminary Estimate (rule based)")
+                    st.json(result.get("result"))
+
+                    with st.spinner("Running agent..."):
+                        result = agent_for_upload(content_hash, ocr_profile, mode, upload)
 
             end_time = time.time()
             st.write(f"Time taken: {end_time - start_time:.2f} seconds")
@@ -42,7 +164,14 @@ def main():
                 llm_result = result.get("result")
                 steps_used = result.get("steps_used")
 
-                st.success(f"Agent completed in {steps_used} step(s)")
+                source = result.get("source", "llm")
+
+                if source == "rules":
+                    st.success("Rule based estimate")
+                elif source == "rules_fallback":
+                    st.warning("LLM unavailable, showing the rule based estimate")
+                else:
+                    st.success(f"Agent completed in {steps_used} step(s)")
 
                 # final result
                 st.subheader("BOM Estimation Result")
@@ -67,6 +196,16 @@ def main():
                     st.subheader("Detected Components")
                     st.image(visualization, use_column_width=True)
 
+                # llm timing / token counts per call
+                llm_metrics = result.get("llm_metrics")
+                if llm_metrics:
+                    st.subheader("LLM Metrics")
+                    st.json(llm_metrics)
+
+            elif status == "busy":
+                st.warning("The language model is busy right now, please try again shortly.")
+                st.json(result)
+
             elif status == "max_steps_exceeded":
                 st.warning("Agent reached maximum reasoning steps.")
                 st.json(result)
@@ -76,8 +215,9 @@ def main():
                 st.json(result)
 
         finally:
-            if os.path.exists(tmp_path):
-                os.unlink(tmp_path)
+            # results are in st.cache_data now; the tool caches and the
+            # file would only hold memory and disk until the next upload
+            upload.cleanup()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,203 @@
+# async_agent.py
+
+# asyncio version of agent.run_agent. The step logic is agent.py's own
+# step generators; this module only drives them on an event loop: LLM
+# calls go through async_llm_client and tools run on the agent_tools
+# worker pools (ocr on its single worker), so one event loop can drive
+# many analyses. Runs are traced like run_agent (agent_trace).
+
+import time
+import asyncio
+import httpx
+import requests
+import async_llm_client
+from llm_limiter import LLMBusyError, PRIORITY_NORMAL
+from agent_tools import timed_execute_tool, get_tool_executor, start_prefetch, finish_prefetch
+from llm_client import LLMRequestError
+from llm_pipeline import build_agent_payload, parse_agent_result, model_missing, LLM_STREAM
+from agent_trace import start_trace
+import agent
+from agent import mode_steps
+from tracing import span, in_context
+
+# httpx errors from async_llm_client; RequestExceptions come from the
+# shared StreamCollector (LLMStreamError) and from replayed traces
+LLM_UNAVAILABLE_ERRORS = (LLMBusyError, httpx.HTTPError, requests.exceptions.RequestException)
+
+# analyses running at once in run_agents_async
+MAX_CONCURRENT_ANALYSES = 32
+
+
+async def call_agent_llm_async(messages, tools, allow_tools=True, priority=PRIORITY_NORMAL,
+                               route="final_answer"):
+    """
+    Raw chat result, as llm_pipeline.call_agent_llm.
+    """
+
+    with span("llm.agent_call", route=route, allow_tools=allow_tools, messages=len(messages)):
+        payload = build_agent_payload(messages, tools, allow_tools, route)
+
+        try:
+            result = await async_llm_client.chat(payload, stream=LLM_STREAM, priority=priority)
+        except LLMRequestError as e:
+            if not model_missing(e, payload["model"]):
+                raise
+            payload = build_agent_payload(messages, tools, allow_tools, route)
+            result = await async_llm_client.chat(payload, stream=LLM_STREAM, priority=priority)
+    result["metrics"]["route"] = route
+
+    return result
+
+
+async def run_llm_async(messages, tools, allow_tools=True, priority=PRIORITY_NORMAL,
+                        route="final_answer", trace=None):
+    """
+    Returns (parsed response, metrics).
+    """
+
+    if trace is not None and trace.replaying:
+        return trace.llm(messages, tools, allow_tools, priority, route)
+
+    start = time.perf_counter()
+
+    try:
+        result = await call_agent_llm_async(messages, tools, allow_tools, priority, route)
+    except Exception as e:
+        if trace is not None:
+            trace.record_llm(messages, allow_tools, route, (time.perf_counter() - start) * 1000, error=e)
+        raise
+
+    if trace is not None:
+        trace.record_llm(messages, allow_tools, route, (time.perf_counter() - start) * 1000, result=result)
+
+    return parse_agent_result(result), result["metrics"]
+
+
+async def execute_tool_async(tool_name, arguments):
+    # cpu bound work stays off the event loop, on the tool's own pool
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        get_tool_executor(tool_name),
+        in_context(timed_execute_tool, tool_name, arguments)
+    )
+
+
+async def execute_tools_async(calls, trace=None):
+    # independent calls run concurrently on their worker pools
+    if trace is not None and trace.replaying:
+        return trace.tools(calls)
+
+    start = time.perf_counter()
+
+    try:
+        timed = await asyncio.gather(*(
+            execute_tool_async(tool_name, arguments) for tool_name, arguments in calls
+        ))
+    except Exception as e:
+        if trace is not None:
+            trace.record_tools(calls, (time.perf_counter() - start) * 1000, error=e)
+        raise
+
+    if trace is not None:
+        trace.record_tools(calls, (time.perf_counter() - start) * 1000, timed=timed)
+
+    return [result for result, _ in timed]
+
+
+async def drive_async(steps, trace=None):
+    """
+    agent.drive on the event loop: runs a step generator to completion.
+    """
+
+    outcome, error = None, None
+
+    while True:
+        try:
+            effect = steps.throw(error) if error is not None else steps.send(outcome)
+        except StopIteration as stop:
+            return stop.value
+
+        kind, arguments = effect
+        outcome, error = None, None
+
+        try:
+            if kind == "llm":
+                outcome = await run_llm_async(*arguments, trace=trace)
+            else:
+                outcome = await execute_tools_async(arguments, trace)
+        except Exception as e:
+            error = e
+
+
+async def run_agent_async(image_path: str, max_steps: int = 6, ocr_profile: str = None,
+                          priority: int = PRIORITY_NORMAL, mode: str = "agent", fallback: bool = True,
+                          reflect: bool = False, trace=None):
+
+    if trace is None:
+        trace = start_trace(
+            image_path=image_path, max_steps=max_steps, ocr_profile=ocr_profile,
+            priority=priority, mode=mode, fallback=fallback, reflect=reflect
+        )
+
+    with span("agent.run_agent_async", image_path=image_path, mode=mode, ocr_profile=ocr_profile) as s:
+        try:
+            result = await run_mode_async(image_path, max_steps, ocr_profile, priority, mode,
+                                          fallback, trace, reflect)
+        except Exception as e:
+            trace.finish({"status": "exception", "reason": f"{type(e).__name__}: {e}"})
+            raise
+
+        s.set_attributes({"status": result.get("status"), "source": result.get("source")})
+
+    trace.finish(result)
+    return result
+
+
+async def run_mode_async(image_path, max_steps, ocr_profile, priority, mode, fallback, trace,
+                         reflect=False):
+    steps = mode_steps(image_path, max_steps, ocr_profile, priority, mode, fallback,
+                       LLM_UNAVAILABLE_ERRORS, reflect)
+
+    if mode != "agent" or not agent.SPECULATIVE_PREFETCH or trace.replaying:
+        return await drive_async(steps, trace)
+
+    start_prefetch(image_path, ocr_profile)
+    try:
+        result = await drive_async(steps, trace)
+    finally:
+        prefetch = finish_prefetch(image_path)
+
+    result["prefetch"] = prefetch
+    return result
+
+
+async def run_agents_async(image_paths, max_concurrent=MAX_CONCURRENT_ANALYSES, **kwargs):
+    """
+    Runs many analyses on one event loop. Results come back in input
+    order; a failed analysis becomes an error result.
+    """
+
+    semaphore = asyncio.Semaphore(max_concurrent)
+
+    async def run_one(path):
+        async with semaphore:
+            try:
+                return await run_agent_async(path, **kwargs)
+            except Exception as e:
+                return {
+                    "status": "error",
+                    "reason": f"agent_failed: {str(e)}"
+                }
+
+    try:
+        return await asyncio.gather(*(run_one(p) for p in image_paths))
+    finally:
+        await async_llm_client.close_client()
+
+
+if __name__ == "__main__":
+    import sys
+
+    paths = sys.argv[1:] or ["pcbclear2.jpg"]
+    for res in asyncio.run(run_agents_async(paths)):
+        print(res)
@@ -0,0 +1,179 @@
+# async_llm_client.py
+
+# asyncio counterpart of llm_client.py on httpx. Same payloads, cache,
+# stream handling and metrics; cancelling the awaiting task closes the
+# in-flight request, which makes ollama stop generating.
+
+import time
+import asyncio
+import weakref
+import httpx
+from tenacity import AsyncRetrying, retry_if_exception, stop_after_attempt, wait_exponential
+import llm_client
+from llm_limiter import LIMITER, PRIORITY_NORMAL
+from tracing import span
+from llm_client import (
+    StreamCollector,
+    build_metrics,
+    set_span_metrics,
+    cache_lookup,
+    cache_store,
+    request_error,
+    RETRYABLE_STATUS,
+    MAX_ATTEMPTS,
+    CONNECT_TIMEOUT,
+    READ_TIMEOUT,
+    POOL_SIZE
+)
+
+# event loop -> AsyncClient
+_clients = weakref.WeakKeyDictionary()
+
+
+# an httpx.HTTPError, so a 5xx that outlasts the retries counts as the
+# llm being unavailable (async_agent.LLM_UNAVAILABLE_ERRORS)
+class RetryableStatusError(httpx.HTTPError):
+    def __init__(self, response):
+        super().__init__(f"Ollama returned HTTP {response.status_code}")
+        self.response = response
+
+
+def get_client():
+    """
+    The AsyncClient of the running event loop. Its connections belong to
+    that loop, so each loop (every asyncio.run, streamlit rerun or test)
+    gets its own; a loop that is gone drops its client with it.
+    """
+
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            base_url=llm_client.OLLAMA_HOST,
+            timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+            limits=httpx.Limits(max_connections=POOL_SIZE, max_keepalive_connections=POOL_SIZE)
+        )
+        _clients[loop] = client
+
+    return client
+
+
+async def close_client():
+    # the running loop's client
+    client = _clients.pop(asyncio.get_running_loop(), None)
+
+    if client is not None:
+        await client.aclose()
+
+
+def _is_retryable(exc):
+    if isinstance(exc, httpx.ReadTimeout):
+        return False
+
+    return isinstance(exc, (httpx.ConnectError, httpx.ConnectTimeout, RetryableStatusError))
+
+
+def _retrying():
+    return AsyncRetrying(
+        retry=retry_if_exception(_is_retryable),
+        stop=stop_after_attempt(MAX_ATTEMPTS),
+        wait=wait_exponential(multiplier=0.5, max=8),
+        reraise=True
+    )
+
+
+async def post_ollama(path, payload):
+    start = time.perf_counter()
+    attempts = 0
+
+    async for attempt in _retrying():
+        with attempt:
+            attempts += 1
+
+            response = await get_client().post(path, json=payload)
+
+            if response.status_code in RETRYABLE_STATUS:
+                raise RetryableStatusError(response)
+
+            error = request_error(response.status_code, response.text)
+            if error is not None:
+                raise error
+
+            response.raise_for_status()
+
+    result = response.json()
+    result["metrics"] = build_metrics(result, path, time.perf_counter() - start, attempts)
+
+    return result
+
+
+async def stream_ollama(path, payload, stop_on_json=True):
+    payload = dict(payload, stream=True)
+    collector = StreamCollector(path, payload, stop_on_json)
+    attempts = 0
+
+    async for attempt in _retrying():
+        with attempt:
+            attempts += 1
+
+            # leaving the block (done, early stop or cancellation) closes the stream
+            async with get_client().stream("POST", path, json=payload) as response:
+                if response.status_code in RETRYABLE_STATUS:
+                    raise RetryableStatusError(response)
+
+                if response.status_code >= 400:
+                    error = request_error(response.status_code, (await response.aread()).decode("utf-8", "replace"))
+                    if error is not None:
+                        raise error
+
+                response.raise_for_status()
+
+                async for line in response.aiter_lines():
+                    if collector.add_line(line):
+                        break
+
+    return collector.finish(attempts)
+
+
+async def call_ollama(path, payload, stream=False, stop_on_json=True,
+                      use_cache=True, allow_sampled=False, priority=PRIORITY_NORMAL):
+    """
+    Returns the ollama json with a "metrics" entry. Metrics are also kept
+    in llm_client.LLM_METRICS, but not as "last metrics" (tasks share a
+    thread), so callers read result["metrics"].
+    """
+
+    with span("llm.call_ollama", endpoint=path, model=payload.get("model"), stream=stream) as s:
+        key, cached = cache_lookup(path, payload, use_cache, allow_sampled)
+
+        if cached is not None:
+            llm_client.LLM_METRICS.append(cached["metrics"])
+            set_span_metrics(s, cached["metrics"])
+            return cached
+
+        async with LIMITER.slot(priority) as slot:
+            if stream:
+                result = await stream_ollama(path, payload, stop_on_json)
+            else:
+                result = await post_ollama(path, payload)
+
+        result["metrics"]["queue_wait_ms"] = slot["waited_s"] * 1000
+        set_span_metrics(s, result["metrics"])
+
+        cache_store(key, result)
+        llm_client.LLM_METRICS.append(result["metrics"])
+
+    return result
+
+
+async def generate(payload, stream=False, stop_on_json=True, use_cache=True,
+                   allow_sampled=False, priority=PRIORITY_NORMAL):
+    return await call_ollama("/api/generate", payload, stream, stop_on_json,
+                             use_cache, allow_sampled, priority)
+
+
+async def chat(payload, stream=False, stop_on_json=True, use_cache=True,
+               allow_sampled=False, priority=PRIORITY_NORMAL):
+    return await call_ollama("/api/chat", payload, stream, stop_on_json,
+                             use_cache, allow_sampled, priority)
@@ -0,0 +1,359 @@
+# batch.py
+
+# Runs the agent over many images: a directory, glob or manifest in,
+# one JSONL line per image out. The output file doubles as the
+# checkpoint, so an interrupted run picks up where it stopped.
+#
+#   python batch.py boards/ --output results.jsonl --llm-workers 2
+#   python batch.py "scans/**/*.jpg" manifest.txt --mode single_pass
+#   python batch.py boards/ --pipeline --parquet dataset/
+
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+import contextlib
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import agent_tools
+import ocr_backends
+from agent import run_agent, LLM_UNAVAILABLE_ERRORS
+from llm_limiter import LIMITER, PRIORITY_LOW
+from agent_trace import to_json
+from staged_pipeline import analysis_pipeline, run_pipeline, format_utilization, DEFAULT_QUEUE_SIZE
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".jfif"}
+MANIFEST_EXTENSIONS = {".txt", ".jsonl"}
+
+# results that are not final: redone when a run resumes
+RETRY_STATUSES = {"busy", "llm_unavailable"}
+
+# rule based stand-ins for an llm answer (runs made with fallback on)
+RETRY_SOURCES = {"rules_fallback"}
+
+# a batch would rather wait for the llm than fall back to the rules
+BATCH_LLM_MAX_WAIT_S = 3600
+
+PROGRESS_INTERVAL_S = 5.0
+
+
+def read_manifest(path):
+    """
+    .txt: one image path per line; .jsonl: objects with "image_path".
+    Relative paths are taken from the manifest's directory.
+    """
+
+    base = os.path.dirname(os.path.abspath(path))
+    paths = []
+
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+
+            if path.endswith(".jsonl"):
+                line = json.loads(line)["image_path"]
+
+            paths.append(line if os.path.isabs(line) else os.path.join(base, line))
+
+    return paths
+
+
+def collect_images(inputs):
+    """
+    Directories, glob patterns and manifests -> image paths, in order,
+    without duplicates.
+    """
+
+    paths = []
+
+    for item in inputs:
+        if os.path.isdir(item):
+            paths.extend(
+                os.path.join(item, name) for name in sorted(os.listdir(item))
+                if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS
+            )
+        elif os.path.isfile(item) and os.path.splitext(item)[1].lower() in MANIFEST_EXTENSIONS:
+            paths.extend(read_manifest(item))
+        elif os.path.isfile(item):
+            paths.append(item)
+        else:
+            matches = sorted(glob.glob(item, recursive=True))
+            if not matches:
+                print(f"warning: nothing matches {item}", file=sys.stderr)
+            paths.extend(
+                p for p in matches
+                if os.path.splitext(p)[1].lower() in IMAGE_EXTENSIONS
+            )
+
+    seen = set()
+    unique = []
+    for p in paths:
+        key = os.path.abspath(p)
+        if key not in seen:
+            seen.add(key)
+            unique.append(p)
+
+    return unique
+
+
+def load_checkpoint(output_path, retry_statuses=RETRY_STATUSES):
+    """
+    Image paths (absolute) already finished in a previous run. The last
+    line for an image wins.
+    """
+
+    if not os.path.exists(output_path):
+        return set()
+
+    latest = {}
+
+    with open(output_path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # torn last line from an interrupted run
+                continue
+            result = record.get("result") or {}
+            final = (record.get("status") not in retry_statuses
+                     and result.get("source") not in RETRY_SOURCES)
+            latest[os.path.abspath(record["image_path"])] = final
+
+    return {path for path, final in latest.items() if final}
+
+
+def configure_parallelism(cv_workers, ocr_workers, llm_workers, concurrency):
+    # must run before the first tool call creates the worker pools.
+    # every ocr call runs on the ocr pool (agent_tools.run_tool), so the
+    # batch threads never share a paddle engine; only several ocr
+    # workers need one engine each
+    agent_tools.WORKER_SIZES["cv"] = cv_workers
+    agent_tools.WORKER_SIZES["ocr"] = ocr_workers
+    ocr_backends.ENGINE_PER_THREAD = ocr_workers > 1
+
+    LIMITER.max_in_flight = llm_workers
+    LIMITER.max_queue = max(LIMITER.max_queue, concurrency)
+    LIMITER.max_wait_s = BATCH_LLM_MAX_WAIT_S
+
+
+def analyze(path, run_kwargs, keep_board=False):
+    """
+    keep_board: the cv / ocr detail goes under "_board", for the parquet
+    export; it is not written to the JSONL output.
+    """
+
+    start = time.perf_counter()
+    board = None
+
+    try:
+        result = run_agent(path, **run_kwargs)
+    except LLM_UNAVAILABLE_ERRORS as e:
+        # ollama down: not a result, the image is redone on resume
+        result = {"status": "llm_unavailable", "reason": f"{type(e).__name__}: {e}"}
+    except Exception as e:
+        result = {"status": "error", "reason": f"agent_failed: {type(e).__name__}: {e}"}
+    finally:
+        if keep_board:
+            board = agent_tools.board_data(path)
+        # a batch would otherwise keep every board's cv output in memory
+        agent_tools.evict_caches(path)
+
+    record = {
+        "image_path": path,
+        "status": result.get("status"),
+        "elapsed_s": time.perf_counter() - start,
+        "finished_at": datetime.now(timezone.utc).isoformat(),
+        "result": result
+    }
+
+    if keep_board:
+        record["_board"] = board
+
+    return record
+
+
+def format_progress(done, total, skipped, elapsed, statuses):
+    rate = done / elapsed if elapsed > 0 else 0.0
+    remaining = total - skipped - done
+    eta = remaining / rate if rate else float("inf")
+
+    eta_text = time.strftime("%H:%M:%S", time.gmtime(eta)) if eta != float("inf") else "--:--:--"
+    status_text = " ".join(f"{k}={v}" for k, v in sorted(statuses.items()))
+
+    return (f"[{done + skipped}/{total}] {rate * 60:.1f} img/min "
+            f"elapsed {time.strftime('%H:%M:%S', time.gmtime(elapsed))} ETA {eta_text} {status_text}")
+
+
+def pool_records(executor, image_paths, run_kwargs, keep_board=False):
+    futures = [executor.submit(analyze, p, run_kwargs, keep_board) for p in image_paths]
+
+    for future in as_completed(futures):
+        yield future.result()
+
+
+def run_batch(image_paths, output_path, concurrency=4, run_kwargs=None,
+              resume=True, retry_statuses=RETRY_STATUSES, quiet=True,
+              progress_interval=PROGRESS_INTERVAL_S, pipeline=None, exporter=None):
+    """
+    pipeline: a staged_pipeline.StagedPipeline to overlap the stages of
+    different images; otherwise each of concurrency threads runs whole
+    analyses.
+    exporter: a parquet_export.ParquetExporter fed every finished image
+    (a pipeline must then be built with keep_board=True).
+    """
+
+    run_kwargs = run_kwargs or {}
+
+    done_paths = load_checkpoint(output_path, retry_statuses) if resume else set()
+    todo = [p for p in image_paths if os.path.abspath(p) not in done_paths]
+    skipped = len(image_paths) - len(todo)
+
+    if skipped:
+        print(f"resuming: {skipped} of {len(image_paths)} images already done", file=sys.stderr)
+
+    statuses = {}
+    done = 0
+    start = time.perf_counter()
+    last_report = start
+
+    executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="batch")
+
+    # the agent prints every step; stdout is process wide, so it is
+    # silenced once for the whole batch. progress goes to stderr.
+    devnull = open(os.devnull, "w") if quiet else None
+
+    try:
+        # line buffered append: every finished image is checkpointed at once
+        with open(output_path, "a", buffering=1) as out, \
+                contextlib.redirect_stdout(devnull) if quiet else contextlib.nullcontext():
+            if pipeline is not None:
+                records = run_pipeline(pipeline, todo)
+            else:
+                records = pool_records(executor, todo, run_kwargs, keep_board=exporter is not None)
+
+            for record in records:
+                board = record.pop("_board", None)
+                out.write(to_json(record) + "\n")
+
+                if exporter is not None:
+                    exporter.add(record, *(board or (None, None)))
+
+                done += 1
+                statuses[record["status"]] = statuses.get(record["status"], 0) + 1
+
+                now = time.perf_counter()
+                if now - last_report >= progress_interval or done == len(todo):
+                    print(format_progress(done, len(image_paths), skipped, now - start, statuses),
+                          file=sys.stderr)
+                    last_report = now
+
+    except KeyboardInterrupt:
+        print(f"\ninterrupted after {done} images, run again to resume", file=sys.stderr)
+        executor.shutdown(wait=False, cancel_futures=True)
+        raise
+
+    finally:
+        if devnull is not None:
+            devnull.close()
+        if exporter is not None:
+            # whatever is buffered still lands, also on interrupt
+            exporter.close()
+
+    executor.shutdown()
+
+    summary = {
+        "total": len(image_paths),
+        "skipped": skipped,
+        "processed": done,
+        "statuses": statuses,
+        "elapsed_s": time.perf_counter() - start
+    }
+
+    if pipeline is not None:
+        summary["stages"] = pipeline.utilization()
+
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the PCB agent over many images.")
+    parser.add_argument("inputs", nargs="+", help="directories, glob patterns or manifests (.txt / .jsonl)")
+    parser.add_argument("--output", default="batch_results.jsonl")
+    parser.add_argument("--mode", choices=["agent", "single_pass", "rules"], default="agent")
+    parser.add_argument("--ocr-profile")
+    parser.add_argument("--max-steps", type=int, default=6)
+    parser.add_argument("--reflect", action="store_true", help="reflection step in single_pass mode")
+    parser.add_argument("--concurrency", type=int, default=4, help="images in flight")
+    parser.add_argument("--cv-workers", type=int, default=agent_tools.WORKER_SIZES["cv"])
+    parser.add_argument("--ocr-workers", type=int, default=agent_tools.WORKER_SIZES["ocr"])
+    parser.add_argument("--llm-workers", type=int, default=LIMITER.max_in_flight,
+                        help="concurrent ollama generations")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="staged executor: decode / cv / ocr / llm pools with bounded queues")
+    parser.add_argument("--decode-workers", type=int, default=1)
+    parser.add_argument("--queue-size", type=int, default=DEFAULT_QUEUE_SIZE)
+    parser.add_argument("--parquet", metavar="DIR",
+                        help="also append boards / components / ocr texts to a parquet dataset")
+    parser.add_argument("--no-resume", action="store_true")
+    parser.add_argument("--retry-errors", action="store_true", help="also redo images that failed")
+    parser.add_argument("--verbose", action="store_true", help="keep the agent's step output")
+    parser.add_argument("--progress-interval", type=float, default=PROGRESS_INTERVAL_S)
+    args = parser.parse_args(argv)
+
+    image_paths = collect_images(args.inputs)
+    if not image_paths:
+        print("no images found", file=sys.stderr)
+        return 1
+
+    configure_parallelism(args.cv_workers, args.ocr_workers, args.llm_workers, args.concurrency)
+
+    retry = RETRY_STATUSES | ({"error", "max_steps_exceeded"} if args.retry_errors else set())
+
+    run_kwargs = {
+        "max_steps": args.max_steps,
+        "ocr_profile": args.ocr_profile,
+        "priority": PRIORITY_LOW,
+        "mode": args.mode,
+        "reflect": args.reflect,
+        # a rule based answer is not what the batch is for: with ollama
+        # down, images stay unfinished and a resumed run redoes them
+        "fallback": False
+    }
+
+    pipeline = None
+    if args.pipeline:
+        # stage threads and the agent's tool pools may both run ocr
+        ocr_backends.ENGINE_PER_THREAD = True
+        pipeline = analysis_pipeline(
+            run_kwargs, args.decode_workers, args.cv_workers, args.ocr_workers,
+            args.llm_workers, args.queue_size, keep_board=args.parquet is not None
+        )
+
+    exporter = None
+    if args.parquet:
+        from parquet_export import ParquetExporter
+        exporter = ParquetExporter(args.parquet)
+
+    try:
+        summary = run_batch(
+            image_paths, args.output, args.concurrency, run_kwargs,
+            resume=not args.no_resume, retry_statuses=retry,
+            quiet=not args.verbose, progress_interval=args.progress_interval,
+            pipeline=pipeline, exporter=exporter
+        )
+    except KeyboardInterrupt:
+        return 130
+
+    if pipeline is not None:
+        print(format_utilization(summary["stages"]), file=sys.stderr)
+
+    print(json.dumps(summary))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
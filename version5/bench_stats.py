@@ -0,0 +1,20 @@
+# bench_stats.py
+
+# Summary statistics shared by the benchmark scripts and the llm limiter
+# metrics. No cv / ocr / agent imports, so client-side tools
+# (benchmark_server.py) can use it.
+
+import math
+
+
+def percentile(values, p):
+    """
+    Nearest-rank percentile (p in 0-100). None for no values.
+    """
+
+    if not values:
+        return None
+
+    ordered = sorted(values)
+    k = max(0, min(len(ordered) - 1, math.ceil(p / 100 * len(ordered)) - 1))
+    return ordered[k]
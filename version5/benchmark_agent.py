@@ -0,0 +1,75 @@
+# benchmark_agent.py
+
+# Runs the full run_agent path against the local ollama stand-in, so
+# orchestration, CV and OCR cost can be measured without a model.
+
+import argparse
+import time
+import llm_client
+import agent_tools
+from answer_validator import validation_metrics
+from agent import run_agent
+from ollama_standin import start_standin
+from bench_stats import percentile
+
+SAMPLE_IMAGES = ["pcbclear2.jpg", "pcbimagetrial.jfif"]
+
+
+def benchmark(image_paths, runs, keep_caches=False):
+    latencies = []
+    statuses = {}
+
+    for _ in range(runs):
+        for path in image_paths:
+            if not keep_caches:
+                # cv and ocr results both, or later runs skip ocr
+                agent_tools.evict_caches(path)
+
+            start = time.perf_counter()
+            result = run_agent(path)
+            latencies.append(time.perf_counter() - start)
+
+            status = result.get("status")
+            statuses[status] = statuses.get(status, 0) + 1
+
+    return {
+        "runs": len(latencies),
+        "p50_s": percentile(latencies, 50),
+        "p95_s": percentile(latencies, 95),
+        "mean_s": sum(latencies) / len(latencies),
+        "statuses": statuses,
+        "llm": llm_client.metrics_summary(),
+        "llm_routes": llm_client.metrics_by_route(),
+        "prefetch": agent_tools.prefetch_metrics(),
+        "reflection": validation_metrics()
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark run_agent against the ollama stand-in.")
+    parser.add_argument("images", nargs="*", default=SAMPLE_IMAGES)
+    parser.add_argument("--mode", choices=["script", "simulate", "replay"], default="simulate")
+    parser.add_argument("--recordings", default="ollama_recordings.jsonl")
+    parser.add_argument("--token-rate", type=float)
+    parser.add_argument("--prompt-rate", type=float)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--keep-caches", action="store_true",
+                        help="reuse cv / ocr results across runs")
+    args = parser.parse_args()
+
+    server, url = start_standin(
+        mode=args.mode, port=0, recordings_path=args.recordings,
+        token_rate=args.token_rate, prompt_rate=args.prompt_rate
+    )
+
+    llm_client.OLLAMA_HOST = url
+    # every run must reach the stand-in
+    llm_client.USE_CACHE = False
+
+    try:
+        res = benchmark(args.images, args.runs, args.keep_caches)
+    finally:
+        server.shutdown()
+
+    for key, value in res.items():
+        print(f"{key}: {value}")
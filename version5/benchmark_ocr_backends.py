@@ -0,0 +1,155 @@
+# benchmark_ocr_backends.py
+
+import argparse
+import glob
+import json
+import os
+import time
+import cv2
+import psutil
+from bench_stats import percentile
+from ocr_backends import OCR_BACKENDS, available_backends
+from ocr import (
+    get_ocr_engine,
+    read_full_image_text,
+    filter_ic_candidates,
+    extract_reference_counts,
+    DEFAULT_OCR_PROFILE
+)
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".jfif")
+
+
+def list_images(directory):
+    paths = []
+
+    for path in sorted(glob.glob(os.path.join(directory, "*"))):
+        if path.lower().endswith(IMAGE_EXTENSIONS):
+            paths.append(path)
+
+    return paths
+
+
+def rss_mb():
+    return psutil.Process().memory_info().rss / (1024 * 1024)
+
+
+def run_backend(backend, images, profile_name, runs):
+    rss_before = rss_mb()
+
+    start = time.perf_counter()
+    get_ocr_engine(profile_name, backend)
+    load_s = time.perf_counter() - start
+
+    rss_loaded = rss_mb()
+    rss_peak = rss_loaded
+
+    latencies = []
+    outputs = {}
+
+    for path, image in images.items():
+        for _ in range(runs):
+            start = time.perf_counter()
+            texts = read_full_image_text(image, profile_name, backend)
+            latencies.append(time.perf_counter() - start)
+            rss_peak = max(rss_peak, rss_mb())
+
+        outputs[path] = {
+            "ic_candidates": sorted(set(filter_ic_candidates(texts))),
+            "reference_counts": extract_reference_counts(texts)
+        }
+
+    total_s = sum(latencies)
+
+    return {
+        "load_s": load_s,
+        "images_per_s": len(latencies) / total_s if total_s > 0 else 0.0,
+        "latency_p50_s": percentile(latencies, 50),
+        "latency_p90_s": percentile(latencies, 90),
+        "latency_p99_s": percentile(latencies, 99),
+        # rss deltas are approximate, backends share one process
+        "model_mem_mb": rss_loaded - rss_before,
+        "peak_mem_mb": rss_peak,
+        "outputs": outputs
+    }
+
+
+def agreement(outputs, reference_outputs):
+    ic_scores = []
+    ref_exact = 0
+
+    for path, ref in reference_outputs.items():
+        out = outputs.get(path)
+        if out is None:
+            continue
+
+        a = set(out["ic_candidates"])
+        b = set(ref["ic_candidates"])
+        union = a | b
+        ic_scores.append(len(a & b) / len(union) if union else 1.0)
+
+        if out["reference_counts"] == ref["reference_counts"]:
+            ref_exact += 1
+
+    n = len(ic_scores)
+
+    return {
+        "ic_jaccard": sum(ic_scores) / n if n else 0.0,
+        "reference_counts_match": ref_exact / n if n else 0.0
+    }
+
+
+def benchmark(directory, backends, profile_name, runs):
+    images = {}
+    for path in list_images(directory):
+        image = cv2.imread(path)
+        if image is not None:
+            images[path] = image
+
+    if not images:
+        raise FileNotFoundError(f"No images found in: {directory}")
+
+    report = {}
+    for backend in backends:
+        print(f"running {backend} on {len(images)} image(s)...")
+        report[backend] = run_backend(backend, images, profile_name, runs)
+
+    # first backend is the reference for agreement
+    reference = report[backends[0]]["outputs"]
+    for backend in backends:
+        report[backend]["agreement"] = agreement(report[backend]["outputs"], reference)
+
+    return report
+
+
+def print_report(report):
+    print(f"\n{'backend':<11}{'img/s':>8}{'p50':>8}{'p90':>8}{'p99':>8}"
+          f"{'mem MB':>9}{'IC jacc':>9}{'refs eq':>9}")
+
+    for backend, row in report.items():
+        print(f"{backend:<11}{row['images_per_s']:>8.2f}"
+              f"{row['latency_p50_s']:>8.2f}{row['latency_p90_s']:>8.2f}"
+              f"{row['latency_p99_s']:>8.2f}{row['model_mem_mb']:>9.0f}"
+              f"{row['agreement']['ic_jaccard']:>9.2f}"
+              f"{row['agreement']['reference_counts_match']:>9.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare OCR backends on a directory of images.")
+    parser.add_argument("directory")
+    parser.add_argument("--backends", nargs="+", choices=list(OCR_BACKENDS),
+                        help="defaults to every installed backend")
+    parser.add_argument("--profile", default=DEFAULT_OCR_PROFILE)
+    parser.add_argument("--runs", type=int, default=1)
+    parser.add_argument("--output", default="ocr_backend_benchmark.json")
+    args = parser.parse_args()
+
+    backends = args.backends or available_backends()
+    if not backends:
+        raise SystemExit("No OCR backend is installed.")
+
+    res = benchmark(args.directory, backends, args.profile, args.runs)
+    print_report(res)
+
+    with open(args.output, "w") as f:
+        json.dump(res, f, indent=2)
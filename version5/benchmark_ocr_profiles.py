@@ -0,0 +1,78 @@
+# benchmark_ocr_profiles.py
+
+import sys
+import time
+import json
+import cv2
+from bench_stats import percentile
+from ocr import OCR_PROFILES, get_ocr_engine, read_full_image_text
+
+SAMPLE_IMAGES = ["pcbclear2.jpg", "pcbimagetrial.jfif"]
+
+# texts from this profile are treated as ground truth for recall
+REFERENCE_PROFILE = "accurate"
+
+
+def normalize(texts):
+    return {t.replace(" ", "").upper() for t in texts}
+
+
+def time_profile(image, profile_name, runs=3):
+    # warm up (model load + first inference)
+    get_ocr_engine(profile_name)
+    read_full_image_text(image, profile_name)
+
+    timings = []
+    texts = []
+
+    for _ in range(runs):
+        start = time.perf_counter()
+        texts = read_full_image_text(image, profile_name)
+        timings.append(time.perf_counter() - start)
+
+    return percentile(timings, 50), texts
+
+
+def benchmark(image_paths, runs=3):
+    results = {}
+
+    for path in image_paths:
+        image = cv2.imread(path)
+        if image is None:
+            print(f"skipping {path}: could not read image")
+            continue
+
+        per_profile = {}
+        for name in OCR_PROFILES:
+            latency, texts = time_profile(image, name, runs)
+            per_profile[name] = {"latency_s": latency, "texts": texts}
+
+        reference = normalize(per_profile[REFERENCE_PROFILE]["texts"])
+
+        for name, row in per_profile.items():
+            found = normalize(row["texts"])
+            recall = len(found & reference) / len(reference) if reference else 1.0
+            row["recall"] = recall
+            row["text_count"] = len(row.pop("texts"))
+
+        results[path] = per_profile
+
+    return results
+
+
+def print_table(results):
+    print(f"{'image':<22}{'profile':<10}{'latency(s)':>12}{'recall':>8}{'texts':>7}")
+
+    for path, per_profile in results.items():
+        for name, row in per_profile.items():
+            print(f"{path:<22}{name:<10}{row['latency_s']:>12.3f}"
+                  f"{row['recall']:>8.2f}{row['text_count']:>7}")
+
+
+if __name__ == "__main__":
+    paths = sys.argv[1:] or SAMPLE_IMAGES
+    res = benchmark(paths)
+    print_table(res)
+
+    with open("ocr_profile_benchmark.json", "w") as f:
+        json.dump(res, f, indent=2)
@@ -0,0 +1,121 @@
+# benchmark_server.py
+
+# Load generator for server.py: uploads images from concurrent clients
+# and measures end to end latency and throughput.
+#
+#   python server.py --standin simulate --workers 2
+#   python benchmark_server.py --requests 50 --concurrency 8
+#   python benchmark_server.py --endpoint analyze --mode rules
+
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from bench_stats import percentile
+
+# client side only: no cv / ocr / agent imports
+SAMPLE_IMAGES = ["pcbclear2.jpg", "pcbimagetrial.jfif"]
+
+POLL_WAIT_S = 30
+
+
+def submit_job(session, url, image_path, form):
+    with open(image_path, "rb") as f:
+        res = session.post(f"{url}/jobs", files={"image": f}, data=form)
+
+    if res.status_code == 503:
+        return {"status": "rejected"}
+    res.raise_for_status()
+
+    job_id = res.json()["job_id"]
+
+    # long poll until done
+    while True:
+        info = session.get(f"{url}/jobs/{job_id}", params={"wait": POLL_WAIT_S}).json()
+        if info["state"] == "done":
+            return info
+
+
+def analyze_sync(session, url, image_path, form):
+    with open(image_path, "rb") as f:
+        res = session.post(f"{url}/analyze", files={"image": f}, data=form)
+
+    if res.status_code == 503:
+        return {"status": "rejected"}
+    res.raise_for_status()
+
+    info = res.json()
+    if info["state"] != "done":
+        # took longer than the sync timeout, finish by polling
+        while info["state"] != "done":
+            info = session.get(f"{url}/jobs/{info['job_id']}", params={"wait": POLL_WAIT_S}).json()
+
+    return info
+
+
+def load_test(url, image_paths, requests_total, concurrency, endpoint="jobs", form=None):
+    call = submit_job if endpoint == "jobs" else analyze_sync
+    local = threading.local()
+
+    def one(i):
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+
+        start = time.perf_counter()
+        try:
+            info = call(local.session, url, image_paths[i % len(image_paths)], form or {})
+            status = info.get("status")
+        except requests.RequestException as e:
+            info = {}
+            status = f"http_error: {type(e).__name__}"
+
+        return time.perf_counter() - start, status, info.get("queue_s"), info.get("run_s")
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(one, range(requests_total)))
+    elapsed = time.perf_counter() - start
+
+    statuses = {}
+    for _, status, _, _ in outcomes:
+        statuses[status] = statuses.get(status, 0) + 1
+
+    latencies = [o[0] for o in outcomes]
+    queued = [o[2] for o in outcomes if o[2] is not None]
+    run = [o[3] for o in outcomes if o[3] is not None]
+
+    return {
+        "requests": requests_total,
+        "concurrency": concurrency,
+        "elapsed_s": elapsed,
+        "throughput_rps": requests_total / elapsed if elapsed else 0.0,
+        "p50_s": percentile(latencies, 50),
+        "p95_s": percentile(latencies, 95),
+        "p99_s": percentile(latencies, 99),
+        "mean_queue_s": sum(queued) / len(queued) if queued else None,
+        "mean_run_s": sum(run) / len(run) if run else None,
+        "statuses": statuses,
+        "server": requests.get(f"{url}/metrics").json()
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the analysis server.")
+    parser.add_argument("images", nargs="*", default=SAMPLE_IMAGES)
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--endpoint", choices=["jobs", "analyze"], default="jobs")
+    parser.add_argument("--mode", choices=["agent", "single_pass", "rules"], default="agent")
+    parser.add_argument("--ocr-profile")
+    args = parser.parse_args()
+
+    form = {"mode": args.mode}
+    if args.ocr_profile:
+        form["ocr_profile"] = args.ocr_profile
+
+    res = load_test(args.url, args.images, args.requests, args.concurrency, args.endpoint, form)
+
+    for key, value in res.items():
+        print(f"{key}: {value}")
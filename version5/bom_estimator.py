@@ -0,0 +1,135 @@
+# bom_estimator.py
+
+# Rule based estimate built from the same tool outputs the agent sees.
+# Uses the cost rules from the agent's system prompt, so it can stand in
+# for the LLM (standalone, preliminary answer, or fallback).
+
+import re
+
+# INR per component, from the system prompt cost rules
+COST_RANGES_INR = {
+    "resistor": (0.5, 5),
+    "capacitor": (1, 50),
+    "IC": (20, 500),
+    # unclassified parts are priced like passives
+    "unknown": (0.5, 50)
+}
+
+# OCR reference designator prefix -> component type
+REFERENCE_TYPES = {"R": "resistor", "C": "capacitor", "U": "IC"}
+
+# part marking prefixes hinting at the board's purpose
+PART_FAMILIES = {
+    "MCU": r"^(ATMEGA|ATTINY|STM32|ESP|PIC|MSP430|NRF|RP2040|CH340|CH552)",
+    "power": r"^(LM78|LM79|LM317|LM2596|AMS1117|TPS|MP\d|XL\d|MC34063|TL431|IRF)",
+    "sensor": r"^(BME|BMP|MPU|ADXL|HMC|DHT|LSM|INA|MAX3010|SHT)"
+}
+
+COMPLEXITY_THRESHOLDS = {
+    # (max components, max ICs, max coverage) for each level
+    "low": (30, 2, 0.25),
+    "medium": (120, 8, 0.5)
+}
+
+
+def component_counts(stats, ic_info):
+    """
+    CV type counts, raised to the OCR reference counts where OCR saw more.
+    The IC count is also at least the number of part markings OCR read
+    (ic_count_ocr). The one IC count for the estimate and the validator.
+    """
+
+    type_counts = dict((stats or {}).get("type_counts") or {})
+    ref_counts = (ic_info or {}).get("reference_counts") or {}
+
+    counts = {t: int(type_counts.get(t, 0)) for t in COST_RANGES_INR}
+
+    # anything the cv heuristics labelled otherwise counts as unknown
+    for t, n in type_counts.items():
+        if t not in COST_RANGES_INR:
+            counts["unknown"] += int(n)
+
+    for prefix, t in REFERENCE_TYPES.items():
+        counts[t] = max(counts[t], int(ref_counts.get(prefix, 0)))
+
+    counts["IC"] = max(counts["IC"], int((ic_info or {}).get("ic_count_ocr") or 0))
+
+    return counts
+
+
+def bom_range(counts):
+    low = sum(n * COST_RANGES_INR[t][0] for t, n in counts.items())
+    high = sum(n * COST_RANGES_INR[t][1] for t, n in counts.items())
+    return low, high
+
+
+def format_range(low, high):
+    return f"{int(low)}-{int(round(high))} INR"
+
+
+def estimate_complexity(component_count, ic_count, coverage):
+    for level in ("low", "medium"):
+        max_count, max_ics, max_coverage = COMPLEXITY_THRESHOLDS[level]
+        if component_count <= max_count and ic_count <= max_ics and coverage <= max_coverage:
+            return level
+
+    return "high"
+
+
+def estimate_pcb_type(ic_names, counts):
+    families = set()
+
+    for name in ic_names or []:
+        for family, pattern in PART_FAMILIES.items():
+            if re.match(pattern, name.upper()):
+                families.add(family)
+
+    if len(families) == 1:
+        return families.pop()
+    if len(families) > 1:
+        return "mixed"
+
+    # no recognised markings: only a weak structural guess
+    if counts["IC"] == 0:
+        return "unknown"
+    if counts["resistor"] + counts["capacitor"] > 10 * counts["IC"]:
+        return "mixed"
+
+    return "unknown"
+
+
+def estimate_bom(stats, ic_info=None):
+    """
+    Returns an answer shaped like the agent's final_answer.
+    stats: get_component_stats / run_cv tool output
+    ic_info: get_ic_info tool output (optional)
+    """
+
+    stats = stats or {}
+    ic_info = ic_info or {}
+
+    counts = component_counts(stats, ic_info)
+    component_count = int(stats.get("component_count") or 0)
+    coverage = float(stats.get("coverage") or 0.0)
+    ic_names = ic_info.get("possible_ic_names") or []
+
+    low, high = bom_range(counts)
+    complexity = estimate_complexity(component_count, counts["IC"], coverage)
+    pcb_type = estimate_pcb_type(ic_names, counts)
+
+    reasoning = (
+        f"Rule based: {component_count} components "
+        f"(IC {counts['IC']}, resistor {counts['resistor']}, "
+        f"capacitor {counts['capacitor']}, unknown {counts['unknown']}), "
+        f"coverage {coverage:.2f}."
+    )
+
+    if not component_count:
+        reasoning += " No components detected, data is insufficient."
+
+    return {
+        "complexity": complexity,
+        "pcb_type": pcb_type,
+        "estimated_bom_inr": format_range(low, high),
+        "reasoning": reasoning
+    }
@@ -3,13 +3,19 @@
 import cv2
 import numpy as np
 from typing import Dict, List, Tuple, Optional
+from tracing import traced, current_span
 
-def run_cv(image_path: str) -> Dict:
-    image = cv2.imread(image_path)
+@traced("cv.run_cv")
+def run_cv(image_path: str, image: Optional[np.ndarray] = None) -> Dict:
+    # image: already decoded (staged pipeline), skips the read
+    if image is None:
+        image = cv2.imread(image_path)
     if image is None:
         raise FileNotFoundError(f"Image not found: {image_path}")
+
+    current_span().set_attributes({"height": image.shape[0], "width": image.shape[1]})
     
-    object_type, mask, cropped = detect_main_object(image)
+    object_type, mask, cropped, crop_box = detect_main_object(image)
     
     if object_type != "PCB":
         return {
@@ -27,22 +33,27 @@ def run_cv(image_path: str) -> Dict:
     components = heuristic_classification(components)
     components = mark_ic_candidates(components)
     visualization = visualize_components(cropped, components)
+
+    current_span().set("component_count", len(components))
     
     return {
         "object_type": object_type,
+        # component bboxes are relative to this crop of the input image
+        "crop_box": crop_box,
         "visualization": visualization,
         "components": components
     }
 
 
-def detect_main_object(image: np.ndarray) -> Tuple[str, Optional[np.ndarray], Optional[np.ndarray]]:
+@traced("cv.detect_main_object")
+def detect_main_object(image: np.ndarray) -> Tuple[str, Optional[np.ndarray], Optional[np.ndarray], Optional[Dict]]:
     gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
     _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
     
     contours, _ = cv2.findContours(binary, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
     
     if not contours:
-        return "UNKNOWN", None, None
+        return "UNKNOWN", None, None, None
     
     largest = max(contours, key=cv2.contourArea)
     
@@ -57,7 +68,7 @@ def detect_main_object(image: np.ndarray) -> Tuple[str, Optional[np.ndarray], Op
     area_ratio = contour_area / image_area
     
     if not is_convex or vertex_count < 4 or area_ratio < 0.1:
-        return "UNKNOWN", None, None
+        return "UNKNOWN", None, None, None
     
     hull = cv2.convexHull(approx)
     hull_area = cv2.contourArea(hull)
@@ -66,7 +77,7 @@ def detect_main_object(image: np.ndarray) -> Tuple[str, Optional[np.ndarray], Op
     if solidity > 0.85:
         object_type = "PCB"
     else:
-        return "UNSUPPORTED", None, None
+        return "UNSUPPORTED", None, None, None
     
     mask = np.zeros(gray.shape, dtype=np.uint8)
     cv2.drawContours(mask, [largest], -1, 255, -1)
@@ -75,9 +86,12 @@ def detect_main_object(image: np.ndarray) -> Tuple[str, Optional[np.ndarray], Op
     cropped = image[y:y+h, x:x+w].copy()
     mask_cropped = mask[y:y+h, x:x+w].copy()
     
-    return object_type, mask_cropped, cropped
+    crop_box = {"x": int(x), "y": int(y), "w": int(w), "h": int(h)}
+
+    return object_type, mask_cropped, cropped, crop_box
 
 
+@traced("cv.preprocess_pcb")
 def preprocess_pcb(pcb_image: np.ndarray, mask: np.ndarray) -> np.ndarray:
     gray = cv2.cvtColor(pcb_image, cv2.COLOR_BGR2GRAY)
     gray = cv2.bitwise_and(gray, gray, mask=mask)
@@ -97,6 +111,7 @@ def preprocess_pcb(pcb_image: np.ndarray, mask: np.ndarray) -> np.ndarray:
     return normalized.astype(np.uint8)
 
 
+@traced("cv.detect_component_candidates")
 def detect_component_candidates(preprocessed: np.ndarray, mask: np.ndarray):
     edges = cv2.Canny(preprocessed, 50, 150)
     
@@ -120,6 +135,7 @@ def detect_component_candidates(preprocessed: np.ndarray, mask: np.ndarray):
     return boxes
 
 
+@traced("cv.merge_boxes")
 def merge_boxes(boxes):
     def boxes_close(b1, b2, thresh=20):
         x1, y1, w1, h1 = b1
@@ -168,6 +184,7 @@ def merge_boxes(boxes):
     return merged
 
 
+@traced("cv.filter_components")
 def filter_components(boxes: List[Tuple[int, int, int, int]], mask: np.ndarray) -> List[Tuple[int, int, int, int]]:
     if not boxes:
         return []
@@ -196,6 +213,7 @@ def filter_components(boxes: List[Tuple[int, int, int, int]], mask: np.ndarray)
     return filtered
 
 
+@traced("cv.extract_features")
 def extract_features(
     boxes: List[Tuple[int, int, int, int]],
     preprocessed: np.ndarray,
@@ -260,6 +278,7 @@ def extract_features(
     
     return components
 
+@traced("cv.mark_ic_candidates")
 def mark_ic_candidates(components):
     if not components:
         return components
@@ -277,6 +296,7 @@ def mark_ic_candidates(components):
 
     return components
 
+@traced("cv.heuristic_classification")
 def heuristic_classification(components: List[Dict]) -> List[Dict]:
     for comp in components:
         ar = comp["aspect_ratio"]
@@ -302,6 +322,7 @@ def heuristic_classification(components: List[Dict]) -> List[Dict]:
     return components
 
 
+@traced("cv.visualize_components")
 def visualize_components(pcb_image: np.ndarray, components: List[Dict]) -> np.ndarray:
     vis = pcb_image.copy()
     
@@ -0,0 +1,72 @@
+# incremental_json.py
+
+import json
+
+
+class IncrementalJSONParser:
+    """
+    Fed text chunk by chunk (e.g. streamed LLM tokens).
+    feed() returns the first complete top-level JSON object once it
+    closes, otherwise None. Text before the object is ignored.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.pos = 0
+        self.start = -1
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.result = None
+
+    def feed(self, chunk):
+        if self.result is not None:
+            return self.result
+
+        self.buffer += chunk
+
+        while self.pos < len(self.buffer):
+            ch = self.buffer[self.pos]
+            self.pos += 1
+
+            if self.start == -1:
+                if ch == "{":
+                    self.start = self.pos - 1
+                    self.depth = 1
+                continue
+
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == "\\":
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+                continue
+
+            if ch == '"':
+                self.in_string = True
+            elif ch == "{":
+                self.depth += 1
+            elif ch == "}":
+                self.depth -= 1
+
+                if self.depth == 0:
+                    candidate = self.buffer[self.start:self.pos]
+
+                    try:
+                        self.result = json.loads(candidate)
+                        return self.result
+                    except ValueError:
+                        # not valid json, look for the next object
+                        self.start = -1
+
+        return None
+
+    @property
+    def complete(self):
+        return self.result is not None
+
+    @property
+    def text(self):
+        return self.buffer
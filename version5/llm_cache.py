@@ -0,0 +1,146 @@
+# llm_cache.py
+
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+CACHE_PATH = os.environ.get("LLM_CACHE_PATH", ".llm_cache.sqlite3")
+CACHE_TTL_S = 7 * 24 * 3600
+CACHE_MAX_ENTRIES = 5000
+
+# payload fields that do not change the generated text
+IGNORED_FIELDS = {"stream", "keep_alive"}
+
+_conn = None
+_lock = threading.Lock()
+
+
+def _connect():
+    global _conn
+
+    if _conn is None:
+        _conn = sqlite3.connect(CACHE_PATH, check_same_thread=False)
+        _conn.execute("""
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                created REAL NOT NULL,
+                accessed REAL NOT NULL
+            )
+        """)
+        _conn.execute("CREATE INDEX IF NOT EXISTS idx_accessed ON llm_cache(accessed)")
+        _conn.commit()
+
+    return _conn
+
+
+def normalize_prompt(text):
+    lines = [re.sub(r"\s+", " ", line).strip() for line in text.strip().splitlines()]
+    return "\n".join(line for line in lines if line)
+
+
+def _normalize(value):
+    if isinstance(value, str):
+        return normalize_prompt(value)
+    if isinstance(value, list):
+        return [_normalize(v) for v in value]
+    if isinstance(value, dict):
+        return {k: _normalize(v) for k, v in value.items()}
+    return value
+
+
+def make_key(payload):
+    """
+    Hash of model, generation options and normalized prompt/messages.
+    """
+
+    keyed = {k: v for k, v in payload.items() if k not in IGNORED_FIELDS}
+    keyed = _normalize(keyed)
+
+    blob = json.dumps(keyed, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+def cache_allowed(payload, allow_sampled=False):
+    """
+    Sampled generations are not reproducible, so only temperature 0 is
+    cached unless explicitly allowed. Ollama's default temperature is not 0.
+    """
+
+    if allow_sampled:
+        return True
+
+    options = payload.get("options") or {}
+    return options.get("temperature") == 0
+
+
+def get(key):
+    now = time.time()
+
+    with _lock:
+        conn = _connect()
+        row = conn.execute(
+            "SELECT value, created FROM llm_cache WHERE key = ?", (key,)
+        ).fetchone()
+
+        if row is None:
+            return None
+
+        value, created = row
+
+        if now - created > CACHE_TTL_S:
+            conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+            conn.commit()
+            return None
+
+        conn.execute("UPDATE llm_cache SET accessed = ? WHERE key = ?", (now, key))
+        conn.commit()
+
+    return json.loads(value)
+
+
+def put(key, value):
+    now = time.time()
+
+    with _lock:
+        conn = _connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO llm_cache (key, value, created, accessed) VALUES (?, ?, ?, ?)",
+            (key, json.dumps(value), now, now)
+        )
+        _evict(conn, now)
+        conn.commit()
+
+
+def _evict(conn, now):
+    conn.execute("DELETE FROM llm_cache WHERE created < ?", (now - CACHE_TTL_S,))
+
+    count = conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+    overflow = count - CACHE_MAX_ENTRIES
+
+    # least recently used go first
+    if overflow > 0:
+        conn.execute(
+            "DELETE FROM llm_cache WHERE key IN "
+            "(SELECT key FROM llm_cache ORDER BY accessed ASC LIMIT ?)",
+            (overflow,)
+        )
+
+
+def clear():
+    with _lock:
+        conn = _connect()
+        conn.execute("DELETE FROM llm_cache")
+        conn.commit()
+
+
+def stats():
+    with _lock:
+        conn = _connect()
+        count = conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+
+    return {"entries": count, "path": CACHE_PATH}
@@ -0,0 +1,561 @@
+# llm_client.py
+
+import os
+import json
+import time
+import threading
+from collections import deque
+from urllib.parse import urlsplit, urlunsplit
+import requests
+from requests.adapters import HTTPAdapter
+from tenacity import Retrying, retry_if_exception, stop_after_attempt, wait_exponential
+from incremental_json import IncrementalJSONParser
+import llm_cache
+from llm_limiter import LIMITER, PRIORITY_NORMAL
+from tracing import span
+
+
+def normalize_host(host):
+    """
+    OLLAMA_HOST as ollama itself accepts it ("0.0.0.0:11434", ":11434",
+    "myhost") -> a base url. Without a scheme, http and port 11434 are
+    assumed; a bind-all address means this machine.
+    """
+
+    host = host.strip()
+    default_port = None
+
+    if "://" not in host:
+        host = f"http://{host}"
+        default_port = 11434
+
+    parts = urlsplit(host)
+
+    hostname = parts.hostname or "127.0.0.1"
+    if hostname in ("0.0.0.0", "::"):
+        hostname = "127.0.0.1"
+    if ":" in hostname:
+        hostname = f"[{hostname}]"
+
+    port = parts.port or default_port
+    netloc = f"{hostname}:{port}" if port else hostname
+
+    return urlunsplit((parts.scheme, netloc, parts.path.rstrip("/"), "", ""))
+
+
+OLLAMA_HOST = normalize_host(os.environ.get("OLLAMA_HOST", "http://localhost:11434"))
+
+# (connect, read) in seconds
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = 300
+
+MAX_ATTEMPTS = 3
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+POOL_SIZE = 16
+
+# persistent prompt cache (see llm_cache.py)
+USE_CACHE = os.environ.get("LLM_CACHE", "1") != "0"
+
+# last N calls, newest last
+LLM_METRICS = deque(maxlen=1000)
+
+# after the streamed JSON object closes, whitespace chunks read while
+# waiting for the "done" chunk (and its token / timing stats) before
+# giving up and closing the stream
+JSON_DONE_GRACE_CHUNKS = 8
+
+# timing / token stats only ollama's final chunk carries. None in the
+# metrics of an early-stopped stream: unavailable, not zero.
+SERVER_STATS = [
+    "prompt_eval_count", "eval_count", "prompt_eval_duration_ms",
+    "eval_duration_ms", "load_duration_ms", "total_duration_ms", "tokens_per_s"
+]
+
+_session = None
+_session_lock = threading.Lock()
+_local = threading.local()
+
+
+# both are RequestExceptions: once retries run out, a 5xx or an error
+# chunk means the llm is unavailable (agent.LLM_UNAVAILABLE_ERRORS)
+class RetryableStatusError(requests.exceptions.RequestException):
+    def __init__(self, response):
+        super().__init__(f"Ollama returned HTTP {response.status_code}")
+        self.response = response
+
+
+class LLMStreamError(requests.exceptions.RequestException):
+    """
+    Ollama reported an error in the middle of a stream (e.g. the runner
+    crashed or ran out of memory).
+    """
+
+
+class LLMRequestError(Exception):
+    """
+    Ollama rejected the request itself (4xx other than 429), e.g. a model
+    that was never pulled. A configuration problem, not an outage: it is
+    not retried and not one of the "llm unavailable" errors that end in
+    the rules fallback.
+    """
+
+    def __init__(self, status_code, detail):
+        super().__init__(f"Ollama rejected the request (HTTP {status_code}): {detail}")
+        self.status_code = status_code
+        self.detail = detail
+        self.model_missing = status_code == 404
+
+
+def request_error(status_code, body):
+    """
+    LLMRequestError for a 4xx response, else None.
+    """
+
+    if not 400 <= status_code < 500 or status_code in RETRYABLE_STATUS:
+        return None
+
+    try:
+        detail = json.loads(body).get("error") or body
+    except (ValueError, AttributeError):
+        detail = body
+
+    return LLMRequestError(status_code, detail)
+
+
+def get_session():
+    global _session
+
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_SIZE)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _session = session
+
+    return _session
+
+
+def _is_retryable(exc):
+    # read timeouts are not retried, the model is still busy generating
+    if isinstance(exc, requests.exceptions.ReadTimeout):
+        return False
+
+    return isinstance(exc, (
+        requests.exceptions.ConnectionError,
+        requests.exceptions.ConnectTimeout,
+        RetryableStatusError
+    ))
+
+
+def _post(path, payload, stream=False):
+    """
+    POST to Ollama with retries. Returns (response, attempts).
+    """
+
+    url = f"{OLLAMA_HOST}{path}"
+    attempts = 0
+
+    retrying = Retrying(
+        retry=retry_if_exception(_is_retryable),
+        stop=stop_after_attempt(MAX_ATTEMPTS),
+        wait=wait_exponential(multiplier=0.5, max=8),
+        reraise=True
+    )
+
+    for attempt in retrying:
+        with attempt:
+            attempts += 1
+
+            response = get_session().post(
+                url,
+                json=payload,
+                timeout=(CONNECT_TIMEOUT, READ_TIMEOUT),
+                stream=stream
+            )
+
+            if response.status_code in RETRYABLE_STATUS:
+                response.close()
+                raise RetryableStatusError(response)
+
+            if response.status_code >= 400:
+                error = request_error(response.status_code, response.text)
+                if error is not None:
+                    response.close()
+                    raise error
+
+            response.raise_for_status()
+
+    return response, attempts
+
+
+def _ns_to_ms(value):
+    return value / 1e6 if value else 0.0
+
+
+def build_metrics(result, endpoint, wall_s, attempts):
+    prompt_eval_ns = result.get("prompt_eval_duration", 0)
+    eval_ns = result.get("eval_duration", 0)
+    eval_count = result.get("eval_count", 0)
+
+    return {
+        "model": result.get("model"),
+        "endpoint": endpoint,
+        "prompt_eval_count": result.get("prompt_eval_count", 0),
+        "eval_count": eval_count,
+        "prompt_eval_duration_ms": _ns_to_ms(prompt_eval_ns),
+        "eval_duration_ms": _ns_to_ms(eval_ns),
+        "load_duration_ms": _ns_to_ms(result.get("load_duration", 0)),
+        "total_duration_ms": _ns_to_ms(result.get("total_duration", 0)),
+        "tokens_per_s": eval_count / (eval_ns / 1e9) if eval_ns else 0.0,
+        "wall_ms": wall_s * 1000,
+        "attempts": attempts
+    }
+
+
+def record_metrics(metrics):
+    LLM_METRICS.append(metrics)
+    _local.last_metrics = metrics
+
+
+def get_last_metrics():
+    """
+    Metrics of the last call made from this thread.
+    """
+
+    return getattr(_local, "last_metrics", None)
+
+
+def post_ollama(path, payload):
+    """
+    Non-streaming call. Returns the Ollama json with a "metrics" entry.
+    """
+
+    start = time.perf_counter()
+    response, attempts = _post(path, payload)
+    result = response.json()
+
+    metrics = build_metrics(result, path, time.perf_counter() - start, attempts)
+    record_metrics(metrics)
+
+    result["metrics"] = metrics
+    return result
+
+
+def _chunk_text(chunk):
+    # /api/generate streams "response", /api/chat streams message.content
+    if "message" in chunk:
+        return (chunk["message"] or {}).get("content", "")
+    return chunk.get("response", "")
+
+
+class StreamCollector:
+    """
+    Accumulates Ollama's NDJSON stream chunks. add_line() returns True
+    when reading should stop: done, or with stop_on_json, a complete JSON
+    object followed by more text (or by too many whitespace chunks) rather
+    than done. Shared by the sync and async clients.
+    """
+
+    def __init__(self, path, payload, stop_on_json=True):
+        self.path = path
+        self.payload = payload
+        self.stop_on_json = stop_on_json
+        self.parser = IncrementalJSONParser()
+        self.start = time.perf_counter()
+        self.text = ""
+        self.tool_calls = []
+        self.final_chunk = {}
+        self.chunks = 0
+        self.first_token_s = None
+        self.json_done = False
+        self.grace_chunks = 0
+        self.early_stop = False
+
+    def add_line(self, line):
+        if not line:
+            return False
+
+        chunk = json.loads(line)
+
+        if chunk.get("error"):
+            raise LLMStreamError(f"Ollama error: {chunk['error']}")
+
+        # native tool calls arrive whole in a single chunk
+        self.tool_calls.extend((chunk.get("message") or {}).get("tool_calls") or [])
+
+        piece = _chunk_text(chunk)
+        if piece:
+            self.chunks += 1
+            if self.first_token_s is None:
+                self.first_token_s = time.perf_counter() - self.start
+            self.text += piece
+
+        if chunk.get("done"):
+            self.final_chunk = chunk
+            return True
+
+        if not self.stop_on_json:
+            return False
+
+        if not self.json_done:
+            self.json_done = self.parser.feed(piece) is not None
+            return False
+
+        # the object is complete: keep reading for done unless the model
+        # goes on generating past it
+        self.grace_chunks += 1
+        if piece.strip() or self.grace_chunks > JSON_DONE_GRACE_CHUNKS:
+            self.early_stop = True
+            return True
+
+        return False
+
+    def finish(self, attempts):
+        text = self.text
+        if self.early_stop:
+            text = json.dumps(self.parser.result)
+
+        result = dict(self.final_chunk)
+        result.setdefault("model", self.payload.get("model"))
+
+        if self.path == "/api/chat":
+            result["message"] = {"role": "assistant", "content": text}
+            if self.tool_calls:
+                result["message"]["tool_calls"] = self.tool_calls
+        else:
+            result["response"] = text
+
+        metrics = build_metrics(result, self.path, time.perf_counter() - self.start, attempts)
+        metrics["streamed"] = True
+        metrics["streamed_chunks"] = self.chunks
+        metrics["early_stop"] = self.early_stop
+        metrics["first_token_ms"] = (self.first_token_s or 0.0) * 1000
+
+        # early stop never sees the final chunk
+        if self.early_stop:
+            metrics.update({key: None for key in SERVER_STATS})
+
+        result["metrics"] = metrics
+        return result
+
+
+def stream_ollama(path, payload, stop_on_json=True):
+    """
+    Streaming call reading Ollama's NDJSON chunks.
+    With stop_on_json, the connection is closed when the model keeps
+    generating after a complete top-level JSON object, which makes Ollama
+    stop. Trailing whitespace is read on for a few chunks so the done
+    chunk's stats are kept. Returns the same shape as post_ollama.
+    """
+
+    payload = dict(payload, stream=True)
+    collector = StreamCollector(path, payload, stop_on_json)
+
+    response, attempts = _post(path, payload, stream=True)
+
+    try:
+        for line in response.iter_lines():
+            if collector.add_line(line):
+                break
+    finally:
+        # closing mid-stream cancels the generation server side
+        response.close()
+
+    result = collector.finish(attempts)
+    record_metrics(result["metrics"])
+
+    return result
+
+
+def cache_lookup(path, payload, use_cache=True, allow_sampled=False):
+    """
+    Returns (key, cached result). key is None when the call is not cacheable.
+    """
+
+    if not (use_cache and USE_CACHE and llm_cache.cache_allowed(payload, allow_sampled)):
+        return None, None
+
+    start = time.perf_counter()
+    key = llm_cache.make_key(dict(payload, endpoint=path))
+    cached = llm_cache.get(key)
+
+    if cached is None:
+        return key, None
+
+    metrics = dict(cached.get("metrics") or {})
+    metrics.update({
+        "endpoint": path,
+        "cache_hit": True,
+        "wall_ms": (time.perf_counter() - start) * 1000,
+        # no tokens were evaluated for this call
+        "prompt_eval_count": 0,
+        "eval_count": 0,
+        "prompt_eval_duration_ms": 0.0,
+        "eval_duration_ms": 0.0,
+        "attempts": 0
+    })
+
+    cached["metrics"] = metrics
+    return key, cached
+
+
+def cache_store(key, result):
+    result["metrics"]["cache_hit"] = False
+
+    if key is not None:
+        llm_cache.put(key, result)
+
+
+# metrics copied onto the llm span
+SPAN_METRICS = [
+    "cache_hit", "queue_wait_ms", "prompt_eval_count", "eval_count",
+    "prompt_eval_duration_ms", "eval_duration_ms", "load_duration_ms",
+    "first_token_ms", "early_stop", "attempts"
+]
+
+
+def set_span_metrics(s, metrics):
+    s.set_attributes({k: metrics[k] for k in SPAN_METRICS if k in metrics})
+
+
+def call_ollama(path, payload, stream=False, stop_on_json=True,
+                use_cache=True, allow_sampled=False, priority=PRIORITY_NORMAL):
+    """
+    Single entry point for Ollama calls: cache lookup, then a streaming
+    or non-streaming request once the limiter admits it.
+    Raises llm_limiter.LLMBusyError when overloaded.
+    """
+
+    with span("llm.call_ollama", endpoint=path, model=payload.get("model"), stream=stream) as s:
+        key, cached = cache_lookup(path, payload, use_cache, allow_sampled)
+
+        if cached is not None:
+            record_metrics(cached["metrics"])
+            set_span_metrics(s, cached["metrics"])
+            return cached
+
+        with LIMITER.slot(priority) as slot:
+            if stream:
+                result = stream_ollama(path, payload, stop_on_json)
+            else:
+                result = post_ollama(path, payload)
+
+        result["metrics"]["queue_wait_ms"] = slot["waited_s"] * 1000
+        set_span_metrics(s, result["metrics"])
+
+        cache_store(key, result)
+
+    return result
+
+
+def generate(payload, stream=False, stop_on_json=True, use_cache=True,
+             allow_sampled=False, priority=PRIORITY_NORMAL):
+    return call_ollama("/api/generate", payload, stream, stop_on_json,
+                       use_cache, allow_sampled, priority)
+
+
+def chat(payload, stream=False, stop_on_json=True, use_cache=True,
+         allow_sampled=False, priority=PRIORITY_NORMAL):
+    return call_ollama("/api/chat", payload, stream, stop_on_json,
+                       use_cache, allow_sampled, priority)
+
+
+def response_tool_calls(result):
+    """
+    Native tool calls as [{"name": ..., "arguments": {...}}].
+    """
+
+    calls = []
+
+    for call in (result.get("message") or {}).get("tool_calls") or []:
+        function = call.get("function") or {}
+        arguments = function.get("arguments") or {}
+
+        if isinstance(arguments, str):
+            arguments = json.loads(arguments)
+
+        calls.append({"name": function.get("name"), "arguments": arguments})
+
+    return calls
+
+
+def response_text(result):
+    if "message" in result:
+        return (result["message"] or {}).get("content", "")
+    return result.get("response", "")
+
+
+def has_server_stats(metrics):
+    return metrics.get("eval_duration_ms") is not None
+
+
+def metrics_summary():
+    """
+    Token and server timing figures cover only the calls that have them
+    (see SERVER_STATS), counted in "calls_with_stats".
+    """
+
+    calls = list(LLM_METRICS)
+
+    if not calls:
+        return {"calls": 0}
+
+    n = len(calls)
+    with_stats = [m for m in calls if has_server_stats(m)]
+    s = len(with_stats)
+
+    return {
+        "calls": n,
+        "calls_with_stats": s,
+        "mean_wall_ms": sum(m["wall_ms"] for m in calls) / n,
+        "mean_prompt_eval_ms": sum(m["prompt_eval_duration_ms"] for m in with_stats) / s if s else None,
+        "mean_eval_ms": sum(m["eval_duration_ms"] for m in with_stats) / s if s else None,
+        "prompt_tokens": sum(m["prompt_eval_count"] for m in with_stats),
+        "generated_tokens": sum(m["eval_count"] for m in with_stats),
+        "retried_calls": sum(1 for m in calls if m["attempts"] > 1),
+        "early_stopped_calls": sum(1 for m in calls if m.get("early_stop")),
+        "cache_hits": sum(1 for m in calls if m.get("cache_hit"))
+    }
+
+
+def metrics_by_route():
+    """
+    Per call type (tool_selection / final_answer / reflection) latency
+    and token totals.
+    """
+
+    routes = {}
+
+    for m in list(LLM_METRICS):
+        route = m.get("route", "unrouted")
+        r = routes.setdefault(route, {
+            "calls": 0,
+            "calls_with_stats": 0,
+            "models": set(),
+            "wall_ms": 0.0,
+            "prompt_eval_ms": 0.0,
+            "eval_ms": 0.0,
+            "prompt_tokens": 0,
+            "generated_tokens": 0
+        })
+
+        r["calls"] += 1
+        r["models"].add(m.get("model"))
+        r["wall_ms"] += m["wall_ms"]
+
+        if not has_server_stats(m):
+            continue
+
+        r["calls_with_stats"] += 1
+        r["prompt_eval_ms"] += m["prompt_eval_duration_ms"]
+        r["eval_ms"] += m["eval_duration_ms"]
+        r["prompt_tokens"] += m["prompt_eval_count"]
+        r["generated_tokens"] += m["eval_count"]
+
+    for r in routes.values():
+        r["models"] = sorted(str(model) for model in r["models"])
+        r["mean_wall_ms"] = r["wall_ms"] / r["calls"]
+
+    return routes
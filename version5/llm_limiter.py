@@ -0,0 +1,303 @@
+# llm_limiter.py
+
+# Admission control in front of ollama. A slot is needed for every
+# generation; callers wait in a priority queue, and when the queue is
+# full or the wait is too long they get LLMBusyError right away instead
+# of piling onto the model and timing out after minutes.
+#
+# LLM_LOCK_DIR additionally shares the slots between processes
+# (streamlit sessions, batch workers) through file locks.
+
+import os
+import time
+import heapq
+import asyncio
+import threading
+import itertools
+from collections import deque
+from bench_stats import percentile
+
+try:
+    import fcntl
+except ImportError:  # windows: process-wide limiting only
+    fcntl = None
+
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 5
+PRIORITY_LOW = 10
+
+MAX_IN_FLIGHT = int(os.environ.get("LLM_MAX_IN_FLIGHT", "2"))
+MAX_QUEUE = int(os.environ.get("LLM_MAX_QUEUE", "16"))
+MAX_WAIT_S = float(os.environ.get("LLM_MAX_WAIT_S", "30"))
+LOCK_DIR = os.environ.get("LLM_LOCK_DIR")
+
+# how often a waiter re-checks the cross-process slot files
+_LOCK_POLL_S = 0.05
+
+
+class LLMBusyError(Exception):
+    def __init__(self, reason, waited_s=0.0, queue_depth=0):
+        super().__init__(f"LLM busy: {reason}")
+        self.reason = reason
+        self.waited_s = waited_s
+        self.queue_depth = queue_depth
+
+
+class LLMLimiter:
+    def __init__(self, max_in_flight=MAX_IN_FLIGHT, max_queue=MAX_QUEUE,
+                 max_wait_s=MAX_WAIT_S, lock_dir=LOCK_DIR):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.max_wait_s = max_wait_s
+        self.lock_dir = lock_dir if fcntl is not None else None
+
+        self._cond = threading.Condition()
+        self._waiters = []
+        self._counter = itertools.count()
+        self._in_flight = 0
+        # queue entry -> (loop, asyncio.Event) of acquire_async waiters
+        self._async_waiters = {}
+
+        # metrics
+        self._waits = deque(maxlen=1000)
+        self._admitted = 0
+        self._rejected = 0
+        self._max_depth = 0
+
+        if self.lock_dir:
+            os.makedirs(self.lock_dir, exist_ok=True)
+
+    # process-wide queue
+    def _acquire_local(self, priority, deadline):
+        with self._cond:
+            if len(self._waiters) >= self.max_queue and self._in_flight >= self.max_in_flight:
+                self._rejected += 1
+                raise LLMBusyError("queue_full", 0.0, len(self._waiters))
+
+            entry = (priority, next(self._counter))
+            heapq.heappush(self._waiters, entry)
+            self._max_depth = max(self._max_depth, len(self._waiters))
+
+            try:
+                while not (self._waiters[0] == entry and self._in_flight < self.max_in_flight):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._rejected += 1
+                        raise LLMBusyError("wait_timeout", self.max_wait_s, len(self._waiters))
+                    self._cond.wait(remaining)
+
+                self._in_flight += 1
+            finally:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+                self._notify()
+
+    async def _acquire_local_async(self, priority, deadline):
+        # same queue as _acquire_local, but the task waits on an asyncio
+        # event that _notify sets, so no thread is parked per waiter
+        loop = asyncio.get_running_loop()
+        event = asyncio.Event()
+
+        with self._cond:
+            if len(self._waiters) >= self.max_queue and self._in_flight >= self.max_in_flight:
+                self._rejected += 1
+                raise LLMBusyError("queue_full", 0.0, len(self._waiters))
+
+            entry = (priority, next(self._counter))
+            heapq.heappush(self._waiters, entry)
+            self._async_waiters[entry] = (loop, event)
+            self._max_depth = max(self._max_depth, len(self._waiters))
+
+        try:
+            while True:
+                with self._cond:
+                    if self._waiters[0] == entry and self._in_flight < self.max_in_flight:
+                        self._in_flight += 1
+                        return
+
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._rejected += 1
+                        raise LLMBusyError("wait_timeout", self.max_wait_s, len(self._waiters))
+
+                    event.clear()
+
+                try:
+                    await asyncio.wait_for(event.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            with self._cond:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+                del self._async_waiters[entry]
+                self._notify()
+
+    def _notify(self):
+        # caller holds self._cond
+        self._cond.notify_all()
+
+        for loop, event in self._async_waiters.values():
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:  # loop already closed
+                pass
+
+    def _release_local(self):
+        with self._cond:
+            self._in_flight -= 1
+            self._notify()
+
+    # cross-process slots: one lock file per slot
+    def _try_file_slot(self):
+        for i in range(self.max_in_flight):
+            path = os.path.join(self.lock_dir, f"llm_slot_{i}.lock")
+            fd = os.open(path, os.O_CREAT | os.O_RDWR)
+
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return fd
+            except OSError:
+                os.close(fd)
+
+        return None
+
+    def _acquire_file_slot(self, deadline):
+        while True:
+            fd = self._try_file_slot()
+            if fd is not None:
+                return fd
+
+            if time.monotonic() >= deadline:
+                raise LLMBusyError("wait_timeout", self.max_wait_s, self.queue_depth)
+
+            time.sleep(_LOCK_POLL_S)
+
+    async def _acquire_file_slot_async(self, deadline):
+        while True:
+            fd = self._try_file_slot()
+            if fd is not None:
+                return fd
+
+            if time.monotonic() >= deadline:
+                raise LLMBusyError("wait_timeout", self.max_wait_s, self.queue_depth)
+
+            await asyncio.sleep(_LOCK_POLL_S)
+
+    def acquire(self, priority=PRIORITY_NORMAL):
+        """
+        Blocks until a slot is free. Returns a token for release().
+        """
+
+        start = time.monotonic()
+        deadline = start + self.max_wait_s
+
+        self._acquire_local(priority, deadline)
+
+        fd = None
+        if self.lock_dir:
+            try:
+                fd = self._acquire_file_slot(deadline)
+            except LLMBusyError:
+                self._release_local()
+                with self._cond:
+                    self._rejected += 1
+                raise
+
+        waited = time.monotonic() - start
+        with self._cond:
+            self._admitted += 1
+            self._waits.append(waited)
+
+        return {"fd": fd, "waited_s": waited}
+
+    def release(self, token):
+        if token["fd"] is not None:
+            fcntl.flock(token["fd"], fcntl.LOCK_UN)
+            os.close(token["fd"])
+
+        self._release_local()
+
+    def slot(self, priority=PRIORITY_NORMAL):
+        return _Slot(self, priority)
+
+    async def acquire_async(self, priority=PRIORITY_NORMAL):
+        """
+        acquire() for the event loop: waits without blocking a thread.
+        """
+
+        start = time.monotonic()
+        deadline = start + self.max_wait_s
+
+        await self._acquire_local_async(priority, deadline)
+
+        fd = None
+        if self.lock_dir:
+            try:
+                fd = await self._acquire_file_slot_async(deadline)
+            except LLMBusyError:
+                self._release_local()
+                with self._cond:
+                    self._rejected += 1
+                raise
+            except BaseException:  # cancelled
+                self._release_local()
+                raise
+
+        waited = time.monotonic() - start
+        with self._cond:
+            self._admitted += 1
+            self._waits.append(waited)
+
+        return {"fd": fd, "waited_s": waited}
+
+    @property
+    def queue_depth(self):
+        return len(self._waiters)
+
+    def metrics(self):
+        with self._cond:
+            waits = list(self._waits)
+
+            return {
+                "in_flight": self._in_flight,
+                "max_in_flight": self.max_in_flight,
+                "queue_depth": len(self._waiters),
+                "max_queue_depth_seen": self._max_depth,
+                "admitted": self._admitted,
+                "rejected": self._rejected,
+                "mean_wait_s": sum(waits) / len(waits) if waits else 0.0,
+                "p95_wait_s": percentile(waits, 95) if waits else 0.0,
+                "cross_process": bool(self.lock_dir)
+            }
+
+
+class _Slot:
+    def __init__(self, limiter, priority):
+        self.limiter = limiter
+        self.priority = priority
+        self.token = None
+
+    def __enter__(self):
+        self.token = self.limiter.acquire(self.priority)
+        return self.token
+
+    def __exit__(self, *exc):
+        self.limiter.release(self.token)
+        return False
+
+    async def __aenter__(self):
+        self.token = await self.limiter.acquire_async(self.priority)
+        return self.token
+
+    async def __aexit__(self, *exc):
+        self.limiter.release(self.token)
+        return False
+
+
+# shared by every llm call in this process
+LIMITER = LLMLimiter()
+
+
+def limiter_metrics():
+    return LIMITER.metrics()
@@ -1,32 +1,142 @@
 # llm_pipeline.py
 
+import os
 import json
-import requests
 from typing import Dict, List
+from llm_client import generate, chat, response_text, response_tool_calls, LLMRequestError
+from tracing import span
+from llm_limiter import PRIORITY_NORMAL
+from prompt_encoder import encode_section, encode_components, compact_json, fit_to_budget, SECTION_BUDGETS
 
-OLLAMA_URL = "http://localhost:11434/api/generate"
 MODEL_NAME = "qwen2.5:7b-instruct"
 
+# model per call type: picking one of three tools does not need the 7B
+# model, only the final answer synthesis does.
+# the kv cache is per model: a step on another model than the previous
+# one evaluates the whole conversation again instead of only the new
+# messages. setting all three to one model (LLM_TOOL_MODEL=$LLM_FINAL_MODEL)
+# keeps one model per conversation and full prefix reuse.
+MODEL_ROUTES = {
+    "tool_selection": os.environ.get("LLM_TOOL_MODEL", "qwen2.5:1.5b-instruct-q4_K_M"),
+    "final_answer": os.environ.get("LLM_FINAL_MODEL", MODEL_NAME),
+    "reflection": os.environ.get("LLM_REFLECTION_MODEL", MODEL_NAME)
+}
+
+# routed models ollama reported as not pulled; their routes use MODEL_NAME
+MISSING_MODELS = set()
+
+# stream tokens and stop generation once a complete json object arrives
+LLM_STREAM = True
+
+# greedy decoding: the output is a strict json api, and temperature 0
+# makes identical prompts cacheable (see llm_cache.py).
+# num_ctx leaves room for the static system prefix plus a growing
+# conversation, so the prefix is never truncated out of the kv cache.
+# every request to a model (warm-up included) must send the same num_ctx:
+# ollama reloads the model when it changes.
+LLM_OPTIONS = {"temperature": 0, "num_ctx": 8192}
+
+# keep the model (and its kv cache) loaded between agent steps
+LLM_KEEP_ALIVE = "30m"
+
+AGENT_OPTIONS = LLM_OPTIONS
+
+# compact tables / rounded floats under per-section token budgets
+# (False restores the original pretty-printed json prompts)
+COMPACT_PROMPTS = True
+
+# components shown by the pretty-printed (non compact) board prompt
+VERBOSE_COMPONENT_ROWS = 10
+
+# "schema": constrain the reply with a json schema (always parses)
+# "native": ollama tool calling only, reply parsed from message.tool_calls
+AGENT_DECODING = "schema"
+
+FINAL_ANSWER_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "complexity": {"type": "string", "enum": ["low", "medium", "high"]},
+        "pcb_type": {"type": "string"},
+        "estimated_bom_inr": {"type": "string"},
+        "reasoning": {"type": "string"}
+    },
+    "required": ["complexity", "pcb_type", "estimated_bom_inr", "reasoning"]
+}
+
+
+def route_model(route: str) -> str:
+    model = MODEL_ROUTES[route]
+    return MODEL_NAME if model in MISSING_MODELS else model
+
+
+def model_missing(error: LLMRequestError, model: str) -> bool:
+    """
+    True when error says model is not pulled and the route can fall back
+    to MODEL_NAME; the model is then skipped for the rest of the process.
+    Any other 4xx is a configuration error for the caller.
+    """
+
+    if not error.model_missing or model == MODEL_NAME:
+        return False
+
+    if model not in MISSING_MODELS:
+        MISSING_MODELS.add(model)
+        print(f"\n--- MODEL {model} NOT FOUND, USING {MODEL_NAME} ---")
+        print(error.detail)
+
+    return True
+
 
 def run_local_llm(components: List[Dict]) -> Dict:
     prompt = build_prompt(components)
 
     payload = {
-        "model": MODEL_NAME,
+        "model": route_model("final_answer"),
         "prompt": prompt,
-        "stream": False
+        "stream": False,
+        "options": LLM_OPTIONS,
+        "keep_alive": LLM_KEEP_ALIVE,
+        "format": FINAL_ANSWER_SCHEMA
     }
 
-    response = requests.post(OLLAMA_URL, json=payload, timeout=300)
-    response.raise_for_status()
-
-    result = response.json()
-    text = result.get("response", "").strip()
+    result = generate(payload, stream=LLM_STREAM)
+    result["metrics"]["route"] = "final_answer"
+    text = response_text(result).strip()
 
     return parse_llm_response(text)
 
 
-def build_prompt(components: List[Dict]) -> str:
+def warm_models(routes=None) -> Dict:
+    """
+    Loads each routed model into ollama memory (a generate request
+    without a prompt only loads the model) and keeps it there for
+    LLM_KEEP_ALIVE. Loaded with LLM_OPTIONS, so the first real request
+    does not reload it with another num_ctx.
+    Returns {model: load time in ms or error text}.
+    """
+
+    models = sorted({MODEL_ROUTES[r] for r in (routes or MODEL_ROUTES)})
+    loaded = {}
+
+    for model in models:
+        payload = {"model": model, "stream": False, "options": LLM_OPTIONS,
+                   "keep_alive": LLM_KEEP_ALIVE}
+
+        try:
+            result = generate(payload, use_cache=False)
+            result["metrics"]["route"] = "warm_up"
+            loaded[model] = result["metrics"]["wall_ms"]
+        except LLMRequestError as e:
+            # found at startup, not on the first analysis
+            model_missing(e, model)
+            loaded[model] = f"{type(e).__name__}: {e}"
+        except Exception as e:
+            loaded[model] = f"{type(e).__name__}: {e}"
+
+    return loaded
+
+
+def build_prompt(components: List[Dict], compact: bool = None) -> str:
     num = len(components)
     if num == 0:
         raise ValueError("No components detected")
@@ -54,14 +164,24 @@ def build_prompt(components: List[Dict]) -> str:
         "size_counts": size_counts
     }
 
+    if compact is None:
+        compact = COMPACT_PROMPTS
+
+    if compact:
+        summary = encode_section(stats, "stats")
+        component_block = "Components (one row each):\n" + encode_components(components)
+    else:
+        summary = json.dumps(stats, indent=2)
+        component_block = (f"First {VERBOSE_COMPONENT_ROWS} components:\n"
+                           + json.dumps(components[:VERBOSE_COMPONENT_ROWS], indent=2))
+
     return f"""
 You are analyzing a PCB based ONLY on structured component data.
 
 Summary:
-{json.dumps(stats, indent=2)}
+{summary}
 
-First 10 components:
-{json.dumps(components[:10], indent=2)}
+{component_block}
 
 Guidelines:
 - Use type_counts to estimate composition
@@ -100,8 +220,7 @@ def parse_llm_response(text: str) -> Dict:
         }
 
 
-def run_llm(messages: List[Dict], tools: List[Dict]) -> Dict:
-    system_instructions = """
+AGENT_SYSTEM_PROMPT = """
 You are a STRICT JSON API for PCB analysis.
 
 You must ONLY return valid JSON.
@@ -149,7 +268,15 @@ Allowed outputs:
   }
 }
 
-2) Final answer:
+2) Several independent tool calls in one turn (they run in parallel):
+{
+  "tool_calls": [
+    {"name": "...", "arguments": { ... }},
+    {"name": "...", "arguments": { ... }}
+  ]
+}
+
+3) Final answer:
 {
   "final_answer": {
     "complexity": "...",
@@ -159,36 +286,181 @@ Allowed outputs:
   }
 }
 """
-    full_prompt = system_instructions + "\n\nConversation:\n"
 
-    for msg in messages:
-        role = msg["role"]
-        content = msg["content"]
-        full_prompt += f"{role.upper()}: {content}\n"
 
-    full_prompt += "\nAvailable Tools:\n"
+def build_system_message(tools: List[Dict], include_tools: bool = True) -> Dict:
+    """
+    Static prefix of every agent request. It only depends on the tool
+    list, so ollama can reuse its kv cache across steps.
+    Tools sent through the native "tools" field are rendered by the model
+    template instead, so they are not repeated here.
+    """
 
-    for tool in tools:
-        full_prompt += f"""
+    content = AGENT_SYSTEM_PROMPT
+
+    if include_tools:
+        tool_text = ""
+
+        for tool in tools:
+            if COMPACT_PROMPTS:
+                parameters = compact_json(tool['parameters'])
+            else:
+                parameters = json.dumps(tool['parameters'], indent=2)
+
+            tool_text += f"""
 Tool: {tool['name']}
 Description: {tool['description']}
-Parameters: {json.dumps(tool['parameters'], indent=2)}
+Parameters: {parameters}
 """
 
+        if COMPACT_PROMPTS:
+            tool_text = fit_to_budget(tool_text, SECTION_BUDGETS["tools"])
+
+        content += "\nAvailable Tools:\n" + tool_text
+
+    return {"role": "system", "content": content}
+
+
+def to_ollama_tools(tools: List[Dict]) -> List[Dict]:
+    return [
+        {
+            "type": "function",
+            "function": {
+                "name": tool["name"],
+                "description": tool["description"],
+                "parameters": tool["parameters"]
+            }
+        }
+        for tool in tools
+    ]
+
+
+def encode_tool_result(tool_result) -> str:
+    if COMPACT_PROMPTS:
+        return encode_section(tool_result, "tool_result")
+    return json.dumps(tool_result)
+
+
+def encode_observed_data(data) -> str:
+    if COMPACT_PROMPTS:
+        return encode_section(data, "observed_data")
+    return json.dumps(data)
+
+
+def build_agent_schema(tools: List[Dict], allow_tools: bool = True) -> Dict:
+    """
+    JSON schema of one agent reply: a tool call (arguments checked against
+    that tool's parameters), a list of tool calls, or a final answer.
+    """
+
+    final_answer = {
+        "type": "object",
+        "properties": {"final_answer": FINAL_ANSWER_SCHEMA},
+        "required": ["final_answer"]
+    }
+
+    if not allow_tools:
+        return final_answer
+
+    calls = [
+        {
+            "type": "object",
+            "properties": {
+                "name": {"type": "string", "enum": [tool["name"]]},
+                "arguments": tool["parameters"]
+            },
+            "required": ["name", "arguments"]
+        }
+        for tool in tools
+    ]
+
+    options = [
+        {
+            "type": "object",
+            "properties": {"tool_call": call},
+            "required": ["tool_call"]
+        }
+        for call in calls
+    ]
+
+    options.append({
+        "type": "object",
+        "properties": {
+            "tool_calls": {
+                "type": "array",
+                "items": {"anyOf": calls},
+                "minItems": 1
+            }
+        },
+        "required": ["tool_calls"]
+    })
+
+    options.append(final_answer)
+
+    return {"anyOf": options}
+
+
+def build_agent_payload(messages: List[Dict], tools: List[Dict], allow_tools: bool = True,
+                        route: str = "final_answer") -> Dict:
+    native = allow_tools and AGENT_DECODING == "native"
+
+    # /api/chat with an unchanged prefix: only new messages are evaluated
     payload = {
-        "model": MODEL_NAME,
-        "prompt": full_prompt,
-        "stream": False
+        "model": route_model(route),
+        "messages": [build_system_message(tools, include_tools=allow_tools and not native)] + messages,
+        "stream": False,
+        "options": AGENT_OPTIONS,
+        "keep_alive": LLM_KEEP_ALIVE
     }
 
-    response = requests.post(OLLAMA_URL, json=payload, timeout=300)
-    response.raise_for_status()
+    if native:
+        payload["tools"] = to_ollama_tools(tools)
+    else:
+        payload["format"] = build_agent_schema(tools, allow_tools)
+
+    return payload
 
-    result = response.json()
-    text = result.get("response", "").strip()
+
+def parse_agent_result(result: Dict) -> Dict:
+    tool_calls = response_tool_calls(result)
+    if len(tool_calls) == 1:
+        return {"tool_call": tool_calls[0]}
+    if tool_calls:
+        return {"tool_calls": tool_calls}
+
+    text = response_text(result).strip()
 
     return parse_agent_response(text)
 
+
+def call_agent_llm(messages: List[Dict], tools: List[Dict], allow_tools: bool = True,
+                   priority: int = PRIORITY_NORMAL, route: str = "final_answer") -> Dict:
+    """
+    Raw ollama chat result (message, durations, "metrics") of one agent step.
+    """
+
+    with span("llm.agent_call", route=route, allow_tools=allow_tools, messages=len(messages)):
+        payload = build_agent_payload(messages, tools, allow_tools, route)
+
+        try:
+            result = chat(payload, stream=LLM_STREAM, priority=priority)
+        except LLMRequestError as e:
+            if not model_missing(e, payload["model"]):
+                raise
+            payload = build_agent_payload(messages, tools, allow_tools, route)
+            result = chat(payload, stream=LLM_STREAM, priority=priority)
+
+    # same dict as in llm_client.LLM_METRICS
+    result["metrics"]["route"] = route
+
+    return result
+
+
+def run_llm(messages: List[Dict], tools: List[Dict], allow_tools: bool = True,
+            priority: int = PRIORITY_NORMAL, route: str = "final_answer") -> Dict:
+    return parse_agent_result(call_agent_llm(messages, tools, allow_tools, priority, route))
+
+
 def parse_agent_response(text: str) -> Dict:
     import json
 
@@ -1,6 +1,12 @@
 # main.py
+import sys
 from agent import run_agent
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        # python main.py <dir | glob | manifest> ... [batch options]
+        from batch import main
+        sys.exit(main())
+
     result = run_agent("pcbclear2.jpg")
     print(result)
@@ -2,48 +2,151 @@
 
 import cv2
 import re
-from paddleocr import PaddleOCR
+import numpy as np
+from ocr_backends import get_engine, read_with_backend
+from tracing import traced, current_span
+
+DEFAULT_OCR_BACKEND = "paddle"
+
+# speed profiles
+# "accurate" matches the original settings (paddle defaults, angle
+# classifier, 2x cubic upscale, histogram equalization).
+# run benchmark_ocr_profiles.py to measure latency / recall per profile.
+OCR_PROFILES = {
+    "fast": {
+        "det_limit_side_len": 640,
+        "use_angle_cls": False,
+        "rec_batch_num": 16,
+        "cpu_threads": 4,
+        "enable_mkldnn": True,
+        "upscale": 1.0,
+        "equalize": False
+    },
+    "balanced": {
+        "det_limit_side_len": 960,
+        "use_angle_cls": False,
+        "rec_batch_num": 8,
+        "cpu_threads": 8,
+        "enable_mkldnn": True,
+        "upscale": 1.5,
+        "equalize": True
+    },
+    "accurate": {
+        "det_limit_side_len": 960,
+        "use_angle_cls": True,
+        "rec_batch_num": 6,
+        "cpu_threads": 10,
+        "enable_mkldnn": False,
+        "upscale": 2.0,
+        "equalize": True
+    }
+}
+
+DEFAULT_OCR_PROFILE = "accurate"
+
+def get_ocr_profile(name=None):
+    name = name or DEFAULT_OCR_PROFILE
+
+    if name not in OCR_PROFILES:
+        raise ValueError(f"Unknown OCR profile: {name}")
+
+    return OCR_PROFILES[name]
+
+
+def get_ocr_engine(profile_name=None, backend=None):
+    profile_name = profile_name or DEFAULT_OCR_PROFILE
+    profile = get_ocr_profile(profile_name)
+
+    return get_engine(backend or DEFAULT_OCR_BACKEND, profile_name, profile)
+
+
+def warm_ocr(profile_name=None, backend=None):
+    """
+    Loads the engine in the calling thread and runs one small blank
+    image, so the first real request does not pay for model load and
+    the first (slow) inference.
+    """
+
+    get_ocr_engine(profile_name, backend)
+    run_ocr(np.full((64, 256, 3), 255, dtype=np.uint8), profile_name, backend)
 
-# initialize once
-ocr = PaddleOCR(use_angle_cls=True, lang='en')
 
+@traced("ocr.preprocess_for_ocr")
+def preprocess_for_ocr(img, profile_name=None):
+    profile = get_ocr_profile(profile_name)
+
+    scale = profile["upscale"]
+    if scale != 1.0:
+        img = cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_CUBIC)
 
-def preprocess_for_ocr(img):
-    img = cv2.resize(img, None, fx=2, fy=2, interpolation=cv2.INTER_CUBIC)
     gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-    gray = cv2.equalizeHist(gray)
+
+    if profile["equalize"]:
+        gray = cv2.equalizeHist(gray)
+
     return gray
 
 
-def read_full_image_text(image):
+def run_ocr(image, profile_name=None, backend=None):
     """
-    OCR on entire image.
+    Returns backend results: list of {text, polygon, confidence}, with
+    polygons in the coordinates of the given image.
     """
 
-    processed = preprocess_for_ocr(image)
-    result = ocr.ocr(processed, cls=True)
+    profile_name = profile_name or DEFAULT_OCR_PROFILE
+    profile = get_ocr_profile(profile_name)
 
-    texts = []
+    processed = preprocess_for_ocr(image, profile_name)
+    results = read_with_backend(backend or DEFAULT_OCR_BACKEND, processed, profile_name, profile)
 
-    if result is None:
-        return texts
+    # undo the preprocessing upscale
+    scale = profile["upscale"]
+    if scale != 1.0:
+        for res in results:
+            res["polygon"] = [[x / scale, y / scale] for x, y in res["polygon"]]
 
-    for line in result:
-        for word_info in line:
-            text = word_info[1][0]
-            conf = word_info[1][1]
+    return results
 
-            text = text.strip()
 
-            if conf < 0.4:
-                continue
+def filter_results(results):
+    kept = []
 
-            if len(text) < 2:
-                continue
+    for res in results:
+        text = res["text"].strip()
 
-            texts.append(text)
+        if res["confidence"] < 0.4:
+            continue
 
-    return texts
+        if len(text) < 2:
+            continue
+
+        kept.append(dict(res, text=text))
+
+    return kept
+
+
+def results_to_texts(results):
+    return [res["text"] for res in filter_results(results)]
+
+
+@traced("ocr.read_full_image_results")
+def read_full_image_results(image, profile_name=None, backend=None):
+    """
+    OCR on entire image, filtered results with their polygons.
+    """
+
+    results = filter_results(run_ocr(image, profile_name, backend))
+    current_span().set("text_count", len(results))
+
+    return results
+
+
+def read_full_image_text(image, profile_name=None, backend=None):
+    """
+    OCR on entire image.
+    """
+
+    return [res["text"] for res in read_full_image_results(image, profile_name, backend)]
 
 def filter_ic_candidates(texts):
     ic_candidates = []
@@ -75,19 +178,19 @@ def filter_ic_candidates(texts):
     return ic_candidates
 
 
-def read_ic_text_from_image(image):
+def read_ic_text_from_image(image, profile_name=None, backend=None):
     """
     Full pipeline:
     OCR → filter → IC candidates
     """
 
-    texts = read_full_image_text(image)
+    texts = read_full_image_text(image, profile_name, backend)
     ic_names = filter_ic_candidates(texts)
 
     return ic_names
 
 
-def read_region_text(image, bbox):
+def read_region_text(image, bbox, profile_name=None, backend=None):
     """
     OCR on a specific region (for later refinement).
     bbox: dict with x, y, w, h
@@ -103,30 +206,7 @@ def read_region_text(image, bbox):
     if crop.size == 0:
         return []
 
-    processed = preprocess_for_ocr(crop)
-    result = ocr.ocr(processed, cls=True)
-
-    texts = []
-
-    if result is None:
-        return texts
-
-    for line in result:
-        for word_info in line:
-            text = word_info[1][0]
-            conf = word_info[1][1]
-
-            text = text.strip()
-
-            if conf < 0.4:
-                continue
-
-            if len(text) < 2:
-                continue
-
-            texts.append(text)
-
-    return texts
+    return results_to_texts(run_ocr(crop, profile_name, backend))
 
 def extract_reference_counts(texts):
     counts = {"R": 0, "C": 0, "U": 0, "J": 0}
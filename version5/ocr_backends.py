@@ -0,0 +1,179 @@
+# ocr_backends.py
+
+# Every backend turns an image into a list of results with the same shape:
+#   {"text": str, "polygon": [[x, y], ...], "confidence": float (0-1)}
+# so ocr.py does not change when the engine does.
+
+import threading
+from tracing import span
+
+
+def make_result(text, polygon, confidence):
+    return {
+        "text": str(text),
+        "polygon": [[float(x), float(y)] for x, y in polygon],
+        "confidence": float(confidence)
+    }
+
+
+# paddleocr
+def _load_paddle(profile):
+    from paddleocr import PaddleOCR
+
+    return PaddleOCR(
+        lang='en',
+        use_angle_cls=profile["use_angle_cls"],
+        det_limit_side_len=profile["det_limit_side_len"],
+        rec_batch_num=profile["rec_batch_num"],
+        cpu_threads=profile["cpu_threads"],
+        enable_mkldnn=profile["enable_mkldnn"],
+        show_log=False
+    )
+
+
+def _read_paddle(engine, image, profile):
+    result = engine.ocr(image, cls=profile["use_angle_cls"])
+
+    results = []
+
+    if result is None:
+        return results
+
+    for line in result:
+        if line is None:
+            continue
+
+        for box, (text, conf) in line:
+            results.append(make_result(text, box, conf))
+
+    return results
+
+
+# easyocr (used up to version3)
+def _load_easyocr(profile):
+    import easyocr
+
+    return easyocr.Reader(['en'], gpu=False, verbose=False)
+
+
+def _read_easyocr(engine, image, profile):
+    detections = engine.readtext(
+        image,
+        batch_size=profile["rec_batch_num"],
+        canvas_size=profile["det_limit_side_len"]
+    )
+
+    return [make_result(text, box, conf) for box, text, conf in detections]
+
+
+# tesseract (needs the tesseract binary on PATH)
+def _load_tesseract(profile):
+    import pytesseract
+
+    # raises if the binary is missing
+    pytesseract.get_tesseract_version()
+    return pytesseract
+
+
+def _read_tesseract(engine, image, profile):
+    data = engine.image_to_data(image, output_type=engine.Output.DICT)
+
+    results = []
+
+    for i, text in enumerate(data["text"]):
+        text = text.strip()
+        conf = float(data["conf"][i])
+
+        if not text or conf < 0:
+            continue
+
+        x, y = data["left"][i], data["top"][i]
+        w, h = data["width"][i], data["height"][i]
+        polygon = [[x, y], [x + w, y], [x + w, y + h], [x, y + h]]
+
+        results.append(make_result(text, polygon, conf / 100.0))
+
+    return results
+
+
+# backend registry
+OCR_BACKENDS = {
+    "paddle": {
+        "description": "PaddleOCR detector + recognizer (default since version5).",
+        "load": _load_paddle,
+        "read": _read_paddle
+    },
+
+    "easyocr": {
+        "description": "EasyOCR reader (used in version3).",
+        "load": _load_easyocr,
+        "read": _read_easyocr
+    },
+
+    "tesseract": {
+        "description": "Tesseract via pytesseract, word level boxes.",
+        "load": _load_tesseract,
+        "read": _read_tesseract
+    }
+}
+
+# one engine per (backend, profile), created on first use
+_ENGINES = {}
+
+# several ocr workers: each worker thread loads its own engines, since
+# paddle predictors are not thread safe (costs one model copy per thread)
+ENGINE_PER_THREAD = False
+
+_local = threading.local()
+
+
+def get_engine(backend, profile_name, profile):
+    if backend not in OCR_BACKENDS:
+        raise ValueError(f"Unknown OCR backend: {backend}")
+
+    key = (backend, profile_name)
+
+    if ENGINE_PER_THREAD:
+        if not hasattr(_local, "engines"):
+            _local.engines = {}
+        engines = _local.engines
+    else:
+        engines = _ENGINES
+
+    if key not in engines:
+        engines[key] = OCR_BACKENDS[backend]["load"](profile)
+
+    return engines[key]
+
+
+def read_with_backend(backend, image, profile_name, profile):
+    # first use per (backend, profile) includes model loading
+    with span("ocr.get_engine", backend=backend, profile=profile_name):
+        engine = get_engine(backend, profile_name, profile)
+
+    with span("ocr.read", backend=backend, profile=profile_name) as s:
+        results = OCR_BACKENDS[backend]["read"](engine, image, profile)
+        s.set("result_count", len(results))
+
+    return results
+
+
+def available_backends():
+    available = []
+
+    for name, backend in OCR_BACKENDS.items():
+        try:
+            # only checks imports / binaries, engines load lazily
+            if name == "paddle":
+                import paddleocr  # noqa: F401
+            elif name == "easyocr":
+                import easyocr  # noqa: F401
+            elif name == "tesseract":
+                import pytesseract
+                pytesseract.get_tesseract_version()
+        except Exception:
+            continue
+
+        available.append(name)
+
+    return available
@@ -0,0 +1,391 @@
+# ollama_standin.py
+
+# Local stand-in for Ollama's /api/generate and /api/chat, for
+# benchmarking the agent without a model.
+#
+#   python ollama_standin.py --mode script --port 11500
+#   OLLAMA_HOST=http://127.0.0.1:11500 python main.py
+#
+# modes:
+#   replay   - answer from recorded responses keyed by prompt hash
+#   record   - forward to a real ollama and append what it returns
+#   script   - canned agent trajectory (tool calls, then final answer)
+#   simulate - script replies with token-rate latency (streams too)
+
+import re
+import json
+import time
+import argparse
+import threading
+import urllib.request
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import llm_cache
+from prompt_encoder import estimate_tokens
+
+DEFAULT_SCRIPT = {
+    "steps": [
+        {"tool_call": {"name": "get_component_stats", "arguments": {"image_path": "{image_path}"}}},
+        {"tool_call": {"name": "get_ic_info", "arguments": {"image_path": "{image_path}"}}}
+    ],
+    "final": {
+        "final_answer": {
+            "complexity": "medium",
+            "pcb_type": "mixed",
+            "estimated_bom_inr": "300-900 INR",
+            "reasoning": "Scripted stand-in answer."
+        }
+    }
+}
+
+# tokens per second, 0 = no delay
+SIMULATE_PROMPT_RATE = 400
+SIMULATE_TOKEN_RATE = 25
+
+_PATH_RE = re.compile(r"image at path:[ \t]*(.+)")
+_TOKEN_RE = re.compile(r"\s*\S{1,4}|\s+")
+_CALL_NAME_RE = re.compile(r'"name"\s*:\s*"(\w+)"')
+
+# state summary entries that show a tool already ran, for turns the
+# agent's bounded memory has dropped (see agent.compact_state)
+STATE_EVIDENCE = {
+    "run_cv": "component_count",
+    "get_component_stats": "component_count",
+    "get_ic_info": "ic_count"
+}
+
+
+def load_recordings(path):
+    recordings = {}
+
+    try:
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    recordings[entry["key"]] = entry["response"]
+    except FileNotFoundError:
+        pass
+
+    return recordings
+
+
+def request_key(path, payload):
+    # same hashing as the client side prompt cache
+    return llm_cache.make_key(dict(payload, endpoint=path))
+
+
+def prompt_text(payload):
+    if "messages" in payload:
+        return "\n".join(m.get("content", "") for m in payload["messages"])
+    return payload.get("prompt", "")
+
+
+def wants_tool_call(payload):
+    fmt = payload.get("format")
+    if "tools" in payload:
+        return True
+    return isinstance(fmt, dict) and "anyOf" in fmt
+
+
+def step_tools(step):
+    if "tool_calls" in step:
+        return [call["name"] for call in step["tool_calls"]]
+    return [step["tool_call"]["name"]]
+
+
+def script_step(script, messages):
+    """
+    Index of the first scripted step whose tools the conversation shows no
+    sign of: neither an assistant call nor a filled state entry. Counting
+    assistant messages would replay steps once the agent drops old turns.
+    """
+
+    called = set()
+    state_text = ""
+
+    for m in messages:
+        if m.get("role") == "assistant":
+            called.update(_CALL_NAME_RE.findall(m.get("content") or ""))
+            # native tool calling keeps the calls outside the content
+            called.update(c.get("function", {}).get("name") for c in m.get("tool_calls") or [])
+        elif m.get("role") == "system" and m.get("content", "").startswith("Current state"):
+            state_text = m["content"]
+
+    def done(name):
+        key = STATE_EVIDENCE.get(name)
+        return name in called or bool(key and re.search(rf'"{key}"\s*:\s*(?!null)', state_text))
+
+    for i, step in enumerate(script["steps"]):
+        if not all(done(name) for name in step_tools(step)):
+            return i
+
+    return len(script["steps"])
+
+
+def fill_placeholders(obj, values):
+    # inside the parsed reply, so a path with quotes or backslashes is
+    # escaped by json.dumps instead of breaking the json
+    if isinstance(obj, str):
+        for name, value in values.items():
+            obj = obj.replace("{" + name + "}", value)
+        return obj
+    if isinstance(obj, dict):
+        return {k: fill_placeholders(v, values) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [fill_placeholders(v, values) for v in obj]
+    return obj
+
+
+def script_reply(script, payload):
+    """
+    Scripted step (see script_step), then the final answer. Requests that
+    cannot make a tool call (reflection, run_local_llm) get the final
+    answer.
+    """
+
+    text = prompt_text(payload)
+    match = _PATH_RE.search(text)
+    image_path = match.group(1).strip() if match else ""
+
+    step = script_step(script, payload.get("messages") or [])
+
+    if wants_tool_call(payload) and step < len(script["steps"]):
+        reply = script["steps"][step]
+    else:
+        reply = script["final"]
+
+    if "messages" not in payload:
+        # /api/generate callers want the bare answer object
+        reply = reply.get("final_answer", reply)
+
+    return json.dumps(fill_placeholders(reply, {"image_path": image_path}))
+
+
+def split_tokens(text):
+    return _TOKEN_RE.findall(text)
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    # set by make_server
+    config = None
+
+    def log_message(self, format, *args):
+        if self.config["verbose"]:
+            super().log_message(format, *args)
+
+    def do_GET(self):
+        if self.path in ("/", "/api/version"):
+            self._send_json({"version": "standin", "mode": self.config["mode"]})
+        elif self.path == "/api/tags":
+            self._send_json({"models": []})
+        else:
+            self._send_json({"error": "not found"}, status=404)
+
+    def do_POST(self):
+        if self.path not in ("/api/generate", "/api/chat"):
+            self._send_json({"error": "not found"}, status=404)
+            return
+
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+
+        try:
+            text, recorded = self._reply_text(payload)
+        except KeyError:
+            # not 404: the client reads that as a missing model and reroutes
+            self._send_json({"error": "standin replay miss: no recording for this prompt"}, status=422)
+            return
+
+        if payload.get("stream", True):
+            self._stream(payload, text)
+        else:
+            self._delay(payload, text)
+            self._send_json(recorded or self._result(payload, text, done=True))
+
+    def _reply_text(self, payload):
+        mode = self.config["mode"]
+        key = request_key(self.path, payload)
+
+        if mode == "replay":
+            recorded = self.config["recordings"][key]
+            return _result_text(recorded), recorded
+
+        if mode == "record":
+            recorded = self._forward(payload)
+            with self.config["lock"]:
+                self.config["recordings"][key] = recorded
+                with open(self.config["recordings_path"], "a") as f:
+                    f.write(json.dumps({"key": key, "endpoint": self.path, "response": recorded}) + "\n")
+            return _result_text(recorded), recorded
+
+        return script_reply(self.config["script"], payload), None
+
+    def _forward(self, payload):
+        body = json.dumps(dict(payload, stream=False)).encode("utf-8")
+        req = urllib.request.Request(
+            self.config["upstream"] + self.path,
+            data=body,
+            headers={"Content-Type": "application/json"}
+        )
+
+        with urllib.request.urlopen(req, timeout=600) as res:
+            return json.loads(res.read())
+
+    def _delay(self, payload, text):
+        # non-streaming: the whole generation time up front
+        time.sleep(self._prompt_seconds(payload))
+        rate = self.config["token_rate"]
+        if rate:
+            time.sleep(len(split_tokens(text)) / rate)
+
+    def _prompt_seconds(self, payload):
+        rate = self.config["prompt_rate"]
+        return estimate_tokens(prompt_text(payload)) / rate if rate else 0.0
+
+    def _result(self, payload, text, done):
+        prompt_tokens = estimate_tokens(prompt_text(payload))
+        eval_tokens = len(split_tokens(text))
+        prompt_rate = self.config["prompt_rate"]
+        token_rate = self.config["token_rate"]
+
+        result = {
+            "model": payload.get("model"),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "done": done
+        }
+
+        if self.path == "/api/chat":
+            result["message"] = {"role": "assistant", "content": text}
+        else:
+            result["response"] = text
+
+        if done:
+            prompt_ns = int(prompt_tokens / prompt_rate * 1e9) if prompt_rate else 0
+            eval_ns = int(eval_tokens / token_rate * 1e9) if token_rate else 0
+
+            result.update({
+                "done_reason": "stop",
+                "prompt_eval_count": prompt_tokens,
+                "prompt_eval_duration": prompt_ns,
+                "eval_count": eval_tokens,
+                "eval_duration": eval_ns,
+                "total_duration": prompt_ns + eval_ns
+            })
+
+        return result
+
+    def _send_json(self, obj, status=200):
+        body = json.dumps(obj).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _write_chunk(self, obj):
+        data = (json.dumps(obj) + "\n").encode("utf-8")
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def _stream(self, payload, text):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        rate = self.config["token_rate"]
+
+        try:
+            time.sleep(self._prompt_seconds(payload))
+
+            for token in split_tokens(text):
+                self._write_chunk(self._result(payload, token, done=False))
+                if rate:
+                    time.sleep(1 / rate)
+
+            self._write_chunk(self._result(payload, "", done=True))
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+
+        except (BrokenPipeError, ConnectionResetError):
+            # client stopped early, like ollama we just stop generating
+            self.close_connection = True
+
+
+def _result_text(result):
+    if "message" in result:
+        return (result["message"] or {}).get("content", "")
+    return result.get("response", "")
+
+
+def make_server(mode="script", host="127.0.0.1", port=11500, script=None,
+                recordings_path="ollama_recordings.jsonl",
+                upstream="http://localhost:11434",
+                prompt_rate=None, token_rate=None, verbose=False):
+
+    if mode == "simulate":
+        prompt_rate = SIMULATE_PROMPT_RATE if prompt_rate is None else prompt_rate
+        token_rate = SIMULATE_TOKEN_RATE if token_rate is None else token_rate
+
+    config = {
+        "mode": mode,
+        "script": script or DEFAULT_SCRIPT,
+        "recordings": load_recordings(recordings_path),
+        "recordings_path": recordings_path,
+        "upstream": upstream.rstrip("/"),
+        "prompt_rate": prompt_rate or 0,
+        "token_rate": token_rate or 0,
+        "verbose": verbose,
+        "lock": threading.Lock()
+    }
+
+    handler = type("ConfiguredStandinHandler", (StandinHandler,), {"config": config})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+
+    return server
+
+
+def start_standin(**kwargs):
+    """
+    Run the stand-in on a background thread. Returns (server, base_url).
+    """
+
+    server = make_server(**kwargs)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    host, port = server.server_address[:2]
+    return server, f"http://{host}:{port}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ollama stand-in for benchmarking.")
+    parser.add_argument("--mode", choices=["replay", "record", "script", "simulate"], default="script")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11500)
+    parser.add_argument("--script", help="json file with 'steps' and 'final' replies")
+    parser.add_argument("--recordings", default="ollama_recordings.jsonl")
+    parser.add_argument("--upstream", default="http://localhost:11434")
+    parser.add_argument("--prompt-rate", type=float, help="prompt tokens/s")
+    parser.add_argument("--token-rate", type=float, help="generated tokens/s")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    script = None
+    if args.script:
+        with open(args.script) as f:
+            script = json.load(f)
+
+    srv = make_server(
+        mode=args.mode, host=args.host, port=args.port, script=script,
+        recordings_path=args.recordings, upstream=args.upstream,
+        prompt_rate=args.prompt_rate, token_rate=args.token_rate,
+        verbose=args.verbose
+    )
+
+    print(f"ollama stand-in ({args.mode}) on http://{args.host}:{args.port}")
+    srv.serve_forever()
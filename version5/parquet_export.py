@@ -0,0 +1,401 @@
+# parquet_export.py
+
+# Columnar export of batch results for fleet analytics. Each table is a
+# Parquet dataset under root/<table>/, hive partitioned by run date:
+#   boards/     one row per image: cv stats, ocr counts, llm verdict
+#   components/ one row per detected component, with its ocr text
+#   ocr_texts/  one row per ocr text box, with the component it sits on
+# Writes only ever add files (append); compact() merges the small files
+# of each partition into one.
+#
+#   python parquet_export.py boards batch_results.jsonl dataset/
+#   python parquet_export.py compact dataset/
+
+import os
+import sys
+import glob
+import json
+import uuid
+import hashlib
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+from ocr import extract_reference_counts, filter_ic_candidates
+from answer_validator import parse_range
+
+TABLES = ["boards", "components", "ocr_texts"]
+PARTITION_COLUMN = "run_date"
+
+# component rows buffered before files are written
+FLUSH_ROWS = 100000
+
+COMPRESSION = "zstd"
+
+BOARD_SCHEMA = pa.schema([
+    ("board_id", pa.string()),
+    ("image_path", pa.string()),
+    ("run_date", pa.string()),
+    ("finished_at", pa.string()),
+    ("status", pa.string()),
+    ("source", pa.string()),
+    ("elapsed_s", pa.float64()),
+    ("steps_used", pa.int32()),
+    ("object_type", pa.string()),
+    ("component_count", pa.int32()),
+    ("coverage", pa.float64()),
+    ("mean_area", pa.float64()),
+    ("n_ic", pa.int32()),
+    ("n_resistor", pa.int32()),
+    ("n_capacitor", pa.int32()),
+    ("n_unknown", pa.int32()),
+    ("ref_r", pa.int32()),
+    ("ref_c", pa.int32()),
+    ("ref_u", pa.int32()),
+    ("ocr_text_count", pa.int32()),
+    ("ic_names", pa.list_(pa.string())),
+    ("complexity", pa.string()),
+    ("pcb_type", pa.string()),
+    ("bom_inr", pa.string()),
+    ("bom_low_inr", pa.float64()),
+    ("bom_high_inr", pa.float64()),
+    ("reasoning", pa.string()),
+    ("llm_calls", pa.int32()),
+    ("llm_wall_ms", pa.float64()),
+    ("prompt_tokens", pa.int64()),
+    ("eval_tokens", pa.int64())
+])
+
+# (column, arrow type, numpy dtype, value from a component dict)
+COMPONENT_COLUMNS = [
+    ("component_id", pa.int32(), np.int32, lambda c: c["id"]),
+    ("x", pa.int32(), np.int32, lambda c: c["bbox"]["x"]),
+    ("y", pa.int32(), np.int32, lambda c: c["bbox"]["y"]),
+    ("w", pa.int32(), np.int32, lambda c: c["bbox"]["w"]),
+    ("h", pa.int32(), np.int32, lambda c: c["bbox"]["h"]),
+    ("area", pa.int64(), np.int64, lambda c: c["area"]),
+    ("normalized_area", pa.float64(), np.float64, lambda c: c["normalized_area"]),
+    ("aspect_ratio", pa.float64(), np.float64, lambda c: c["aspect_ratio"]),
+    ("centroid_x", pa.float64(), np.float64, lambda c: c["centroid"]["x"]),
+    ("centroid_y", pa.float64(), np.float64, lambda c: c["centroid"]["y"]),
+    ("mean_intensity", pa.float64(), np.float64, lambda c: c["mean_intensity"]),
+    ("intensity_std", pa.float64(), np.float64, lambda c: c["intensity_std"]),
+    ("color_std", pa.float64(), np.float64, lambda c: c["color_std"]),
+    ("edge_density", pa.float64(), np.float64, lambda c: c["edge_density"]),
+    ("fill_ratio", pa.float64(), np.float64, lambda c: c["fill_ratio"]),
+    ("confidence", pa.float64(), np.float64,
+     lambda c: np.nan if c.get("confidence") is None else c["confidence"])
+]
+
+COMPONENT_SCHEMA = pa.schema(
+    [("board_id", pa.string()), ("run_date", pa.string())]
+    + [(name, arrow_type) for name, arrow_type, _, _ in COMPONENT_COLUMNS]
+    + [("size", pa.string()), ("type", pa.string()),
+       ("ocr_text", pa.string()), ("ocr_confidence", pa.float64())]
+)
+
+OCR_SCHEMA = pa.schema([
+    ("board_id", pa.string()),
+    ("run_date", pa.string()),
+    ("text", pa.string()),
+    ("confidence", pa.float64()),
+    ("x0", pa.float64()),
+    ("y0", pa.float64()),
+    ("x1", pa.float64()),
+    ("y1", pa.float64()),
+    ("component_id", pa.int32())
+])
+
+
+def board_id(image_path):
+    return hashlib.sha1(os.path.abspath(image_path).encode()).hexdigest()[:16]
+
+
+def table_from_numpy(columns, schema):
+    """
+    {name: 1-d numpy array or list} -> pa.Table. Contiguous numeric
+    arrays are wrapped, not copied.
+    """
+
+    arrays = []
+
+    for field in schema:
+        values = columns[field.name]
+
+        if isinstance(values, np.ndarray):
+            # strided slices (box columns) need one copy to be contiguous;
+            # nan in float columns stays nan, null is for missing rows
+            values = np.ascontiguousarray(values)
+
+        arrays.append(pa.array(values, type=field.type))
+
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+def ocr_boxes(ocr_results, crop_box):
+    """
+    (n, 4) x0, y0, x1, y1 of each text polygon, moved into the cv crop.
+    """
+
+    boxes = np.full((len(ocr_results), 4), np.nan)
+
+    for i, res in enumerate(ocr_results):
+        points = np.asarray(res["polygon"], dtype=np.float64).reshape(-1, 2)
+        if len(points):
+            boxes[i, :2] = points.min(axis=0)
+            boxes[i, 2:] = points.max(axis=0)
+
+    if crop_box:
+        boxes -= [crop_box["x"], crop_box["y"], crop_box["x"], crop_box["y"]]
+
+    return boxes
+
+
+def associate_ocr(components, boxes):
+    """
+    Index of the component each text box centre falls in (the smallest
+    if several), -1 when none.
+    """
+
+    if not components or not len(boxes):
+        return np.full(len(boxes), -1, dtype=np.int32)
+
+    comp = np.array(
+        [[c["bbox"]["x"], c["bbox"]["y"], c["bbox"]["x"] + c["bbox"]["w"], c["bbox"]["y"] + c["bbox"]["h"]]
+         for c in components],
+        dtype=np.float64
+    )
+    areas = (comp[:, 2] - comp[:, 0]) * (comp[:, 3] - comp[:, 1])
+
+    cx = ((boxes[:, 0] + boxes[:, 2]) / 2)[:, None]
+    cy = ((boxes[:, 1] + boxes[:, 3]) / 2)[:, None]
+
+    inside = (cx >= comp[:, 0]) & (cx <= comp[:, 2]) & (cy >= comp[:, 1]) & (cy <= comp[:, 3])
+
+    best = np.where(inside, areas, np.inf).argmin(axis=1).astype(np.int32)
+    best[~inside.any(axis=1)] = -1
+
+    return best
+
+
+def board_row(record, run_date, cv_result, ocr_results):
+    result = record.get("result") or {}
+    verdict = result.get("result") if result.get("status") == "success" else None
+    verdict = verdict if isinstance(verdict, dict) else {}
+
+    components = (cv_result or {}).get("components") or []
+    type_counts = {}
+    for c in components:
+        type_counts[c.get("type")] = type_counts.get(c.get("type"), 0) + 1
+
+    texts = [res["text"] for res in ocr_results or []]
+    ref_counts = extract_reference_counts(texts) if ocr_results is not None else {}
+
+    bom = parse_range(verdict.get("estimated_bom_inr")) if verdict else None
+    llm_metrics = [m for m in result.get("llm_metrics") or [] if m]
+
+    return {
+        "board_id": board_id(record["image_path"]),
+        "image_path": record["image_path"],
+        "run_date": run_date,
+        "finished_at": record.get("finished_at"),
+        "status": record.get("status"),
+        "source": result.get("source"),
+        "elapsed_s": record.get("elapsed_s"),
+        "steps_used": result.get("steps_used"),
+        "object_type": (cv_result or {}).get("object_type"),
+        "component_count": len(components) if cv_result else None,
+        "coverage": sum(c["normalized_area"] for c in components) if cv_result else None,
+        "mean_area": sum(c["area"] for c in components) / len(components) if components else None,
+        "n_ic": type_counts.get("IC", 0) if cv_result else None,
+        "n_resistor": type_counts.get("resistor", 0) if cv_result else None,
+        "n_capacitor": type_counts.get("capacitor", 0) if cv_result else None,
+        "n_unknown": type_counts.get("unknown", 0) if cv_result else None,
+        "ref_r": ref_counts.get("R", 0) if ocr_results is not None else None,
+        "ref_c": ref_counts.get("C", 0) if ocr_results is not None else None,
+        "ref_u": ref_counts.get("U", 0) if ocr_results is not None else None,
+        "ocr_text_count": len(texts) if ocr_results is not None else None,
+        "ic_names": filter_ic_candidates(texts) if ocr_results is not None else None,
+        "complexity": verdict.get("complexity"),
+        "pcb_type": verdict.get("pcb_type"),
+        "bom_inr": verdict.get("estimated_bom_inr"),
+        "bom_low_inr": bom[0] if bom else None,
+        "bom_high_inr": bom[1] if bom else None,
+        "reasoning": verdict.get("reasoning"),
+        "llm_calls": len(llm_metrics),
+        "llm_wall_ms": sum(m.get("wall_ms", 0.0) for m in llm_metrics),
+        "prompt_tokens": sum(m.get("prompt_eval_count") or 0 for m in llm_metrics),
+        "eval_tokens": sum(m.get("eval_count") or 0 for m in llm_metrics)
+    }
+
+
+def component_tables(board, run_date, cv_result, ocr_results):
+    components = (cv_result or {}).get("components") or []
+    ocr_results = ocr_results or []
+
+    boxes = ocr_boxes(ocr_results, (cv_result or {}).get("crop_box"))
+    owner = associate_ocr(components, boxes)
+
+    # texts per component, in reading order of the ocr output
+    comp_texts = [[] for _ in components]
+    comp_conf = np.full(len(components), np.nan)
+    for i, res in enumerate(ocr_results):
+        j = owner[i]
+        if j >= 0:
+            comp_texts[j].append(res["text"])
+            comp_conf[j] = np.fmax(comp_conf[j], res["confidence"])
+
+    n = len(components)
+    columns = {"board_id": [board] * n, "run_date": [run_date] * n}
+
+    for name, _, dtype, value in COMPONENT_COLUMNS:
+        columns[name] = np.fromiter((value(c) for c in components), dtype=dtype, count=n)
+
+    columns["size"] = [c.get("size") for c in components]
+    columns["type"] = [c.get("type") for c in components]
+    columns["ocr_text"] = [" ".join(t) if t else None for t in comp_texts]
+    columns["ocr_confidence"] = comp_conf
+
+    m = len(ocr_results)
+    ocr_columns = {
+        "board_id": [board] * m,
+        "run_date": [run_date] * m,
+        "text": [res["text"] for res in ocr_results],
+        "confidence": np.fromiter((res["confidence"] for res in ocr_results), dtype=np.float64, count=m),
+        "x0": boxes[:, 0],
+        "y0": boxes[:, 1],
+        "x1": boxes[:, 2],
+        "y1": boxes[:, 3],
+        # the component's own id, not its list position
+        "component_id": np.array(
+            [components[j]["id"] if j >= 0 else -1 for j in owner], dtype=np.int32
+        )
+    }
+
+    return (
+        table_from_numpy(columns, COMPONENT_SCHEMA),
+        table_from_numpy(ocr_columns, OCR_SCHEMA)
+    )
+
+
+def write_table(root, name, table, compression=COMPRESSION):
+    if table.num_rows == 0:
+        return
+
+    # unique names: concurrent or repeated writers only ever add files
+    pq.write_to_dataset(
+        table,
+        root_path=os.path.join(root, name),
+        partition_cols=[PARTITION_COLUMN],
+        basename_template=f"part-{uuid.uuid4().hex}-{{i}}.parquet",
+        compression=compression
+    )
+
+
+class ParquetExporter:
+    """
+    exporter.add(batch_record, cv_result, ocr_results) per image, then
+    close(). Rows are buffered and written as new files every
+    flush_rows component rows.
+    """
+
+    def __init__(self, root, flush_rows=FLUSH_ROWS, compression=COMPRESSION):
+        self.root = root
+        self.flush_rows = flush_rows
+        self.compression = compression
+
+        self._boards = []
+        self._components = []
+        self._ocr = []
+        self._buffered = 0
+
+    def add(self, record, cv_result=None, ocr_results=None):
+        run_date = (record.get("finished_at") or "")[:10] or "unknown"
+        board = board_id(record["image_path"])
+
+        self._boards.append(board_row(record, run_date, cv_result, ocr_results))
+
+        components, ocr = component_tables(board, run_date, cv_result, ocr_results)
+        self._components.append(components)
+        self._ocr.append(ocr)
+        self._buffered += components.num_rows
+
+        if self._buffered >= self.flush_rows:
+            self.flush()
+
+    def flush(self):
+        if not self._boards:
+            return
+
+        # concat_tables only chains the chunks, nothing is copied
+        write_table(self.root, "boards", pa.Table.from_pylist(self._boards, schema=BOARD_SCHEMA),
+                    self.compression)
+        write_table(self.root, "components", pa.concat_tables(self._components), self.compression)
+        write_table(self.root, "ocr_texts", pa.concat_tables(self._ocr), self.compression)
+
+        self._boards = []
+        self._components = []
+        self._ocr = []
+        self._buffered = 0
+
+    def close(self):
+        self.flush()
+
+
+def compact(root, tables=TABLES, compression=COMPRESSION):
+    """
+    Merges the files of every partition into one. The merged file is
+    in place before the old ones are removed, so readers never miss rows
+    (at worst they see them twice for a moment).
+    """
+
+    merged = 0
+
+    for name in tables:
+        for partition in sorted(glob.glob(os.path.join(root, name, f"{PARTITION_COLUMN}=*"))):
+            files = sorted(glob.glob(os.path.join(partition, "*.parquet")))
+            if len(files) < 2:
+                continue
+
+            table = pa.concat_tables([pq.read_table(f) for f in files], promote_options="default")
+
+            # hidden while written: dataset readers skip dot files
+            tmp_path = os.path.join(partition, f".compact-{uuid.uuid4().hex}.parquet")
+            pq.write_table(table, tmp_path, compression=compression)
+            os.replace(tmp_path, os.path.join(partition, f"compact-{uuid.uuid4().hex}.parquet"))
+
+            for f in files:
+                os.remove(f)
+
+            merged += len(files)
+
+    return merged
+
+
+def export_batch_results(results_path, root):
+    """
+    Board rows from a batch JSONL file. The file has no cv / ocr
+    detail, so only the verdict columns are filled; batch.py --parquet
+    exports everything while it runs.
+    """
+
+    exporter = ParquetExporter(root)
+
+    with open(results_path) as f:
+        for line in f:
+            try:
+                exporter.add(json.loads(line))
+            except ValueError:
+                continue
+
+    exporter.close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == "boards":
+        export_batch_results(sys.argv[2], sys.argv[3])
+    elif len(sys.argv) == 3 and sys.argv[1] == "compact":
+        print(f"merged {compact(sys.argv[2])} files")
+    else:
+        print("usage: python parquet_export.py boards <results.jsonl> <root>")
+        print("       python parquet_export.py compact <root>")
+        sys.exit(1)
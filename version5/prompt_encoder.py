@@ -0,0 +1,202 @@
+# prompt_encoder.py
+
+import re
+import json
+
+# approximate token budget per prompt section
+SECTION_BUDGETS = {
+    "stats": 200,
+    "components": 600,
+    "tools": 400,
+    "tool_result": 300,
+    "observed_data": 300
+}
+
+FLOAT_DIGITS = 3
+
+# component table columns: (header, path into the component dict)
+COMPONENT_COLUMNS = [
+    ("id", "id"),
+    ("type", "type"),
+    ("size", "size"),
+    ("x", "bbox.x"),
+    ("y", "bbox.y"),
+    ("w", "bbox.w"),
+    ("h", "bbox.h"),
+    ("norm_area", "normalized_area"),
+    ("ar", "aspect_ratio"),
+    ("edge", "edge_density"),
+    ("fill", "fill_ratio"),
+    ("int_std", "intensity_std"),
+    ("ocr", "ocr_text")
+]
+
+_TOKEN_RE = re.compile(r"[A-Za-z]+|\d+|[^\sA-Za-z\d]")
+
+
+def estimate_tokens(text):
+    """
+    Rough BPE estimate: words split in ~4 char pieces, every digit run
+    and punctuation mark counts as a token.
+    """
+
+    count = 0
+
+    for piece in _TOKEN_RE.findall(text):
+        if piece.isalpha():
+            count += (len(piece) + 3) // 4
+        elif piece.isdigit():
+            count += (len(piece) + 2) // 3
+        else:
+            count += 1
+
+    return count
+
+
+def round_float(value, digits=FLOAT_DIGITS):
+    # small values keep significant digits (normalized areas are ~1e-4)
+    if abs(value) < 1:
+        return float(f"{value:.{digits}g}")
+    return round(value, 2)
+
+
+def round_floats(obj, digits=FLOAT_DIGITS):
+    if isinstance(obj, float):
+        return round_float(obj, digits)
+    if isinstance(obj, dict):
+        return {k: round_floats(v, digits) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [round_floats(v, digits) for v in obj]
+    return obj
+
+
+def compact_json(obj, digits=FLOAT_DIGITS):
+    return json.dumps(round_floats(obj, digits), separators=(",", ":"))
+
+
+def _lookup(row, path):
+    value = row
+    for key in path.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value
+
+
+def _cell(value, digits):
+    if value is None:
+        return ""
+    if isinstance(value, float):
+        return str(round_float(value, digits))
+    return str(value).replace(",", " ")
+
+
+def encode_table(rows, columns, digits=FLOAT_DIGITS, budget=None):
+    """
+    CSV-like table, one header line then one line per row. Rows past the
+    token budget are dropped and counted in a trailing note.
+    """
+
+    lines = [",".join(header for header, _ in columns)]
+    used = estimate_tokens(lines[0])
+
+    for i, row in enumerate(rows):
+        line = ",".join(_cell(_lookup(row, path), digits) for _, path in columns)
+        cost = estimate_tokens(line) + 1
+
+        if budget is not None and used + cost > budget:
+            lines.append(f"... {len(rows) - i} more rows omitted")
+            break
+
+        lines.append(line)
+        used += cost
+
+    return "\n".join(lines)
+
+
+def encode_components(components, budget=None):
+    budget = SECTION_BUDGETS["components"] if budget is None else budget
+    return encode_table(components, COMPONENT_COLUMNS, budget=budget)
+
+
+def fit_to_budget(text, budget):
+    """
+    Cut text at a line boundary so it fits the token budget. Only whole
+    lines are kept, never part of one (json goes through fit_json).
+    """
+
+    if estimate_tokens(text) <= budget:
+        return text
+
+    kept = []
+    used = 0
+
+    for line in text.splitlines():
+        cost = estimate_tokens(line) + 1
+        if used + cost > budget:
+            break
+        kept.append(line)
+        used += cost
+
+    return "\n".join(kept + ["...[truncated]"])
+
+
+def _longest_list(obj):
+    longest = obj if isinstance(obj, list) and obj else None
+
+    if isinstance(obj, dict):
+        children = obj.values()
+    elif isinstance(obj, list):
+        children = obj
+    else:
+        children = ()
+
+    for child in children:
+        found = _longest_list(child)
+        if found is not None and (longest is None or len(found) > len(longest)):
+            longest = found
+
+    return longest
+
+
+def _with_omitted(obj, omitted):
+    if not omitted:
+        return obj
+    if isinstance(obj, dict):
+        return dict(obj, omitted_items=omitted)
+    return obj + [f"... {omitted} more items omitted"]
+
+
+def fit_json(obj, budget, digits=FLOAT_DIGITS):
+    """
+    Compact json within the token budget that stays valid json: whole
+    items are dropped from the end of the longest list until it fits, and
+    counted in "omitted_items" (or a trailing note in a top-level list).
+    Without lists left to shorten the json is returned over budget.
+    """
+
+    obj = round_floats(obj, digits)
+    omitted = 0
+
+    while True:
+        text = json.dumps(_with_omitted(obj, omitted), separators=(",", ":"))
+        excess = estimate_tokens(text) - budget
+
+        items = _longest_list(obj)
+        if excess <= 0 or items is None:
+            return text
+
+        # drop about as many items as the excess, at least one
+        item_cost = estimate_tokens(json.dumps(items[-1], separators=(",", ":"))) + 1
+        drop = min(len(items), max(1, excess // item_cost))
+
+        del items[-drop:]
+        omitted += drop
+
+
+def encode_section(obj, section):
+    """
+    Compact json for a prompt section, held to that section's budget.
+    """
+
+    return fit_json(obj, SECTION_BUDGETS[section])
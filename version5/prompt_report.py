@@ -0,0 +1,98 @@
+# prompt_report.py
+
+import sys
+import uuid
+import llm_pipeline
+from cv_pipeline import run_cv
+from agent_tools import run_cv_tool, get_tool_specs
+from prompt_encoder import estimate_tokens
+from llm_client import generate
+from llm_pipeline import build_prompt, build_system_message, encode_tool_result, route_model, LLM_OPTIONS, VERBOSE_COMPONENT_ROWS
+
+SAMPLE_IMAGES = ["pcbclear2.jpg", "pcbimagetrial.jfif"]
+
+
+def prompt_variants(image_path):
+    """
+    (name, verbose text, compact text) for each prompt section. Both
+    board prompts get the components the verbose one shows, so the two
+    encode the same rows.
+    """
+
+    components = run_cv(image_path)["components"][:VERBOSE_COMPONENT_ROWS]
+    tools = get_tool_specs()
+    tool_result = run_cv_tool(image_path)
+
+    variants = []
+    saved = llm_pipeline.COMPACT_PROMPTS
+
+    try:
+        for compact in (False, True):
+            llm_pipeline.COMPACT_PROMPTS = compact
+
+            texts = {
+                "board prompt": build_prompt(components) if components else "",
+                "agent system": build_system_message(tools)["content"],
+                "tool result": encode_tool_result(tool_result)
+            }
+            variants.append(texts)
+    finally:
+        llm_pipeline.COMPACT_PROMPTS = saved
+
+    return [(name, variants[0][name], variants[1][name]) for name in variants[0]]
+
+
+def measure_prompt_eval(text):
+    # one generated token isolates prompt evaluation; the cache is bypassed.
+    # a unique first line (raw: no template before it) makes ollama
+    # evaluate the whole prompt: a prefix shared with the previous request
+    # would come from its kv cache
+    payload = {
+        "model": route_model("final_answer"),
+        "prompt": f"[{uuid.uuid4().hex}]\n{text}",
+        "raw": True,
+        "stream": False,
+        "options": dict(LLM_OPTIONS, num_predict=1)
+    }
+
+    metrics = generate(payload, use_cache=False)["metrics"]
+    return metrics["prompt_eval_count"], metrics["prompt_eval_duration_ms"]
+
+
+def report(image_paths, measure=False):
+    if measure:
+        # load the model first so load time is not counted
+        measure_prompt_eval("warm up")
+
+    for path in image_paths:
+        print(f"\n{path}")
+        print(f"{'section':<14}{'verbose tok':>12}{'compact tok':>12}{'saved':>8}")
+
+        total_verbose = 0
+        total_compact = 0
+
+        for name, verbose, compact in prompt_variants(path):
+            v = estimate_tokens(verbose)
+            c = estimate_tokens(compact)
+            total_verbose += v
+            total_compact += c
+
+            saved = 1 - c / v if v else 0.0
+            print(f"{name:<14}{v:>12}{c:>12}{saved:>8.0%}")
+
+            if measure and verbose:
+                v_count, v_ms = measure_prompt_eval(verbose)
+                c_count, c_ms = measure_prompt_eval(compact)
+                print(f"{'':<14}prompt eval: {v_count} tok / {v_ms:.0f} ms"
+                      f" -> {c_count} tok / {c_ms:.0f} ms")
+
+        saved = 1 - total_compact / total_verbose if total_verbose else 0.0
+        print(f"{'total':<14}{total_verbose:>12}{total_compact:>12}{saved:>8.0%}")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    measure = "--measure" in args
+    paths = [a for a in args if a != "--measure"] or SAMPLE_IMAGES
+
+    report(paths, measure)
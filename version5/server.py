@@ -0,0 +1,479 @@
+# server.py
+
+# HTTP inference service. Uploads become jobs on a fixed worker pool; the
+# OCR engines of the agent's ocr tool pool and the ollama models are loaded
+# at startup, so no request pays for a cold start.
+#
+#   python server.py --port 8000 --workers 2
+#   curl -F image=@pcbclear2.jpg localhost:8000/jobs          -> {"job_id": ...}
+#   curl "localhost:8000/jobs/<job_id>?wait=30"               (long poll)
+#   curl -N localhost:8000/jobs/<job_id>/events               (server-sent events)
+#   curl -F image=@pcbclear2.jpg localhost:8000/analyze       (synchronous)
+#
+# Load test without a model: python server.py --standin simulate, then
+# python benchmark_server.py --requests 50 --concurrency 8
+#
+# Form fields next to the image: mode, ocr_profile, max_steps, reflect.
+# Jobs live in this process only: run one server process per machine and
+# scale with --workers.
+
+import os
+import sys
+import json
+import math
+import time
+import uuid
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, Response, request, jsonify
+from waitress import serve
+import agent_tools
+import ocr_backends
+import llm_client
+from agent import run_agent
+from agent_trace import to_json
+from llm_limiter import LIMITER, PRIORITY_HIGH, PRIORITY_NORMAL, limiter_metrics
+from llm_pipeline import warm_models
+from ocr import OCR_PROFILES, DEFAULT_OCR_PROFILE, warm_ocr
+
+UPLOAD_DIR = os.environ.get("SERVER_UPLOAD_DIR", "uploads")
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".jfif"}
+MODES = ["agent", "single_pass", "rules"]
+
+WORKERS = int(os.environ.get("SERVER_WORKERS", "2"))
+
+# queued jobs beyond this are refused with 503
+MAX_PENDING = int(os.environ.get("SERVER_MAX_PENDING", "32"))
+
+# finished jobs are kept this long for polling
+JOB_TTL_S = 600
+
+# /analyze answers 202 with the job id when the result takes longer
+SYNC_TIMEOUT_S = 120
+MAX_POLL_WAIT_S = 60
+EVENT_KEEPALIVE_S = 15
+
+MAX_UPLOAD_MB = 20
+
+# waitress threads: long polls and event streams each hold one while
+# they wait, analyses run on the job pool
+HTTP_THREADS = int(os.environ.get("SERVER_HTTP_THREADS", "16"))
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, image_path, options, priority):
+        self.id = uuid.uuid4().hex
+        self.image_path = image_path
+        self.options = options
+        self.priority = priority
+        self.state = QUEUED
+        self.result = None
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+
+        # bumped on every state change, for waiters
+        self.version = 0
+        self._changed = threading.Condition()
+
+    def set_state(self, state, result=None):
+        with self._changed:
+            self.state = state
+            self.result = result
+            self.version += 1
+            self._changed.notify_all()
+
+    def wait(self, version, timeout):
+        """
+        Blocks until the job changes past version (or timeout). Returns the
+        current version.
+        """
+
+        with self._changed:
+            self._changed.wait_for(lambda: self.version != version or self.state == DONE, timeout)
+            return self.version
+
+    def info(self, with_result=True):
+        info = {
+            "job_id": self.id,
+            "state": self.state,
+            "options": self.options,
+            "submitted": self.submitted,
+            "queue_s": (self.started or time.time()) - self.submitted if self.state != QUEUED else None,
+            "run_s": (self.finished or time.time()) - self.started if self.started else None
+        }
+
+        if with_result and self.state == DONE:
+            info["status"] = self.result.get("status")
+            info["result"] = self.result
+
+        return info
+
+
+def warm_worker(ocr_profiles):
+    # engines are per thread (see main), so every thread warms its own
+    for profile_name in ocr_profiles:
+        try:
+            warm_ocr(profile_name)
+        except Exception as e:
+            print(f"\n--- OCR WARM UP FAILED ({profile_name}) ---")
+            print(e)
+
+
+def warm_threads(executor, size, ocr_profiles):
+    """
+    Starts all size threads of executor and warms each. Blocks until done.
+    """
+
+    # the executor only adds a thread when none is idle, so tasks that
+    # hold their thread until all have started force the full pool
+    barrier = threading.Barrier(size)
+
+    def task():
+        barrier.wait()
+        warm_worker(ocr_profiles)
+
+    for future in [executor.submit(task) for _ in range(size)]:
+        future.result()
+
+
+class JobQueue:
+    def __init__(self, workers=WORKERS, max_pending=MAX_PENDING, ocr_profiles=None):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.ocr_profiles = ocr_profiles or [DEFAULT_OCR_PROFILE]
+
+        self.jobs = {}
+        self.pending = 0
+        self.completed = 0
+        self._lock = threading.Lock()
+
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+
+    def warm(self):
+        """
+        Loads the OCR engines on the agent's ocr tool pool, the only
+        threads that run OCR (agent_tools.run_tool); job workers never do.
+        """
+
+        warm_threads(agent_tools.get_tool_executor("get_ic_info"),
+                     agent_tools.WORKER_SIZES["ocr"], self.ocr_profiles)
+
+    def submit(self, image_path, options, priority=PRIORITY_NORMAL):
+        with self._lock:
+            self._expire()
+
+            if self.pending >= self.max_pending:
+                raise QueueFullError(f"{self.pending} jobs waiting")
+
+            job = Job(image_path, options, priority)
+            self.jobs[job.id] = job
+            self.pending += 1
+
+        self.executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def _run(self, job):
+        with self._lock:
+            self.pending -= 1
+
+        job.started = time.time()
+        job.set_state(RUNNING)
+
+        try:
+            result = run_agent(job.image_path, priority=job.priority, **job.options)
+        except Exception as e:
+            result = {"status": "error", "reason": f"agent_failed: {type(e).__name__}: {e}"}
+        finally:
+            agent_tools.evict_caches(job.image_path)
+            try:
+                os.remove(job.image_path)
+            except OSError:
+                pass
+
+        job.finished = time.time()
+        job.set_state(DONE, result)
+
+        with self._lock:
+            self.completed += 1
+
+    def _expire(self):
+        now = time.time()
+        for job_id in [j.id for j in self.jobs.values() if j.finished and now - j.finished > JOB_TTL_S]:
+            del self.jobs[job_id]
+
+    def metrics(self):
+        with self._lock:
+            states = {}
+            for job in self.jobs.values():
+                states[job.state] = states.get(job.state, 0) + 1
+
+            return {
+                "workers": self.workers,
+                "pending": self.pending,
+                "max_pending": self.max_pending,
+                "completed": self.completed,
+                "jobs": states
+            }
+
+
+def parse_options(form):
+    options = {}
+
+    mode = form.get("mode", "agent")
+    if mode not in MODES:
+        raise ValueError(f"mode must be one of {MODES}")
+    options["mode"] = mode
+
+    ocr_profile = form.get("ocr_profile")
+    if ocr_profile:
+        if ocr_profile not in OCR_PROFILES:
+            raise ValueError(f"ocr_profile must be one of {list(OCR_PROFILES)}")
+        options["ocr_profile"] = ocr_profile
+
+    if form.get("max_steps"):
+        options["max_steps"] = int(form["max_steps"])
+
+    if form.get("reflect"):
+        options["reflect"] = form["reflect"].lower() in ("1", "true", "yes")
+
+    return options
+
+
+def parse_seconds(args, name, default, maximum):
+    """
+    Query arg in seconds, capped at maximum. ValueError unless it is a
+    finite number >= 0.
+    """
+
+    raw = args.get(name)
+    if raw is None:
+        return default
+
+    try:
+        value = float(raw)
+    except ValueError:
+        raise ValueError(f"{name} must be a number of seconds") from None
+
+    if not math.isfinite(value) or value < 0:
+        raise ValueError(f"{name} must be a number of seconds >= 0")
+
+    return min(value, maximum)
+
+
+def save_upload(upload):
+    ext = os.path.splitext(upload.filename or "")[1].lower() or ".jpg"
+    if ext not in IMAGE_EXTENSIONS:
+        raise ValueError(f"unsupported image type {ext}")
+
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+
+    # one file per job: caches are keyed by path and evicted per job
+    path = os.path.join(UPLOAD_DIR, f"{uuid.uuid4().hex}{ext}")
+    upload.save(path)
+
+    return path
+
+
+def json_response(body, status=200, headers=None):
+    # results carry numpy values from the cv pipeline
+    return Response(to_json(body), status=status, mimetype="application/json", headers=headers)
+
+
+def create_app(jobs):
+    app = Flask(__name__)
+    app.config["MAX_CONTENT_LENGTH"] = MAX_UPLOAD_MB * 1024 * 1024
+
+    def submit_upload(priority):
+        upload = request.files.get("image")
+        if upload is None:
+            return None, json_response({"error": "missing 'image' file field"}, 400)
+
+        try:
+            options = parse_options(request.form)
+            path = save_upload(upload)
+        except ValueError as e:
+            return None, json_response({"error": str(e)}, 400)
+
+        try:
+            return jobs.submit(path, options, priority), None
+        except QueueFullError as e:
+            os.remove(path)
+            return None, json_response({"error": "server busy", "reason": str(e)}, 503,
+                                       {"Retry-After": "5"})
+
+    @app.post("/jobs")
+    def create_job():
+        job, error = submit_upload(PRIORITY_NORMAL)
+        if error is not None:
+            return error
+
+        return json_response(dict(job.info(), status_url=f"/jobs/{job.id}",
+                                  events_url=f"/jobs/{job.id}/events"),
+                             202, {"Location": f"/jobs/{job.id}"})
+
+    @app.post("/analyze")
+    def analyze():
+        try:
+            timeout = parse_seconds(request.args, "timeout", SYNC_TIMEOUT_S, SYNC_TIMEOUT_S)
+        except ValueError as e:
+            return json_response({"error": str(e)}, 400)
+
+        # someone is waiting on the response: ahead of queued jobs for the llm
+        job, error = submit_upload(PRIORITY_HIGH)
+        if error is not None:
+            return error
+
+        deadline = time.time() + timeout
+        version = job.version
+
+        while job.state != DONE and time.time() < deadline:
+            version = job.wait(version, deadline - time.time())
+
+        if job.state != DONE:
+            return json_response(dict(job.info(), status_url=f"/jobs/{job.id}"), 202,
+                                 {"Location": f"/jobs/{job.id}"})
+
+        return json_response(job.info())
+
+    @app.get("/jobs/<job_id>")
+    def get_job(job_id):
+        job = jobs.get(job_id)
+        if job is None:
+            return json_response({"error": "unknown or expired job"}, 404)
+
+        # ?wait=S: long poll until the job finishes or S seconds pass
+        try:
+            wait = parse_seconds(request.args, "wait", 0, MAX_POLL_WAIT_S)
+        except ValueError as e:
+            return json_response({"error": str(e)}, 400)
+
+        deadline = time.time() + wait
+        version = job.version
+
+        while job.state != DONE and time.time() < deadline:
+            version = job.wait(version, deadline - time.time())
+
+        return json_response(job.info())
+
+    @app.get("/jobs/<job_id>/events")
+    def job_events(job_id):
+        job = jobs.get(job_id)
+        if job is None:
+            return json_response({"error": "unknown or expired job"}, 404)
+
+        def stream():
+            version = None
+
+            while True:
+                if job.version != version:
+                    version = job.version
+                    info = job.info()
+                    yield f"event: {info['state']}\ndata: {to_json(info)}\n\n"
+
+                    if info["state"] == DONE:
+                        return
+                else:
+                    # comment line: keeps proxies from closing the stream
+                    yield ": keepalive\n\n"
+
+                job.wait(version, EVENT_KEEPALIVE_S)
+
+        return Response(stream(), mimetype="text/event-stream",
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+    @app.get("/health")
+    def health():
+        return jsonify({"status": "ok", "warm": app.config.get("WARM_UP")})
+
+    @app.get("/metrics")
+    def metrics():
+        return json_response({
+            "jobs": jobs.metrics(),
+            "limiter": limiter_metrics(),
+            "llm": llm_client.metrics_summary()
+        })
+
+    return app
+
+
+def warm_up(jobs, warm_llm=True):
+    start = time.perf_counter()
+
+    report = {"ocr_profiles": jobs.ocr_profiles}
+    jobs.warm()
+    report["ocr_s"] = time.perf_counter() - start
+
+    if warm_llm:
+        # also opens the pooled ollama connection
+        report["models"] = warm_models()
+
+    report["elapsed_s"] = time.perf_counter() - start
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="PCB analysis HTTP service.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=WORKERS, help="analyses in flight")
+    parser.add_argument("--http-threads", type=int, default=HTTP_THREADS,
+                        help="connections served at once (polls, event streams)")
+    parser.add_argument("--ocr-workers", type=int, default=agent_tools.WORKER_SIZES["ocr"])
+    parser.add_argument("--max-pending", type=int, default=MAX_PENDING)
+    parser.add_argument("--llm-workers", type=int, default=LIMITER.max_in_flight,
+                        help="concurrent ollama generations")
+    parser.add_argument("--ocr-profiles", nargs="+", default=[DEFAULT_OCR_PROFILE],
+                        choices=list(OCR_PROFILES), help="profiles loaded at startup")
+    parser.add_argument("--no-warm-llm", action="store_true")
+    parser.add_argument("--standin", choices=["script", "simulate", "replay"],
+                        help="answer llm calls from an in-process ollama stand-in")
+    args = parser.parse_args(argv)
+
+    if args.standin:
+        from ollama_standin import start_standin
+
+        _, url = start_standin(mode=args.standin, port=0)
+        llm_client.OLLAMA_HOST = url
+        # every request must reach the stand-in
+        llm_client.USE_CACHE = False
+
+    # ocr runs only on the ocr tool pool: paddle is not thread safe, so
+    # several ocr workers keep one engine each (one model copy each;
+    # --ocr-workers trades memory for parallel ocr)
+    ocr_backends.ENGINE_PER_THREAD = args.ocr_workers > 1
+    agent_tools.WORKER_SIZES["ocr"] = args.ocr_workers
+
+    LIMITER.max_in_flight = args.llm_workers
+    LIMITER.max_queue = max(LIMITER.max_queue, args.workers)
+
+    jobs = JobQueue(args.workers, args.max_pending, args.ocr_profiles)
+
+    print(f"warming up {args.ocr_workers} ocr workers...", file=sys.stderr)
+    report = warm_up(jobs, warm_llm=not args.no_warm_llm)
+    print(json.dumps(report), file=sys.stderr)
+
+    app = create_app(jobs)
+    app.config["WARM_UP"] = report
+
+    # production wsgi server; its threads only wait on jobs, so polling
+    # and event streams never wait on analyses
+    serve(app, host=args.host, port=args.port, threads=args.http_threads)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
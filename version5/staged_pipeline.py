@@ -0,0 +1,257 @@
+# staged_pipeline.py
+
+# Batch executor that overlaps the stages of different images: decode,
+# cv, ocr and llm each have their own worker threads and a bounded queue
+# in front, so image N+1 can be in cv while image N is in ocr and image
+# N-1 is with the llm. A full queue blocks the stage before it, which
+# keeps memory bounded (decoded images wait in at most queue_size slots).
+#
+# Per stage utilization (busy time / worker time) shows which pool to grow.
+
+import time
+import queue
+import threading
+from datetime import datetime, timezone
+import cv2
+from agent import run_agent, LLM_UNAVAILABLE_ERRORS
+from agent_tools import warm_cv_cache, warm_ocr_cache, evict_caches, board_data
+
+# marks the end of the input, passed down stage by stage
+_DONE = object()
+
+DEFAULT_QUEUE_SIZE = 4
+
+
+class Stage:
+    def __init__(self, name, func, workers=1, queue_size=DEFAULT_QUEUE_SIZE):
+        self.name = name
+        self.func = func
+        self.workers = workers
+        self.queue = queue.Queue(maxsize=queue_size)
+
+        self._lock = threading.Lock()
+        self._active = workers
+        self.items = 0
+        self.errors = 0
+        self.busy_s = 0.0
+        self.starved_s = 0.0   # waiting for input
+        self.blocked_s = 0.0   # waiting for room downstream
+        self.depth_total = 0
+
+    def add(self, busy_s, starved_s, blocked_s, depth, failed):
+        with self._lock:
+            self.items += 1
+            self.errors += failed
+            self.busy_s += busy_s
+            self.starved_s += starved_s
+            self.blocked_s += blocked_s
+            self.depth_total += depth
+
+    def worker_done(self):
+        # True for the last worker, which then hands _DONE downstream
+        with self._lock:
+            self._active -= 1
+            return self._active == 0
+
+
+class StagedPipeline:
+    """
+    stages: Stage list. Each func takes and updates an item dict; an
+    exception stores item["error"] and the item skips the later stages.
+    """
+
+    def __init__(self, stages):
+        self.stages = stages
+        self.output = queue.Queue()
+        self.started = None
+        self.finished = None
+
+    def _next_queue(self, index):
+        return self.stages[index + 1].queue if index + 1 < len(self.stages) else self.output
+
+    def _worker(self, index):
+        stage = self.stages[index]
+        out = self._next_queue(index)
+
+        while True:
+            t0 = time.perf_counter()
+            depth = stage.queue.qsize()
+            item = stage.queue.get()
+            t1 = time.perf_counter()
+
+            if item is _DONE:
+                if stage.worker_done():
+                    if out is self.output:
+                        out.put(_DONE)
+                    else:
+                        for _ in range(self.stages[index + 1].workers):
+                            out.put(_DONE)
+                return
+
+            failed = False
+            if "error" not in item:
+                try:
+                    stage.func(item)
+                except Exception as e:
+                    item["error"] = f"{stage.name}_failed: {type(e).__name__}: {e}"
+                    item["failed_stage"] = stage.name
+                    failed = True
+            t2 = time.perf_counter()
+
+            out.put(item)
+            t3 = time.perf_counter()
+
+            stage.add(t2 - t1, t1 - t0, t3 - t2, depth, failed)
+
+    def _feed(self, items):
+        first = self.stages[0]
+
+        for item in items:
+            first.queue.put(item)
+
+        for _ in range(first.workers):
+            first.queue.put(_DONE)
+
+    def run(self, items):
+        """
+        Yields finished items in completion order.
+        """
+
+        self.started = time.perf_counter()
+
+        threads = [threading.Thread(target=self._feed, args=(items,), daemon=True, name="feed")]
+        for index, stage in enumerate(self.stages):
+            threads.extend(
+                threading.Thread(target=self._worker, args=(index,), daemon=True,
+                                 name=f"{stage.name}-{i}")
+                for i in range(stage.workers)
+            )
+
+        for t in threads:
+            t.start()
+
+        while True:
+            item = self.output.get()
+            if item is _DONE:
+                break
+            yield item
+
+        self.finished = time.perf_counter()
+
+    def utilization(self):
+        """
+        Per stage: items, busy share of worker time, mean service time,
+        time spent starved / blocked and mean input queue depth.
+        """
+
+        elapsed = (self.finished or time.perf_counter()) - (self.started or time.perf_counter())
+        report = {}
+
+        for stage in self.stages:
+            worker_s = stage.workers * elapsed
+            report[stage.name] = {
+                "workers": stage.workers,
+                "items": stage.items,
+                "errors": stage.errors,
+                "utilization": stage.busy_s / worker_s if worker_s else 0.0,
+                "mean_service_s": stage.busy_s / stage.items if stage.items else 0.0,
+                "starved_s": stage.starved_s,
+                "blocked_s": stage.blocked_s,
+                "mean_queue_depth": stage.depth_total / stage.items if stage.items else 0.0
+            }
+
+        return report
+
+
+def format_utilization(report):
+    lines = [f"{'stage':<8}{'workers':>8}{'items':>7}{'util':>7}{'svc s':>8}{'starved s':>11}{'blocked s':>11}{'queue':>7}"]
+
+    for name, r in report.items():
+        lines.append(
+            f"{name:<8}{r['workers']:>8}{r['items']:>7}{r['utilization']:>7.0%}"
+            f"{r['mean_service_s']:>8.2f}{r['starved_s']:>11.1f}{r['blocked_s']:>11.1f}"
+            f"{r['mean_queue_depth']:>7.1f}"
+        )
+
+    return "\n".join(lines)
+
+
+# analysis stages
+
+def decode_stage(item):
+    image = cv2.imread(item["image_path"])
+    if image is None:
+        raise FileNotFoundError(f"Image not found: {item['image_path']}")
+    item["image"] = image
+
+
+def cv_stage(item):
+    warm_cv_cache(item["image_path"], item["image"])
+
+
+def make_ocr_stage(ocr_profile):
+    def ocr_stage(item):
+        warm_ocr_cache(item["image_path"], ocr_profile, item["image"])
+        # the llm stage works from the tool caches
+        item.pop("image", None)
+
+    return ocr_stage
+
+
+def make_llm_stage(run_kwargs, keep_board=False):
+    def llm_stage(item):
+        # cv / ocr tool calls are cache hits by now, so this is llm time
+        try:
+            item["result"] = run_agent(item["image_path"], **run_kwargs)
+        except LLM_UNAVAILABLE_ERRORS as e:
+            # see batch.analyze: redone when the batch resumes
+            item["result"] = {"status": "llm_unavailable", "reason": f"{type(e).__name__}: {e}"}
+        finally:
+            if keep_board:
+                item["board"] = board_data(item["image_path"])
+            evict_caches(item["image_path"])
+
+    return llm_stage
+
+
+def analysis_pipeline(run_kwargs, decode_workers=1, cv_workers=2, ocr_workers=1,
+                      llm_workers=2, queue_size=DEFAULT_QUEUE_SIZE, keep_board=False):
+    """
+    keep_board: records carry the cv / ocr detail under "_board" (see
+    batch.py --parquet).
+    """
+
+    return StagedPipeline([
+        Stage("decode", decode_stage, decode_workers, queue_size),
+        Stage("cv", cv_stage, cv_workers, queue_size),
+        Stage("ocr", make_ocr_stage(run_kwargs.get("ocr_profile")), ocr_workers, queue_size),
+        Stage("llm", make_llm_stage(run_kwargs, keep_board), llm_workers, queue_size)
+    ])
+
+
+def run_pipeline(pipeline, image_paths):
+    """
+    Yields batch records (see batch.analyze) as images finish.
+    """
+
+    items = ({"image_path": p, "submitted": time.perf_counter()} for p in image_paths)
+
+    for item in pipeline.run(items):
+        if "error" in item:
+            evict_caches(item["image_path"])
+            result = {"status": "error", "reason": item["error"]}
+        else:
+            result = item["result"]
+
+        record = {
+            "image_path": item["image_path"],
+            "status": result.get("status"),
+            "elapsed_s": time.perf_counter() - item["submitted"],
+            "finished_at": datetime.now(timezone.utc).isoformat(),
+            "result": result
+        }
+
+        if "board" in item:
+            record["_board"] = item["board"]
+
+        yield record
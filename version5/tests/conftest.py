@@ -0,0 +1,60 @@
+# conftest.py
+
+# version5 is a flat set of modules run from its own directory; put it on
+# the path so the tests import them the same way.
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+BOARD_STATS = {
+    "component_count": 20,
+    "coverage": 0.1,
+    "mean_area": 40.0,
+    "type_counts": {"resistor": 10, "capacitor": 6, "IC": 1}
+}
+
+BOARD_IC_INFO = {
+    "ic_count_cv": 1,
+    "ic_count_ocr": 1,
+    "possible_ic_names": ["ATMEGA328P"],
+    "reference_counts": {"R": 10, "U": 1}
+}
+
+
+@pytest.fixture
+def ollama_down(monkeypatch):
+    """
+    Every ollama request answers 503 (one attempt, no cache) and the cv /
+    ocr tools return a fixed board, so a run reaches the llm-down path.
+    """
+
+    llm_client = pytest.importorskip("llm_client")
+    agent_tools = pytest.importorskip("agent_tools")
+    agent = pytest.importorskip("agent")
+
+    class Unavailable:
+        status_code = 503
+
+        def close(self):
+            pass
+
+    class Session:
+        def post(self, *args, **kwargs):
+            return Unavailable()
+
+    monkeypatch.setattr(llm_client, "get_session", lambda: Session())
+    monkeypatch.setattr(llm_client, "MAX_ATTEMPTS", 1)
+    monkeypatch.setattr(llm_client, "USE_CACHE", False)
+    monkeypatch.setattr(agent, "SPECULATIVE_PREFETCH", False)
+
+    tools = {
+        "run_cv": BOARD_STATS,
+        "get_component_stats": BOARD_STATS,
+        "get_ic_info": BOARD_IC_INFO
+    }
+    for name, result in tools.items():
+        monkeypatch.setitem(agent_tools.TOOLS[name], "function", lambda result=result, **kwargs: dict(result))
@@ -0,0 +1,35 @@
+# test_agent_tools.py
+
+import threading
+import pytest
+
+# agent_tools pulls in the cv / ocr stack
+agent_tools = pytest.importorskip("agent_tools")
+
+
+def test_eviction_waits_for_a_running_prefetch(monkeypatch):
+    started, release = threading.Event(), threading.Event()
+
+    def slow_cv(image_path):
+        started.set()
+        release.wait(5)
+        agent_tools.CV_CACHE[image_path] = {"components": []}
+        return agent_tools.CV_CACHE[image_path]
+
+    monkeypatch.setitem(agent_tools.TOOLS["run_cv"], "function", slow_cv)
+    monkeypatch.setitem(agent_tools.TOOLS["get_ic_info"], "function", lambda **kwargs: {})
+
+    agent_tools.start_prefetch("board.jpg")
+    assert started.wait(5)
+
+    assert agent_tools.finish_prefetch("board.jpg")["run_cv"] == "wasted"
+
+    evicting = threading.Thread(target=agent_tools.evict_caches, args=("board.jpg",))
+    evicting.start()
+    evicting.join(0.2)
+    assert evicting.is_alive()
+
+    release.set()
+    evicting.join(5)
+
+    assert "board.jpg" not in agent_tools.CV_CACHE
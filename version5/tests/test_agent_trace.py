@@ -0,0 +1,52 @@
+# test_agent_trace.py
+
+import pytest
+
+# agent_trace pulls in the agent tools and the cv / ocr stack
+agent_trace = pytest.importorskip("agent_trace")
+import requests
+from llm_client import LLMRequestError, LLMStreamError, RetryableStatusError
+from llm_limiter import LLMBusyError
+
+
+def replayed(error):
+    return agent_trace.replay_error(agent_trace.error_info(error))
+
+
+def test_rejected_request_keeps_its_status():
+    error = replayed(LLMRequestError(404, "model 'qwen' not found"))
+
+    assert type(error) is LLMRequestError
+    assert error.status_code == 404 and error.model_missing
+    assert error.detail == "model 'qwen' not found"
+
+
+def test_5xx_and_stream_errors_keep_their_types():
+    response = requests.models.Response()
+    response.status_code = 503
+
+    error = replayed(RetryableStatusError(response))
+    assert type(error) is RetryableStatusError
+    assert error.response.status_code == 503
+
+    assert type(replayed(LLMStreamError("Ollama error: out of memory"))) is LLMStreamError
+
+
+def test_busy_and_transport_errors():
+    busy = replayed(LLMBusyError("queue full", 1.5, 7))
+    assert type(busy) is LLMBusyError
+    assert (busy.reason, busy.waited_s, busy.queue_depth) == ("queue full", 1.5, 7)
+
+    assert type(replayed(requests.exceptions.ReadTimeout("slow"))) is requests.exceptions.ReadTimeout
+
+
+def test_async_transport_errors_become_requests_errors():
+    httpx = pytest.importorskip("httpx")
+
+    assert type(replayed(httpx.ConnectError("refused"))) is requests.exceptions.ConnectionError
+    assert type(replayed(httpx.ReadTimeout("slow"))) is requests.exceptions.Timeout
+
+
+def test_unknown_error_types_fail_the_replay():
+    with pytest.raises(agent_trace.ReplayError, match="KeyError"):
+        replayed(KeyError("messages"))
@@ -0,0 +1,41 @@
+# test_async_agent.py
+
+import asyncio
+import pytest
+
+# httpx plus the cv / ocr stack
+async_agent = pytest.importorskip("async_agent")
+async_llm_client = pytest.importorskip("async_llm_client")
+httpx = pytest.importorskip("httpx")
+
+
+@pytest.fixture
+def async_ollama_down(ollama_down, monkeypatch):
+    transport = httpx.MockTransport(lambda request: httpx.Response(503))
+
+    def get_client():
+        return httpx.AsyncClient(base_url="http://ollama.test", transport=transport)
+
+    monkeypatch.setattr(async_llm_client, "get_client", get_client)
+    monkeypatch.setattr(async_llm_client, "MAX_ATTEMPTS", 1)
+
+
+def test_persistent_5xx_takes_the_rules_fallback(async_ollama_down):
+    result = asyncio.run(async_agent.run_agent_async("board.jpg"))
+
+    assert result["status"] == "success"
+    assert result["source"] == "rules_fallback"
+
+
+def test_client_per_event_loop():
+    async def client():
+        first = async_llm_client.get_client()
+        assert async_llm_client.get_client() is first
+        await async_llm_client.close_client()
+        return first
+
+    first = asyncio.run(client())
+    second = asyncio.run(client())
+
+    assert first is not second
+    assert first.is_closed and second.is_closed
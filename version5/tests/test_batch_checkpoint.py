@@ -0,0 +1,75 @@
+# test_batch_checkpoint.py
+
+import json
+import os
+import pytest
+
+# batch pulls in the agent and the cv / ocr stack
+batch = pytest.importorskip("batch")
+
+
+def write_records(path, records, torn_tail=False):
+    with open(path, "w") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+        if torn_tail:
+            f.write('{"image_path": "half')
+
+
+def test_missing_output_means_nothing_done(tmp_path):
+    assert batch.load_checkpoint(str(tmp_path / "none.jsonl")) == set()
+
+
+def test_finished_images_are_skipped_on_resume(tmp_path):
+    output = tmp_path / "results.jsonl"
+    write_records(output, [
+        {"image_path": "a.jpg", "status": "success", "result": {"source": "llm"}},
+        {"image_path": "b.jpg", "status": "busy"},
+        {"image_path": "c.jpg", "status": "llm_unavailable"},
+        {"image_path": "d.jpg", "status": "success", "result": {"source": "rules_fallback"}},
+        {"image_path": "e.jpg", "status": "error"}
+    ], torn_tail=True)
+
+    done = batch.load_checkpoint(str(output))
+
+    assert done == {os.path.abspath("a.jpg"), os.path.abspath("e.jpg")}
+
+
+def test_last_record_for_an_image_wins(tmp_path):
+    output = tmp_path / "results.jsonl"
+    write_records(output, [
+        {"image_path": "a.jpg", "status": "busy"},
+        {"image_path": "a.jpg", "status": "success", "result": {"source": "llm"}},
+        {"image_path": "b.jpg", "status": "success", "result": {"source": "llm"}},
+        {"image_path": "b.jpg", "status": "busy"}
+    ])
+
+    assert batch.load_checkpoint(str(output)) == {os.path.abspath("a.jpg")}
+
+
+def test_retry_errors_redoes_failed_images(tmp_path):
+    output = tmp_path / "results.jsonl"
+    write_records(output, [{"image_path": "e.jpg", "status": "error"}])
+
+    retry = batch.RETRY_STATUSES | {"error", "max_steps_exceeded"}
+
+    assert batch.load_checkpoint(str(output), retry) == set()
+
+
+def test_manifest_paths_are_relative_to_the_manifest(tmp_path):
+    manifest = tmp_path / "list.txt"
+    manifest.write_text("# boards\none.jpg\n\n/abs/two.jpg\n")
+
+    assert batch.read_manifest(str(manifest)) == [str(tmp_path / "one.jpg"), "/abs/two.jpg"]
+
+
+def test_ollama_outage_is_redone_on_resume(tmp_path, ollama_down):
+    output = tmp_path / "results.jsonl"
+    run_kwargs = {"mode": "single_pass", "fallback": False}
+
+    summary = batch.run_batch(["board.jpg"], str(output), concurrency=1, run_kwargs=run_kwargs)
+    record = json.loads(output.read_text())
+
+    assert summary["statuses"] == {"llm_unavailable": 1}
+    assert record["result"]["reason"].startswith("RetryableStatusError")
+    assert batch.load_checkpoint(str(output)) == set()
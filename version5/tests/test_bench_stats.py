@@ -0,0 +1,15 @@
+# test_bench_stats.py
+
+from bench_stats import percentile
+
+
+def test_nearest_rank():
+    values = [5, 1, 4, 2, 3]
+
+    assert percentile(values, 50) == 3
+    assert percentile(values, 95) == 5
+    assert percentile(values, 0) == 1
+
+
+def test_no_values():
+    assert percentile([], 50) is None
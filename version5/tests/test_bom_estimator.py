@@ -0,0 +1,98 @@
+# test_bom_estimator.py
+
+from bom_estimator import component_counts, bom_range, estimate_bom, estimate_pcb_type
+from answer_validator import parse_range, validate_answer
+
+STATS = {
+    "component_count": 20,
+    "coverage": 0.1,
+    "type_counts": {"resistor": 10, "capacitor": 6, "IC": 1, "blob": 3}
+}
+
+IC_INFO = {
+    "ic_count_ocr": 2,
+    "possible_ic_names": ["ATMEGA328P", "CH340G"],
+    "reference_counts": {"R": 12, "U": 1}
+}
+
+
+def test_counts_take_the_larger_of_cv_and_ocr():
+    counts = component_counts(STATS, IC_INFO)
+
+    assert counts == {"resistor": 12, "capacitor": 6, "IC": 2, "unknown": 3}
+
+
+def test_bom_range_uses_cost_rules():
+    low, high = bom_range({"resistor": 2, "capacitor": 0, "IC": 1, "unknown": 0})
+
+    assert (low, high) == (21.0, 510)
+
+
+def test_estimate_shape_and_values():
+    estimate = estimate_bom(STATS, IC_INFO)
+
+    assert estimate["complexity"] == "low"
+    assert estimate["pcb_type"] == "MCU"
+    assert estimate["estimated_bom_inr"] == "53-1510 INR"
+    assert "20 components" in estimate["reasoning"]
+
+
+def test_no_components_is_flagged():
+    estimate = estimate_bom({}, None)
+
+    assert estimate["estimated_bom_inr"] == "0-0 INR"
+    assert "insufficient" in estimate["reasoning"]
+
+
+def test_pcb_type_from_mixed_families():
+    counts = {"resistor": 0, "capacitor": 0, "IC": 2, "unknown": 0}
+
+    assert estimate_pcb_type(["LM317", "ATTINY85"], counts) == "mixed"
+    assert estimate_pcb_type([], counts) == "unknown"
+
+
+def test_parse_range():
+    assert parse_range("120-850 INR") == (120.0, 850.0)
+    assert parse_range("₹1,200 - 2,500") == (1200.0, 2500.0)
+    assert parse_range("1.5k-3k") == (1500.0, 3000.0)
+    assert parse_range("about 500") == (500.0, 500.0)
+    assert parse_range("unknown") is None
+
+
+def reasoning_input():
+    # agent.build_reasoning_input for STATS / IC_INFO
+    return {
+        "component_count": STATS["component_count"],
+        "coverage": STATS["coverage"],
+        "type_counts": STATS["type_counts"],
+        "ic_count_cv": 1,
+        "ic_count_ocr": IC_INFO["ic_count_ocr"],
+        "ic_names": IC_INFO["possible_ic_names"],
+        "reference_counts": IC_INFO["reference_counts"],
+        "ic_present": True
+    }
+
+
+def test_rule_estimate_passes_validation():
+    assert validate_answer(estimate_bom(STATS, IC_INFO), reasoning_input()) == []
+
+
+def test_inconsistent_answer_is_reported():
+    answer = {
+        "complexity": "high",
+        "pcb_type": "MCU",
+        "estimated_bom_inr": "5-10 INR",
+        "reasoning": "guess"
+    }
+
+    issues = validate_answer(answer, reasoning_input())
+
+    assert any(issue.startswith("complexity 'high'") for issue in issues)
+    assert any("outside the cost rules" in issue for issue in issues)
+
+
+def test_validator_and_estimator_agree_on_ic_count():
+    # two ICs read by OCR: a range below their minimum cost is rejected
+    answer = dict(estimate_bom(STATS, IC_INFO), estimated_bom_inr="30-35")
+
+    assert any("ICs" in issue for issue in validate_answer(answer, reasoning_input()))
@@ -0,0 +1,61 @@
+# test_bounded_messages.py
+
+import json
+import pytest
+
+# agent pulls in the cv / ocr stack
+agent = pytest.importorskip("agent")
+
+
+def turn(*tool_names, result="x"):
+    if len(tool_names) == 1:
+        response = {"tool_call": {"name": tool_names[0], "arguments": {}}}
+    else:
+        response = {"tool_calls": [{"name": name, "arguments": {}} for name in tool_names]}
+
+    return [
+        {"role": "assistant", "content": json.dumps(response)},
+        {"role": "tool", "content": result}
+    ]
+
+
+def conversation(*turns):
+    return agent.initial_messages("board.jpg") + sum(turns, [])
+
+
+def test_short_history_is_unchanged():
+    messages = conversation(turn("get_component_stats"))
+
+    assert agent.bounded_messages(messages) == messages
+
+
+def test_older_results_point_to_the_state_summary():
+    messages = conversation(turn("get_component_stats", result="stats"),
+                            turn("get_ic_info", result="ocr"))
+    bounded = agent.bounded_messages(messages)
+
+    assert bounded[0] == messages[0]
+    assert bounded[2]["content"] == "(result summarized in Current state: stats)"
+    assert bounded[-2:] == messages[-2:]
+
+
+def test_superseded_turns_are_dropped():
+    messages = conversation(turn("run_cv"), turn("get_ic_info"), turn("get_component_stats"))
+    bounded = agent.bounded_messages(messages)
+
+    # run_cv's stats were overwritten by get_component_stats
+    assert len(bounded) == 5
+    assert json.loads(bounded[1]["content"])["tool_call"]["name"] == "get_ic_info"
+
+
+def test_oldest_turns_go_first_past_the_budget():
+    turns = [turn("get_ic_info", "get_component_stats", result="r" * 50) for _ in range(3)]
+    turns.append(turn("run_cv", result="latest " * 100))
+    messages = conversation(*turns)
+
+    full = agent.bounded_messages(messages, budget=10 ** 6)
+    tight = agent.bounded_messages(messages, budget=1)
+
+    assert len(tight) < len(full)
+    assert tight[0] == messages[0]
+    assert tight[-2:] == messages[-2:]
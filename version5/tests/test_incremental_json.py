@@ -0,0 +1,43 @@
+# test_incremental_json.py
+
+from incremental_json import IncrementalJSONParser
+
+
+def feed_all(parser, chunks):
+    return [parser.feed(chunk) for chunk in chunks]
+
+
+def test_object_split_across_chunks():
+    parser = IncrementalJSONParser()
+    results = feed_all(parser, ['{"final_', 'answer": {"a"', ': 1}', "}"])
+
+    assert results[:3] == [None, None, None]
+    assert results[3] == {"final_answer": {"a": 1}}
+    assert parser.complete
+
+
+def test_text_before_object_is_ignored():
+    parser = IncrementalJSONParser()
+    assert parser.feed('Sure, here it is: {"a": 2}') == {"a": 2}
+
+
+def test_braces_and_quotes_inside_strings():
+    parser = IncrementalJSONParser()
+    text = '{"reasoning": "a } brace and an \\" escaped quote {", "n": 1}'
+
+    for ch in text[:-1]:
+        assert parser.feed(ch) is None
+
+    assert parser.feed(text[-1]) == {"reasoning": 'a } brace and an " escaped quote {', "n": 1}
+
+
+def test_first_object_wins():
+    parser = IncrementalJSONParser()
+    assert parser.feed('{"a": 1}{"b": 2}') == {"a": 1}
+    assert parser.feed('{"c": 3}') == {"a": 1}
+
+
+def test_invalid_object_is_skipped():
+    parser = IncrementalJSONParser()
+    assert parser.feed("{not json} then ") is None
+    assert parser.feed('{"ok": true}') == {"ok": True}
@@ -0,0 +1,78 @@
+# test_llm_cache.py
+
+import pytest
+import llm_cache
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(llm_cache, "CACHE_PATH", str(tmp_path / "cache.sqlite3"))
+    monkeypatch.setattr(llm_cache, "_conn", None)
+    yield llm_cache
+    if llm_cache._conn is not None:
+        llm_cache._conn.close()
+
+
+def payload(**changes):
+    base = {
+        "model": "m",
+        "prompt": "Analyze  the board\n\n  now",
+        "stream": True,
+        "keep_alive": "30m",
+        "options": {"temperature": 0}
+    }
+    base.update(changes)
+    return base
+
+
+def test_key_ignores_transport_fields_and_whitespace():
+    key = llm_cache.make_key(payload())
+
+    assert llm_cache.make_key(payload(stream=False, keep_alive="5m")) == key
+    assert llm_cache.make_key(payload(prompt="Analyze the board\nnow")) == key
+
+
+def test_key_changes_with_model_options_and_prompt():
+    key = llm_cache.make_key(payload())
+
+    assert llm_cache.make_key(payload(model="other")) != key
+    assert llm_cache.make_key(payload(options={"temperature": 0, "num_ctx": 8192})) != key
+    assert llm_cache.make_key(payload(prompt="Analyze another board")) != key
+
+
+def test_only_greedy_payloads_are_cached():
+    assert llm_cache.cache_allowed(payload())
+    assert not llm_cache.cache_allowed(payload(options={}))
+    assert not llm_cache.cache_allowed(payload(options={"temperature": 0.7}))
+    assert llm_cache.cache_allowed(payload(options={}), allow_sampled=True)
+
+
+def test_put_get_round_trip(cache):
+    cache.put("k", {"response": "{}", "metrics": {"wall_ms": 1.0}})
+
+    assert cache.get("k") == {"response": "{}", "metrics": {"wall_ms": 1.0}}
+    assert cache.get("missing") is None
+    assert cache.stats()["entries"] == 1
+
+
+def test_expired_entries_are_dropped(cache, monkeypatch):
+    cache.put("k", {"response": "old"})
+    monkeypatch.setattr(cache, "CACHE_TTL_S", -1)
+
+    assert cache.get("k") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_least_recently_used_evicted_past_max_entries(cache, monkeypatch):
+    monkeypatch.setattr(cache, "CACHE_MAX_ENTRIES", 2)
+    clock = iter(range(100))
+    monkeypatch.setattr(cache.time, "time", lambda: next(clock))
+
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
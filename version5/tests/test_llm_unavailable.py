@@ -0,0 +1,33 @@
+# test_llm_unavailable.py
+
+import json
+import pytest
+
+# agent pulls in the cv / ocr stack
+agent = pytest.importorskip("agent")
+llm_client = pytest.importorskip("llm_client")
+
+
+@pytest.mark.parametrize("mode", ["agent", "single_pass"])
+def test_persistent_5xx_takes_the_rules_fallback(ollama_down, mode):
+    result = agent.run_agent("board.jpg", mode=mode)
+
+    assert result["status"] == "success"
+    assert result["source"] == "rules_fallback"
+    assert result["reason"].startswith("llm_unavailable")
+
+
+def test_persistent_5xx_without_fallback_is_unavailable(ollama_down):
+    with pytest.raises(agent.LLM_UNAVAILABLE_ERRORS) as raised:
+        agent.run_agent("board.jpg", fallback=False)
+
+    assert isinstance(raised.value, llm_client.RetryableStatusError)
+
+
+def test_stream_error_chunk_is_an_unavailable_error():
+    collector = llm_client.StreamCollector("/api/chat", {"model": "m"})
+
+    with pytest.raises(llm_client.LLMStreamError) as raised:
+        collector.add_line(json.dumps({"error": "llama runner process has terminated"}))
+
+    assert isinstance(raised.value, agent.LLM_UNAVAILABLE_ERRORS)
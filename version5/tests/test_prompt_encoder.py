@@ -0,0 +1,73 @@
+# test_prompt_encoder.py
+
+import json
+from prompt_encoder import (
+    estimate_tokens,
+    round_floats,
+    compact_json,
+    encode_table,
+    fit_to_budget,
+    fit_json
+)
+
+
+def test_round_floats_keeps_small_values_significant():
+    assert round_floats({"a": 0.000123456, "b": 12.3456, "c": [1.23456]}) == {
+        "a": 0.000123, "b": 12.35, "c": [1.23]
+    }
+
+
+def test_compact_json_has_no_whitespace():
+    assert compact_json({"a": [1, 2], "b": 0.5}) == '{"a":[1,2],"b":0.5}'
+
+
+def test_table_drops_rows_past_budget():
+    rows = [{"id": i, "type": "resistor"} for i in range(100)]
+    text = encode_table(rows, [("id", "id"), ("type", "type")], budget=40)
+    lines = text.splitlines()
+
+    assert lines[0] == "id,type"
+    assert lines[1] == "0,resistor"
+    assert lines[-1].endswith("more rows omitted")
+    assert estimate_tokens("\n".join(lines[:-1])) <= 40
+
+
+def test_fit_to_budget_keeps_whole_lines():
+    text = "\n".join(f"line {i} with some words" for i in range(50))
+    fitted = fit_to_budget(text, 30)
+    lines = fitted.splitlines()
+
+    assert lines[-1] == "...[truncated]"
+    assert all(line in text.splitlines() for line in lines[:-1])
+
+
+def test_fit_to_budget_never_cuts_inside_a_line():
+    assert fit_to_budget("word " * 500, 10) == "...[truncated]"
+
+
+def test_fit_json_stays_valid_and_counts_omitted_items():
+    data = {
+        "component_count": 300,
+        "components": [{"id": i, "type": "resistor", "area": 12.5} for i in range(300)]
+    }
+
+    text = fit_json(data, 200)
+    parsed = json.loads(text)
+
+    assert estimate_tokens(text) <= 200
+    assert parsed["component_count"] == 300
+    assert len(parsed["components"]) + parsed["omitted_items"] == 300
+    assert parsed["components"][0] == {"id": 0, "type": "resistor", "area": 12.5}
+
+
+def test_fit_json_leaves_fitting_data_alone():
+    data = {"a": [1, 2, 3]}
+
+    assert fit_json(data, 100) == '{"a":[1,2,3]}'
+    assert data == {"a": [1, 2, 3]}
+
+
+def test_fit_json_top_level_list_gets_a_note():
+    parsed = json.loads(fit_json(list(range(500)), 50))
+
+    assert parsed[-1].endswith("more items omitted")
@@ -0,0 +1,304 @@
+# tracing.py
+
+# Lightweight in-process tracing: nested spans with attributes, kept per
+# trace and exported when the root span ends, to a Chrome trace-event
+# file (chrome://tracing, Perfetto) and to an OTLP JSON lines file.
+# Off by default; when off, span() hands back a shared no-op object.
+
+import os
+import json
+import time
+import random
+import threading
+import functools
+import contextvars
+from collections import OrderedDict
+
+ENABLED = os.environ.get("TRACING", "0") == "1"
+
+# fraction of root spans (uploads / runs) that are recorded
+SAMPLE_RATE = float(os.environ.get("TRACING_SAMPLE_RATE", "1.0"))
+
+CHROME_PATH = os.environ.get("TRACING_CHROME_PATH", "traces/spans.chrome.json")
+OTLP_PATH = os.environ.get("TRACING_OTLP_PATH", "traces/spans.otlp.jsonl")
+
+SERVICE_NAME = "pcb-analyzer"
+
+_current = contextvars.ContextVar("current_span", default=None)
+
+# marks a context whose root span was not sampled
+_UNSAMPLED = object()
+
+_lock = threading.Lock()
+_pending = {}              # trace_id -> finished spans waiting for the root
+_exported = OrderedDict()  # recently exported trace ids, for late spans
+MAX_EXPORTED_IDS = 1000
+
+
+class _NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, key, value):
+        pass
+
+    def set_attributes(self, attributes):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class _UnsampledRoot(_NoopSpan):
+    # children of an unsampled root are no-ops as well
+    def __enter__(self):
+        self._token = _current.set(_UNSAMPLED)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _current.reset(self._token)
+        return False
+
+
+class Span:
+    def __init__(self, name, parent, attributes):
+        self.name = name
+        self.parent = parent
+        self.trace_id = parent.trace_id if parent else os.urandom(16).hex()
+        self.span_id = os.urandom(8).hex()
+        self.attributes = dict(attributes)
+        self.error = None
+        self.start_ns = 0
+        self.end_ns = 0
+        self.thread_id = 0
+
+    def set(self, key, value):
+        self.attributes[key] = value
+
+    def set_attributes(self, attributes):
+        self.attributes.update(attributes)
+
+    def __enter__(self):
+        self._token = _current.set(self)
+        self.thread_id = threading.get_ident()
+        self.start_ns = time.time_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end_ns = time.time_ns()
+        _current.reset(self._token)
+
+        if exc is not None:
+            self.error = f"{exc_type.__name__}: {exc}"
+
+        _finish(self)
+        return False
+
+
+def span(name, **attributes):
+    """
+    with span("cv.preprocess_pcb", size=...) as s:
+        s.set("key", value)
+    """
+
+    if not ENABLED:
+        return NOOP_SPAN
+
+    parent = _current.get()
+
+    if parent is _UNSAMPLED:
+        return NOOP_SPAN
+
+    if parent is None and random.random() >= SAMPLE_RATE:
+        return _UnsampledRoot()
+
+    return Span(name, parent, attributes)
+
+
+def traced(name=None):
+    """
+    Decorator: runs the function inside a span (module.function by default).
+    """
+
+    def decorate(func):
+        span_name = name or f"{func.__module__}.{func.__name__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return func(*args, **kwargs)
+
+            with span(span_name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+def current_span():
+    s = _current.get()
+    return NOOP_SPAN if s is None or s is _UNSAMPLED else s
+
+
+def in_context(func, *args, **kwargs):
+    """
+    Callable for a worker pool that runs func under the caller's current
+    span, so work on other threads nests correctly.
+    """
+
+    if not ENABLED:
+        return functools.partial(func, *args, **kwargs)
+
+    return functools.partial(contextvars.copy_context().run, func, *args, **kwargs)
+
+
+def enable(sample_rate=None):
+    global ENABLED, SAMPLE_RATE
+
+    ENABLED = True
+    if sample_rate is not None:
+        SAMPLE_RATE = sample_rate
+
+
+def disable():
+    global ENABLED
+    ENABLED = False
+
+
+def _finish(s):
+    with _lock:
+        if s.parent is None:
+            spans = _pending.pop(s.trace_id, []) + [s]
+
+            _exported[s.trace_id] = True
+            while len(_exported) > MAX_EXPORTED_IDS:
+                _exported.popitem(last=False)
+
+        elif s.trace_id in _exported:
+            # finished after its root (e.g. a prefetch), exported on its own
+            spans = [s]
+
+        else:
+            _pending.setdefault(s.trace_id, []).append(s)
+            return
+
+    export(spans)
+
+
+def export(spans):
+    try:
+        export_chrome(spans)
+        export_otlp(spans)
+    except OSError as e:
+        # tracing must never break an analysis
+        print("\n--- TRACE EXPORT FAILED ---")
+        print(e)
+
+
+def _attribute_value(value):
+    if isinstance(value, (int, float, str, bool)) or value is None:
+        return value
+    return str(value)
+
+
+def chrome_events(spans):
+    pid = os.getpid()
+
+    return [
+        {
+            "name": s.name,
+            "cat": s.name.split(".")[0],
+            "ph": "X",
+            "ts": s.start_ns / 1000,
+            "dur": (s.end_ns - s.start_ns) / 1000,
+            "pid": pid,
+            "tid": s.thread_id,
+            "args": dict(
+                {k: _attribute_value(v) for k, v in s.attributes.items()},
+                trace_id=s.trace_id,
+                **({"error": s.error} if s.error else {})
+            )
+        }
+        for s in spans
+    ]
+
+
+def export_chrome(spans, path=None):
+    """
+    Appends to a trace-event file in the JSON array format; the closing
+    bracket is optional there, so the file can grow run after run.
+    """
+
+    path = path or CHROME_PATH
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    lines = [json.dumps(e) for e in chrome_events(spans)]
+
+    with _lock:
+        new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+
+        with open(path, "a") as f:
+            for i, line in enumerate(lines):
+                f.write(("[\n" if new_file and i == 0 else ",\n") + line)
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def otlp_span(s):
+    record = {
+        "traceId": s.trace_id,
+        "spanId": s.span_id,
+        "name": s.name,
+        "kind": 1,  # internal
+        "startTimeUnixNano": str(s.start_ns),
+        "endTimeUnixNano": str(s.end_ns),
+        "attributes": [
+            {"key": k, "value": _otlp_value(v)} for k, v in s.attributes.items()
+        ],
+        "status": {"code": 2, "message": s.error} if s.error else {"code": 1}
+    }
+
+    if s.parent is not None:
+        record["parentSpanId"] = s.parent.span_id
+
+    return record
+
+
+def export_otlp(spans, path=None):
+    """
+    One OTLP/JSON ExportTraceServiceRequest per line, the layout of the
+    collector's file exporter.
+    """
+
+    path = path or OTLP_PATH
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    request = {
+        "resourceSpans": [{
+            "resource": {
+                "attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]
+            },
+            "scopeSpans": [{
+                "scope": {"name": "version5"},
+                "spans": [otlp_span(s) for s in spans]
+            }]
+        }]
+    }
+
+    line = json.dumps(request)
+
+    with _lock:
+        with open(path, "a") as f:
+            f.write(line + "\n")